@@ -0,0 +1,116 @@
+"""Helpers shared by the benchmark scripts."""
+import json
+import os
+import platform
+import resource
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup_django(settings='mysite.settings'):
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings)
+    import django
+    django.setup()
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list (q in 0..100)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies_ms):
+    values = sorted(latencies_ms)
+    n = len(values)
+    return {
+        'count': n,
+        'mean_ms': round(sum(values) / n, 3) if n else 0.0,
+        'p50_ms': round(percentile(values, 50), 3),
+        'p95_ms': round(percentile(values, 95), 3),
+        'p99_ms': round(percentile(values, 99), 3),
+        'max_ms': round(values[-1], 3) if n else 0.0,
+    }
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux /proc), falling back to peak RSS."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def write_json(path, data):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, indent=2, sort_keys=True))
+    return path
+
+
+def load_json(path):
+    return json.loads(Path(path).read_text())
+
+
+@contextmanager
+def test_database(verbosity=0, path=None):
+    """Run against a throwaway test database (in-memory for SQLite), never the dev db.sqlite3.
+    Pass `path` for a file-backed SQLite database, which other threads can connect to."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    setup_test_environment()
+    if path:
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = path
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+        teardown_test_environment()
+
+
+def compare_to_baseline(current, baseline, metrics, tolerance=0.25, higher_is_better=(), min_delta=0.0):
+    """Compare {name: {metric: value}} tables. Returns a list of regressions beyond `tolerance`
+    (relative), e.g. p95 more than 25% slower or a quality score more than 25% lower.
+    Differences smaller than `min_delta` (absolute) are treated as noise; pass a dict
+    {metric: delta} to give each metric its own floor (missing metrics get none)."""
+    floors = min_delta if isinstance(min_delta, dict) else dict.fromkeys(metrics, min_delta)
+    regressions = []
+    for name, values in current.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in metrics:
+            new, old = values.get(metric), base.get(metric)
+            if new is None or old is None or not old:
+                continue
+            if abs(new - old) <= floors.get(metric, 0.0):
+                continue
+            change = (new - old) / old
+            worse = -change if metric in higher_is_better else change
+            if worse > tolerance:
+                regressions.append({'name': name, 'metric': metric, 'baseline': old, 'current': new,
+                                    'change_pct': round(change * 100, 1)})
+    return regressions
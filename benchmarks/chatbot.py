@@ -0,0 +1,178 @@
+"""End-to-end latency and answer-quality benchmark for members.ai_bot.generate_ai_reply.
+
+Replays benchmarks/data/chat_prompts.json through each backend path:
+
+    intent  - catalog lookups and _intent_reply (no generator involved)
+    local   - local transformers pipeline (skipped if not installed)
+    hf      - Hugging Face fallback against members.hf_stub.HFStubServer
+    rule    - _rule_fallback with no generator available
+
+and reports p50/p95/p99 latency, answer quality (expected keywords present),
+model/catalog cache hit rates and memory per path. Results are JSON and can be
+compared against a stored baseline:
+
+    python -m benchmarks.chatbot --output bench/chatbot.json
+    python -m benchmarks.chatbot --baseline benchmarks/baselines/chatbot.json --fail-on-regression
+    python -m benchmarks.chatbot --write-baseline benchmarks/baselines/chatbot.json
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from unittest import mock
+
+from benchmarks._common import (
+    REPO_ROOT, compare_to_baseline, environment, load_json, rss_mb, setup_django, summarize,
+    test_database, write_json,
+)
+
+CORPUS = REPO_ROOT / 'benchmarks' / 'data' / 'chat_prompts.json'
+PATHS = ('intent', 'local', 'hf', 'rule')
+CATALOG = [
+    ('Sharma Kirana', [('Basmati Rice', 120, 'Long grain rice'), ('Mustard Oil', 180, 'Cold pressed kachi ghani'),
+                       ('Toor Dal', 140, 'Split pigeon peas'), ('Sugar', 45, 'Refined white sugar')]),
+    ('Gupta General Store', [('Sona Masoori Rice', 75, 'Everyday rice'), ('Sunflower Oil', 160, 'Refined oil'),
+                             ('Moong Dal', 130, 'Yellow lentils'), ('Rock Salt', 30, 'Sendha namak')]),
+]
+
+
+def seed_catalog():
+    from members.models import Product, Shopkeeper
+    for i, (shop, products) in enumerate(CATALOG):
+        keeper = Shopkeeper.objects.create(email=f'bench{i}@example.com', name=shop, address='Main Road')
+        Product.objects.bulk_create([
+            Product(shopkeeper=keeper, name=name, price=price, quantity='1', description=desc)
+            for name, price, desc in products
+        ])
+
+
+@contextmanager
+def backend_path(path, ai_bot):
+    """Configure ai_bot so free-form prompts are answered by `path`."""
+    backend = ai_bot._default_backend
+    saved = dict(ai_bot._models)
+    env = {'HF_API_TOKEN': ''}
+    stub = None
+    if path != 'local':
+        ai_bot._models[backend] = None  # pretend the local model is unavailable
+    if path == 'hf':
+        from members.hf_stub import HFStubServer
+        stub = HFStubServer(reply='Here is some help with your order.').start()
+        env = {'HF_API_TOKEN': 'bench-token', 'HF_API_BASE': stub.base_url}
+    ai_bot.reset_hf_state()
+    try:
+        with mock.patch.dict(os.environ, env):
+            yield
+    finally:
+        if stub:
+            stub.stop()
+        ai_bot._models.clear()
+        ai_bot._models.update(saved)
+        ai_bot.reset_hf_state()
+
+
+def run_path(path, prompts, repeat):
+    from members import ai_bot
+    from members.catalog_index import get_index
+
+    index = get_index()
+    ai_bot.reset_reply_stats()
+    index_before = dict(index.stats)
+    latencies, hits, answered_by = [], 0, {}
+    with backend_path(path, ai_bot):
+        if path == 'local' and ai_bot._load_pipeline_optional() is None:
+            return {'available': False}
+        for _ in range(repeat):
+            for item in prompts:
+                t0 = time.perf_counter()
+                reply = ai_bot.generate_ai_reply([{'role': 'user', 'content': item['prompt']}])
+                latencies.append((time.perf_counter() - t0) * 1000)
+                answered_by[ai_bot.last_reply_path()] = answered_by.get(ai_bot.last_reply_path(), 0) + 1
+                if path in ('intent', 'rule'):
+                    hits += all(word.lower() in reply.lower() for word in item['expect'])
+                else:
+                    hits += bool(reply.strip())
+
+        # Separate pass for allocations so tracemalloc doesn't skew the timings
+        tracemalloc.start()
+        for item in prompts:
+            ai_bot.generate_ai_reply([{'role': 'user', 'content': item['prompt']}])
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    stats = ai_bot.get_reply_stats()
+    model_lookups = stats['model_cache_hits'] + stats['model_cache_misses']
+    searches = index.stats['searches'] - index_before['searches']
+    index_misses = (index.stats['rebuilds'] - index_before['rebuilds']) + (index.stats['repacks'] - index_before['repacks'])
+    result = summarize(latencies)
+    result.update({
+        'available': True,
+        'quality': round(hits / len(latencies), 4) if latencies else 0.0,
+        'answered_by': answered_by,
+        'model_cache_hit_rate': round(stats['model_cache_hits'] / model_lookups, 4) if model_lookups else None,
+        'catalog_cache_hit_rate': round(1 - index_misses / searches, 4) if searches else None,
+        'alloc_peak_kb': round(peak / 1024, 1),
+        'rss_mb': round(rss_mb(), 1),
+    })
+    if path == 'hf':
+        result['hf'] = ai_bot.get_hf_metrics()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paths', default=','.join(PATHS))
+    parser.add_argument('--repeat', type=int, default=20, help='Replays of the corpus per path')
+    parser.add_argument('--output', help='Write JSON results to this path')
+    parser.add_argument('--baseline', help='Compare against this results file')
+    parser.add_argument('--write-baseline', help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    corpus = load_json(CORPUS)
+    by_kind = {
+        'intent': [c for c in corpus if c['kind'] in ('intent', 'catalog')],
+        'local': [c for c in corpus if c['kind'] == 'open'],
+        'hf': [c for c in corpus if c['kind'] == 'open'],
+        'rule': [c for c in corpus if c['kind'] == 'open'],
+    }
+
+    results = {}
+    with test_database():
+        seed_catalog()
+        for path in [p.strip() for p in args.paths.split(',') if p.strip()]:
+            results[path] = run_path(path, by_kind[path], args.repeat)
+
+    print(f"{'path':<8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'quality':>9}{'alloc KB':>10}")
+    for path, r in results.items():
+        if not r['available']:
+            print(f"{path:<8}{'unavailable':>10}")
+            continue
+        print(f"{path:<8}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['quality']:>9.2f}{r['alloc_peak_kb']:>10.1f}")
+
+    report = {'benchmark': 'chatbot', 'env': environment(), 'repeat': args.repeat, 'paths': results}
+    if args.baseline:
+        baseline = load_json(args.baseline)['paths']
+        available = {k: v for k, v in results.items() if v['available']}
+        report['regressions'] = compare_to_baseline(
+            available, baseline, ('p95_ms', 'p99_ms', 'quality'),
+            tolerance=args.tolerance, higher_is_better=('quality',),
+            # Sub-0.5 ms latency jitter is noise; quality is a 0-1 score and gets no floor
+            min_delta={'p95_ms': 0.5, 'p99_ms': 0.5},
+        )
+        for reg in report['regressions']:
+            print(f"REGRESSION {reg['name']}.{reg['metric']}: {reg['baseline']} -> {reg['current']} ({reg['change_pct']:+}%)")
+    if args.output:
+        write_json(args.output, report)
+    if args.write_baseline:
+        write_json(args.write_baseline, report)
+    if args.fail_on_regression and report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
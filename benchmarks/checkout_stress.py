@@ -0,0 +1,163 @@
+"""Concurrent checkout stress test for stock reservations.
+
+Seeds `--products` products with `--stock` units each in a throwaway file-backed
+SQLite database (threads need real connections, which the in-memory test database
+can't give them), then runs `--threads` customers each placing `--checkouts`
+random 1-3 line carts through the checkout view at once. Demand is well above
+supply, so most products sell out mid-run.
+
+It fails (exit status 1) on any oversell or lost unit, i.e. unless for every product
+
+    initial stock == stock left + units ordered        (and stock left >= 0)
+
+or if any checkout hit "database is locked" (a lock pileup past SQLite's busy
+timeout). Latency percentiles show how long checkouts waited on each other.
+
+    python -m benchmarks.checkout_stress --threads 16 --output bench/checkout_stress.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks._common import environment, setup_django, summarize, test_database, write_json
+
+
+def seed(n_products, stock, n_customers):
+    from members.models import Customer, Product, Shopkeeper
+    shops = [Shopkeeper.objects.create(email=f'shop{i}@example.com', name=f'Shop {i}', address='Main Road')
+             for i in range(2)]
+    products = Product.objects.bulk_create([
+        Product(shopkeeper=shops[i % 2], name=f'Product {i}', price=10 + i, quantity='1 kg',
+                description='', stock=stock)
+        for i in range(n_products)
+    ])
+    customers = Customer.objects.bulk_create([
+        Customer(name=f'Customer {i}', email=f'c{i}@example.com', phone='1', password='x')
+        for i in range(n_customers)
+    ])
+    return [p.pk for p in products], [c.pk for c in customers]
+
+
+def checkout_request(customer_id, cart):
+    from django.contrib.messages.middleware import MessageMiddleware
+    from django.contrib.sessions.middleware import SessionMiddleware
+    from django.test import RequestFactory
+    request = RequestFactory().post('/customer/checkout/', {
+        'full_name': 'Stress', 'phone': '1', 'address': 'Main Road', 'payment_method': 'cash_on_delivery',
+        'cart_data': json.dumps(cart),
+    })
+    SessionMiddleware(lambda r: None).process_request(request)
+    MessageMiddleware(lambda r: None).process_request(request)
+    request.session['customer_id'] = customer_id
+    request.session['user_type'] = 'customer'
+    return request
+
+
+def customer_loop(customer_id, product_ids, checkouts, seed_value, barrier, results):
+    from django.contrib.messages import constants
+    from django.db import connection
+    from members.views import checkout
+    rng = random.Random(seed_value)
+    barrier.wait()
+    try:
+        for _ in range(checkouts):
+            cart = [{'id': pid, 'price': '10', 'quantity': rng.randint(1, 3)}
+                    for pid in rng.sample(product_ids, rng.randint(1, 3))]
+            request = checkout_request(customer_id, cart)
+            started = time.perf_counter()
+            checkout(request)
+            elapsed = (time.perf_counter() - started) * 1000
+            outcome = 'error'
+            for message in request._messages:
+                text = str(message)
+                if message.level == constants.SUCCESS:
+                    outcome = 'placed'
+                elif 'not enough stock' in text:
+                    outcome = 'out_of_stock'
+                elif 'locked' in text:
+                    outcome = 'locked'
+            results.append((outcome, elapsed))
+    finally:
+        connection.close()
+
+
+def check_invariants(product_ids, initial):
+    from django.db.models import Sum
+    from members.models import OrderItem, Product, StockReservation
+    ordered = dict(OrderItem.objects.filter(product_id__in=product_ids).values_list('product_id')
+                   .annotate(n=Sum('quantity')))
+    problems = []
+    for pid, stock in Product.objects.filter(pk__in=product_ids).values_list('pk', 'stock'):
+        if stock < 0 or stock + ordered.get(pid, 0) != initial:
+            problems.append(f"product {pid}: {stock} left + {ordered.get(pid, 0)} ordered != {initial}")
+    held = StockReservation.objects.filter(status=StockReservation.HELD).count()
+    if held:
+        problems.append(f"{held} reservation(s) still held")
+    return problems
+
+
+def run(threads, checkouts, n_products, stock, rng_seed=0):
+    product_ids, customer_ids = seed(n_products, stock, threads)
+    barrier = threading.Barrier(threads)
+    results = []
+    workers = [
+        threading.Thread(target=customer_loop,
+                         args=(customer_ids[i], product_ids, checkouts, rng_seed + i, barrier, results))
+        for i in range(threads)
+    ]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    wall = time.perf_counter() - started
+
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    report = summarize([ms for _, ms in results])
+    report.update({
+        'outcomes': outcomes,
+        'checkouts_per_s': round(len(results) / wall, 1),
+        'problems': check_invariants(product_ids, stock),
+    })
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--checkouts', type=int, default=25, help='Checkouts per thread')
+    parser.add_argument('--products', type=int, default=10)
+    parser.add_argument('--stock', type=int, default=40, help='Initial units per product')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write JSON results to this path')
+    args = parser.parse_args(argv)
+
+    setup_django()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with test_database(path=os.path.join(tmp, 'stress.sqlite3')):
+            report = run(args.threads, args.checkouts, args.products, args.stock, args.seed)
+
+    print(f"{args.threads} threads x {args.checkouts} checkouts over {args.products} products "
+          f"x {args.stock} units: {report['outcomes']}")
+    print(f"p50 {report['p50_ms']:.1f} ms  p95 {report['p95_ms']:.1f} ms  p99 {report['p99_ms']:.1f} ms  "
+          f"max {report['max_ms']:.1f} ms  ({report['checkouts_per_s']} checkouts/s)")
+    for problem in report['problems']:
+        print(f"OVERSELL: {problem}")
+
+    if args.output:
+        write_json(args.output, {'benchmark': 'checkout_stress', 'env': environment(), 'args': vars(args),
+                                 'result': report})
+    failed = report['problems'] or report['outcomes'].get('locked') or report['outcomes'].get('error')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
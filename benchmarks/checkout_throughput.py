@@ -0,0 +1,254 @@
+"""Checkout throughput and contention benchmark.
+
+Where benchmarks.checkout_stress checks that concurrent checkouts never oversell,
+this one measures what they cost. For each database profile and each concurrency
+level in `--threads` it seeds a fresh file-backed SQLite database (shops and
+products from members.synthetic, stock not tracked unless `--stock` is given). It
+then has that many customers POST carts to /customer/checkout/ through the full
+middleware stack at once. Each cart has a size from `--cart-sizes` and spreads
+its lines over a number of shops from `--shop-spreads`; a spread of n means the
+checkout splits it into n orders.
+
+Profiles (`--profiles`):
+
+    sqlite                 Django's defaults: rollback journal, deferred BEGIN
+    sqlite-wal             journal_mode=WAL, synchronous=NORMAL
+    sqlite-wal-immediate   WAL, and transactions take the write lock at BEGIN
+                           (OPTIONS transaction_mode=IMMEDIATE), so none has to
+                           upgrade a read lock, which SQLite fails instead of waiting
+    default                the configured database as is (the only profile off SQLite)
+
+Reported per profile and thread count: orders/s, checkouts/s, outcomes (placed,
+locked = "database is locked", error), latency percentiles overall and per cart
+shape, and where the time went, as mean ms per checkout:
+
+    lookup    SELECTs (session, customer, one per cart line, counters)
+    insert    INSERTs (orders, items, reservations, rollup rows)
+    update    UPDATEs and DELETEs (stock, counters, session)
+    begin     BEGIN (where IMMEDIATE transactions wait for the write lock)
+    commit    COMMIT and savepoints
+    python    everything else: request parsing, building and compiling ORM
+              queries, validation, signal receivers, the redirect
+
+Time spent waiting for SQLite's write lock is counted in whichever statement
+waited: the first write of a deferred transaction, BEGIN IMMEDIATE, or COMMIT.
+
+    python -m benchmarks.checkout_throughput --threads 1,8,32 --output bench/checkout_throughput.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from benchmarks._common import environment, setup_django, summarize, test_database, write_json
+
+PROFILES = {
+    'sqlite': {},
+    'sqlite-wal': {'pragmas': ('journal_mode=WAL', 'synchronous=NORMAL')},
+    'sqlite-wal-immediate': {'pragmas': ('journal_mode=WAL', 'synchronous=NORMAL'),
+                             'options': {'transaction_mode': 'IMMEDIATE'}},
+    'default': {},
+}
+PHASES = ('lookup', 'insert', 'update', 'begin', 'commit', 'python')
+_KIND = {'SELECT': 'lookup', 'INSERT': 'insert', 'UPDATE': 'update', 'DELETE': 'update', 'BEGIN': 'begin'}
+
+
+class PhaseTimer:
+    """execute_wrapper adding each statement's time to its phase."""
+
+    def __init__(self):
+        self.ms = dict.fromkeys(PHASES, 0.0)
+
+    def add(self, phase, started):
+        self.ms[phase] += (time.perf_counter() - started) * 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add(_KIND.get(sql.lstrip().split(None, 1)[0].upper(), 'commit'), started)
+
+
+@contextmanager
+def profile(name):
+    """Apply a profile's connection options and per-connection PRAGMAs."""
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+    spec = PROFILES[name]
+    options = connection.settings_dict.setdefault('OPTIONS', {})
+    saved = dict(options)
+    options.update(spec.get('options', {}))
+
+    def apply_pragmas(sender, connection, **kwargs):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                for pragma in spec.get('pragmas', ()):
+                    cursor.execute(f'PRAGMA {pragma}')
+
+    connection_created.connect(apply_pragmas, weak=False)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(apply_pragmas)
+        options.clear()
+        options.update(saved)
+
+
+def seed(shops, products, customers, stock):
+    from members.models import Product
+    from members.synthetic import generate
+    info = generate(shops=shops, customers=customers, partners=0, products=products, orders=0, seed=0,
+                    tag='checkout', stock=stock)
+    by_shop = {}
+    for pid, shop_id in Product.objects.values_list('pk', 'shopkeeper_id'):
+        by_shop.setdefault(shop_id, []).append(pid)
+    return by_shop, [info['customer_id'] + i for i in range(customers)]
+
+
+def make_cart(rng, by_shop, size, spread):
+    """`size` lines over `spread` distinct shops (every shop gets at least one)."""
+    spread = min(spread, size, len(by_shop))
+    shops = rng.sample(sorted(by_shop), spread)
+    owners = shops + [rng.choice(shops) for _ in range(size - spread)]
+    lines = {}
+    for shop in owners:
+        lines[rng.choice(by_shop[shop])] = rng.randint(1, 3)
+    return json.dumps([{'id': pid, 'price': '10', 'quantity': q} for pid, q in lines.items()])
+
+
+def customer_loop(customer_id, by_shop, args, seed_value, barrier, results):
+    from django.contrib.messages import constants
+    from django.db import connection
+    from benchmarks.http_routes import logged_in
+    rng = random.Random(seed_value)
+    client = logged_in('customer', customer_id)
+    timer = PhaseTimer()
+    connection.ensure_connection()
+    commit = connection._commit
+
+    def timed_commit():
+        started = time.perf_counter()
+        try:
+            return commit()
+        finally:
+            timer.add('commit', started)
+
+    connection._commit = timed_commit
+    barrier.wait()
+    try:
+        for _ in range(args.checkouts):
+            size, spread = rng.choice(args.cart_sizes), rng.choice(args.shop_spreads)
+            data = {'full_name': 'Bench', 'phone': '1', 'address': 'Main Road',
+                    'payment_method': 'cash_on_delivery', 'cart_data': make_cart(rng, by_shop, size, spread)}
+            timer.ms = dict.fromkeys(PHASES, 0.0)
+            started = time.perf_counter()
+            with connection.execute_wrapper(timer):
+                response = client.post('/customer/checkout/', data)
+            elapsed = (time.perf_counter() - started) * 1000
+            phases = dict(timer.ms)
+            phases['python'] = max(elapsed - sum(phases.values()), 0.0)
+            outcome, orders = 'error', 0
+            for message in response.wsgi_request._messages:
+                text = str(message)
+                if message.level == constants.SUCCESS:
+                    outcome = 'placed'
+                    orders = int(text.split()[0]) if text[0].isdigit() else 1
+                elif 'not enough stock' in text:
+                    outcome = 'out_of_stock'
+                elif 'locked' in text:
+                    outcome = 'locked'
+            results.append({'shape': f'{size}x{min(spread, size)}', 'ms': elapsed, 'outcome': outcome,
+                            'orders': orders, 'phases': phases})
+    finally:
+        connection._commit = commit
+        connection.close()
+
+
+def run(by_shop, customers, threads, args):
+    barrier = threading.Barrier(threads)
+    results = []
+    workers = [
+        threading.Thread(target=customer_loop,
+                         args=(customers[i], by_shop, args, args.seed + i, barrier, results))
+        for i in range(threads)
+    ]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    wall = time.perf_counter() - started
+
+    outcomes = {}
+    for r in results:
+        outcomes[r['outcome']] = outcomes.get(r['outcome'], 0) + 1
+    report = summarize([r['ms'] for r in results])
+    n = len(results) or 1
+    report.update({
+        'outcomes': outcomes,
+        'checkouts_per_s': round(len(results) / wall, 1),
+        'orders_per_s': round(sum(r['orders'] for r in results) / wall, 1),
+        'phases_ms': {p: round(sum(r['phases'][p] for r in results) / n, 2) for p in PHASES},
+        'shapes': {},
+    })
+    for shape in sorted({r['shape'] for r in results}, key=lambda s: tuple(map(int, s.split('x')))):
+        report['shapes'][shape] = summarize([r['ms'] for r in results if r['shape'] == shape])
+    return report
+
+
+def _ints(value):
+    return [int(v) for v in value.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', default='sqlite,sqlite-wal,sqlite-wal-immediate')
+    parser.add_argument('--threads', type=_ints, default=[1, 8, 32], help='Concurrency levels, e.g. 1,8,32')
+    parser.add_argument('--checkouts', type=int, default=20, help='Checkouts per customer thread')
+    parser.add_argument('--cart-sizes', type=_ints, default=[1, 3, 8], help='Lines per cart to pick from')
+    parser.add_argument('--shop-spreads', type=_ints, default=[1, 2, 4], help='Shops per cart to pick from')
+    parser.add_argument('--shops', type=int, default=20)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--stock', type=int, help='Track stock, starting every product at this many units')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write JSON results to this path')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.db import connection
+    profiles = args.profiles.split(',')
+    unknown = set(profiles) - set(PROFILES)
+    if unknown:
+        parser.error(f"unknown profile(s): {', '.join(sorted(unknown))}")
+    if connection.vendor != 'sqlite':
+        profiles = ['default']
+
+    results = {}
+    print(f"{'profile':<22}{'threads':>8}{'orders/s':>10}{'p50 ms':>9}{'p99 ms':>9}  "
+          + ''.join(f'{p:>8}' for p in PHASES) + '  outcomes')
+    for name in profiles:
+        results[name] = {}
+        for threads in args.threads:
+            with tempfile.TemporaryDirectory() as tmp, profile(name):
+                path = os.path.join(tmp, 'checkout.sqlite3') if connection.vendor == 'sqlite' else None
+                with test_database(path=path):
+                    by_shop, customers = seed(args.shops, args.products, threads, args.stock)
+                    r = run(by_shop, customers, threads, args)
+            results[name][str(threads)] = r
+            print(f"{name:<22}{threads:>8}{r['orders_per_s']:>10.1f}{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}  "
+                  + ''.join(f"{r['phases_ms'][p]:>8.1f}" for p in PHASES) + f"  {r['outcomes']}")
+
+    if args.output:
+        write_json(args.output, {'benchmark': 'checkout_throughput', 'env': environment(), 'args': vars(args),
+                                 'profiles': results})
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
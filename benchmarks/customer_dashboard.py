@@ -0,0 +1,103 @@
+"""Render-time benchmark for customer_dashboard over a large catalog.
+
+Seeds a throwaway database with `--products` products (default 5000) across
+`--shops` shops and times GET /customer/dashboard/ in three cache states:
+
+    cold       - cache cleared before every request: grid and every card rendered
+    grid_miss  - catalog version bumped before every request: grid re-assembled
+                 from cached cards (what follows a single product edit)
+    warm       - grid fragment cached: only the per-customer parts render
+
+    python -m benchmarks.customer_dashboard --output bench/customer_dashboard.json
+"""
+import argparse
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from benchmarks._common import environment, setup_django, summarize, test_database, write_json
+
+STATES = ('cold', 'grid_miss', 'warm')
+
+
+def seed(n_products, n_shops):
+    from members.models import Customer, Product, Shopkeeper
+    shops = Shopkeeper.objects.bulk_create([
+        Shopkeeper(email=f'shop{i}@example.com', name=f'Shop {i:03d}', address='Main Road')
+        for i in range(n_shops)
+    ])
+    Product.objects.bulk_create([
+        Product(shopkeeper=shops[i % n_shops], name=f'Product {i:05d}', price=10 + i % 500,
+                quantity='1 kg', description=f'Description of product {i}')
+        for i in range(n_products)
+    ], batch_size=1000)
+    return Customer.objects.create(name='Bench', email='bench@example.com', phone='1', password='x')
+
+
+def dashboard_request(customer):
+    """A logged-in GET built with RequestFactory: the test Client records every template
+    context it renders, which would dominate a page with thousands of card includes."""
+    from django.contrib.messages.middleware import MessageMiddleware
+    from django.contrib.sessions.middleware import SessionMiddleware
+    from django.test import RequestFactory
+    request = RequestFactory().get('/customer/dashboard/')
+    SessionMiddleware(lambda r: None).process_request(request)
+    MessageMiddleware(lambda r: None).process_request(request)
+    request.session['customer_id'] = customer.id
+    request.session['user_type'] = 'customer'
+    return request
+
+
+def run_state(customer, state, repeat):
+    from django.core.cache import cache
+    from members.catalog_cache import bump_catalog_version
+    from members.views import customer_dashboard
+    customer_dashboard(dashboard_request(customer))  # warm the cards and template loaders
+    latencies, queries, size = [], [], 0
+    for _ in range(repeat):
+        if state == 'cold':
+            cache.clear()
+        elif state == 'grid_miss':
+            bump_catalog_version()
+        request = dashboard_request(customer)
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            resp = customer_dashboard(request)
+            latencies.append((time.perf_counter() - started) * 1000)
+        assert resp.status_code == 200, resp.status_code
+        queries.append(len(ctx.captured_queries))
+        size = len(resp.content)
+    result = summarize(latencies)
+    result.update({'queries': max(queries), 'response_kb': round(size / 1024, 1)})
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--shops', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--output', help='Write JSON results to this path')
+    args = parser.parse_args(argv)
+
+    setup_django()
+
+    results = {}
+    with test_database():
+        customer = seed(args.products, args.shops)
+        for state in STATES:
+            results[state] = run_state(customer, state, args.repeat)
+
+    print(f"{'state':<11}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}{'KB':>9}")
+    for state, r in results.items():
+        print(f"{state:<11}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['queries']:>9}{r['response_kb']:>9}")
+
+    report = {'benchmark': 'customer_dashboard', 'env': environment(), 'products': args.products,
+              'shops': args.shops, 'repeat': args.repeat, 'states': results}
+    if args.output:
+        write_json(args.output, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,418 @@
+"""End-to-end HTTP benchmark over every route in members/urls.py.
+
+Seeds a throwaway file-backed SQLite database with members.synthetic (the same
+generator as `manage.py generate_data`, at a small scale by default), then drives
+each route in turn through the full middleware stack from `--workers` threads
+making `--requests` requests each. Every thread has its own logged-in customer,
+shopkeeper and delivery partner. Routes that change state (checkout, status
+updates, product edits, registrations) get fresh rows before each request, and
+that setup isn't timed.
+
+Per route it reports throughput, p50/p95/p99 latency, SQL queries per request and
+failures: 5xx responses, unexpected statuses, or an error message left for the
+user (most views turn exceptions such as "database is locked" into one). Results
+are JSON and can be compared with a stored baseline. A route is flagged when a
+latency percentile grows by more than `--tolerance`, when its mean query count
+grows by more than half a query, or when more of its requests fail:
+
+    python -m benchmarks.http_routes --output bench/http_routes.json
+    python -m benchmarks.http_routes --write-baseline bench/http_routes.baseline.json
+    python -m benchmarks.http_routes --baseline bench/http_routes.baseline.json --fail-on-regression
+    python -m benchmarks.http_routes --routes checkout,api_products --workers 8
+
+Keep the baseline on the machine that produces it: latency isn't comparable
+across machines, query counts are.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.contrib.messages.storage.fallback import FallbackStorage
+
+from benchmarks._common import (
+    compare_to_baseline, environment, load_json, setup_django, summarize, test_database, write_json,
+)
+
+_unique = itertools.count()
+
+
+@dataclass
+class Context:
+    """One worker thread's accounts and the rows its requests act on."""
+    shop_id: int
+    customer_id: int
+    partner_id: int
+    shop_products: list
+    products: list
+    rng: random.Random
+    password: str
+    emails: dict = field(default_factory=dict)
+
+
+class RecordingStorage(FallbackStorage):
+    """Message storage that remembers the levels added during this request."""
+
+    def add(self, level, message, extra_tags=''):
+        self.added_levels = getattr(self, 'added_levels', []) + [level]
+        return super().add(level, message, extra_tags)
+
+
+_client_class = None
+
+
+def client_class():
+    """A RequestFactory that runs requests through the full middleware stack and keeps cookies.
+
+    django.test.Client isn't thread-safe (it toggles request signals globally) and
+    copies every rendered template context, which would dominate the bigger pages.
+    """
+    global _client_class
+    if _client_class is None:
+        from django.core.handlers.base import BaseHandler
+        from django.core.handlers.wsgi import WSGIRequest
+        from django.test import RequestFactory
+
+        handler = BaseHandler()
+        handler.load_middleware()
+
+        class Client(RequestFactory):
+            def request(self, **request):
+                request = WSGIRequest(self._base_environ(**request))
+                request._dont_enforce_csrf_checks = True
+                response = handler.get_response(request)
+                self.cookies.update(response.cookies)
+                response.wsgi_request = request
+                return response
+
+        _client_class = Client
+    return _client_class
+
+
+def logged_in(role, account_id):
+    """A client with a session for `role` ('customer', 'shopkeeper' or 'delivery')."""
+    from django.conf import settings
+    from django.contrib.sessions.backends.db import SessionStore
+    session = SessionStore()
+    session[f'{role}_id'] = account_id
+    session['user_type'] = role
+    session.create()
+    client = client_class()()
+    client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+    return client
+
+
+def _order(ctx, status, partner=False, lines=2):
+    """A fresh order of the worker's shop, announced like checkout does."""
+    from django.db import transaction
+    from members.models import Order, OrderItem, Product
+    from members.order_status import notify_created
+    with transaction.atomic():
+        order = Order.objects.create(
+            customer_id=ctx.customer_id, shopkeeper_id=ctx.shop_id, delivery_address='Main Road',
+            delivery_phone='1', status=status, total_amount=20,
+            delivery_partner_id=ctx.partner_id if partner else None,
+        )
+        for pid in ctx.rng.sample(ctx.shop_products, min(lines, len(ctx.shop_products))):
+            OrderItem.objects.create(order=order, product=Product(pk=pid), product_name='Bench', quantity=1, price=10)
+        notify_created([order], actor='shopkeeper')
+    return order
+
+
+def _product(ctx):
+    from members.models import Product
+    return Product.objects.create(shopkeeper_id=ctx.shop_id, name=f'Bench product {next(_unique)}', price=10,
+                                  quantity='1 kg', description='')
+
+
+def _cart(ctx):
+    lines = ctx.rng.sample(ctx.products, ctx.rng.randint(1, 4))
+    return json.dumps([{'id': pid, 'price': '10', 'quantity': ctx.rng.randint(1, 3)} for pid in lines])
+
+
+def _email(kind):
+    return f'bench-{kind}{next(_unique)}@example.com'
+
+
+def _csv():
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    rows = ''.join(f'Imported item {i},{10 + i},1 kg,Bench import\n' for i in range(5))
+    return SimpleUploadedFile('catalog.csv', ('name,price,quantity,description\n' + rows).encode(), 'text/csv')
+
+
+def _json(data):
+    return {'data': json.dumps(data), 'content_type': 'application/json'}
+
+
+# (name, url name, role, builder) -- the builder returns (method, path, kwargs) for one request.
+# Several scenarios may cover one URL name (GET and POST, API modes).
+SCENARIOS = [
+    ('home', 'home', None, lambda c: ('get', '/', {})),
+    ('test_dashboard', 'test_dashboard', None, lambda c: ('get', '/test-dashboard/', {})),
+    ('metrics', 'metrics', None, lambda c: ('get', '/metrics', {})),
+    ('logout', 'logout', None, lambda c: ('get', '/logout/', {})),
+
+    ('shopkeeper_login_page', 'shopkeeper_login', None, lambda c: ('get', '/shopkeeper/login/', {})),
+    ('shopkeeper_login', 'shopkeeper_login', None, lambda c: (
+        'post', '/shopkeeper/login/', {'data': {'email': c.emails['shop'], 'password': c.password}})),
+    ('shopkeeper_register', 'shopkeeper_register', None, lambda c: (
+        'post', '/shopkeeper/register/', {'data': {'shop_name': 'Bench Shop', 'email': _email('shop'),
+                                                   'password': c.password, 'address': 'Main Road'}})),
+    ('shopkeeper_dashboard', 'shopkeeper_dashboard', 'shopkeeper', lambda c: ('get', '/shopkeeper/dashboard/', {})),
+    ('add_product', 'add_product', 'shopkeeper', lambda c: (
+        'post', '/shopkeeper/product/add/', {'data': {'name': f'Bench item {next(_unique)}', 'price': '12.50',
+                                                      'quantity': '1 kg', 'description': 'x', 'stock': ''}})),
+    ('edit_product_page', 'edit_product', 'shopkeeper', lambda c: (
+        'get', f'/shopkeeper/product/edit/{c.rng.choice(c.shop_products)}/', {})),
+    ('edit_product', 'edit_product', 'shopkeeper', lambda c: (
+        'post', f'/shopkeeper/product/edit/{c.rng.choice(c.shop_products)}/',
+        {'data': {'name': f'Edited {next(_unique)}', 'price': '11', 'quantity': '1 kg', 'description': 'x',
+                  'stock': '', 'stock_shown': ''}})),
+    ('delete_product', 'delete_product', 'shopkeeper', lambda c: (
+        'post', f'/shopkeeper/product/delete/{_product(c).pk}/', {})),
+    ('update_order_status', 'update_order_status', 'shopkeeper', lambda c: (
+        'post', f'/shopkeeper/update-order/{_order(c, "pending").pk}/', {'data': {'status': 'confirmed'}})),
+    ('bulk_update_order_status', 'bulk_update_order_status', 'shopkeeper', lambda c: (
+        'post', '/shopkeeper/orders/bulk-status/',
+        _json({'order_ids': [_order(c, 'pending').pk for _ in range(10)], 'status': 'confirmed'}))),
+    ('sales_report', 'sales_report', 'shopkeeper', lambda c: ('get', '/shopkeeper/sales/report/', {})),
+    ('export_products', 'export_products', 'shopkeeper', lambda c: ('get', '/shopkeeper/products/export/', {})),
+    ('import_products', 'import_products', 'shopkeeper', lambda c: (
+        'post', '/shopkeeper/products/import/', {'data': {'file': _csv()}})),
+
+    ('customer_login_page', 'customer_login', None, lambda c: ('get', '/customer/login/', {})),
+    ('customer_login', 'customer_login', None, lambda c: (
+        'post', '/customer/login/', {'data': {'email': c.emails['customer'], 'password': c.password}})),
+    ('customer_register', 'customer_register', None, lambda c: (
+        'post', '/customer/register/', {'data': {'full_name': 'Bench', 'email': _email('customer'),
+                                                 'password': c.password, 'phone': '1'}})),
+    ('customer_dashboard', 'customer_dashboard', 'customer', lambda c: ('get', '/customer/dashboard/', {})),
+    ('customer_cart', 'customer_cart', 'customer', lambda c: ('get', '/customer/cart/', {})),
+    ('customer_orders', 'customer_orders', 'customer', lambda c: ('get', '/customer/orders/', {})),
+    ('customer_orders_history', 'customer_orders', 'customer', lambda c: (
+        'get', '/customer/orders/', {'data': {'history': '1'}})),
+    ('checkout', 'checkout', 'customer', lambda c: (
+        'post', '/customer/checkout/', {'data': {'full_name': 'Bench', 'phone': '1', 'address': 'Main Road',
+                                                 'payment_method': 'cash_on_delivery', 'cart_data': _cart(c)}})),
+
+    ('delivery_login_page', 'delivery_login', None, lambda c: ('get', '/delivery/login/', {})),
+    ('delivery_login', 'delivery_login', None, lambda c: (
+        'post', '/delivery/login/', {'data': {'email': c.emails['partner'], 'password': c.password}})),
+    ('delivery_register', 'delivery_register', None, lambda c: (
+        'post', '/delivery/register/', {'data': {'full_name': 'Bench', 'email': _email('partner'),
+                                                 'password': c.password, 'vehicle_type': 'Scooter'}})),
+    ('delivery_dashboard', 'delivery_dashboard', 'delivery', lambda c: ('get', '/delivery/dashboard/', {})),
+    ('accept_delivery_order', 'accept_delivery_order', 'delivery', lambda c: (
+        'post', f'/delivery/accept-order/{_order(c, "ready").pk}/', {})),
+    ('update_delivery_status', 'update_delivery_status', 'delivery', lambda c: (
+        'post', f'/delivery/update-status/{_order(c, "assigned", partner=True).pk}/',
+        {'data': {'status': 'out_for_delivery'}})),
+
+    ('ai_chat', 'ai_chat', None, lambda c: ('post', '/api/ai/chat/', _json({'message': 'Do you have rice?'}))),
+    ('api_customer_login', 'api_customer_login', None, lambda c: (
+        'post', '/api/customer/login/', _json({'email': c.emails['customer'], 'password': c.password}))),
+    ('api_customer_register', 'api_customer_register', None, lambda c: (
+        'post', '/api/customer/register/', _json({'name': 'Bench', 'email': _email('customer'), 'phone': '1',
+                                                  'password': c.password}))),
+    ('api_shopkeeper_login', 'api_shopkeeper_login', None, lambda c: (
+        'post', '/api/shopkeeper/login/', _json({'email': c.emails['shop'], 'password': c.password}))),
+    ('api_shopkeeper_register', 'api_shopkeeper_register', None, lambda c: (
+        'post', '/api/shopkeeper/register/', _json({'name': 'Bench Shop', 'email': _email('shop'),
+                                                    'address': 'Main Road', 'password': c.password}))),
+    ('api_delivery_login', 'api_delivery_login', None, lambda c: (
+        'post', '/api/delivery/login/', _json({'email': c.emails['partner'], 'password': c.password}))),
+    ('api_delivery_register', 'api_delivery_register', None, lambda c: (
+        'post', '/api/delivery/register/', _json({'name': 'Bench', 'email': _email('partner'),
+                                                  'vehicle': 'Scooter', 'password': c.password}))),
+    ('api_products', 'api_products', None, lambda c: ('get', '/api/products/', {})),
+    ('api_products_shopwise', 'api_products', None, lambda c: (
+        'get', '/api/products/', {'data': {'mode': 'shopwise'}})),
+    ('api_products_search', 'api_products', None, lambda c: ('get', '/api/products/', {'data': {'q': 'rice'}})),
+]
+OK_STATUSES = (200, 302)
+
+
+def uncovered_routes():
+    """URL names in members.urls without a scenario."""
+    from members.urls import urlpatterns
+    covered = {url_name for _, url_name, _, _ in SCENARIOS}
+    return sorted({p.name for p in urlpatterns if p.name} - covered)
+
+
+def seed(args):
+    from members.models import Product
+    from members.synthetic import email, generate
+    info = generate(shops=args.shops, customers=max(args.workers, 20), partners=max(args.workers, 5),
+                    products=args.products, orders=args.orders, days=90, seed=args.seed, tag='bench',
+                    password=args.password)
+    by_shop = {}
+    for pid, shop_id in Product.objects.values_list('pk', 'shopkeeper_id'):
+        by_shop.setdefault(shop_id, []).append(pid)
+    products = [pid for pids in by_shop.values() for pid in pids]
+    contexts = []
+    for i in range(args.workers):
+        shop = info['shop_id'] + i % args.shops
+        contexts.append(Context(
+            shop_id=shop, customer_id=info['customer_id'] + i, partner_id=info['partner_id'] + i,
+            shop_products=by_shop[shop], products=products, rng=random.Random(args.seed + i),
+            password=args.password,
+            emails={'shop': email('shop', i % args.shops, 'bench'), 'customer': email('customer', i, 'bench'),
+                    'partner': email('partner', i, 'bench')},
+        ))
+    return contexts
+
+
+def send(client, ctx, builder):
+    """Build one request (untimed) and send it. Returns (ms, queries, status, failed)."""
+    from django.contrib.messages import constants
+    from django.db import connection
+    from members.metrics import QueryStats
+    method, path, kwargs = builder(ctx)
+    stats = QueryStats()
+    started = time.perf_counter()
+    with connection.execute_wrapper(stats):
+        response = getattr(client, method)(path, **kwargs)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+    elapsed = (time.perf_counter() - started) * 1000
+    levels = getattr(getattr(response.wsgi_request, '_messages', None), 'added_levels', ())
+    failed = response.status_code not in OK_STATUSES or any(level >= constants.ERROR for level in levels)
+    return elapsed, stats.count, response.status_code, failed
+
+
+def run_route(scenario, contexts, requests, warmup):
+    from django.db import connection
+    name, _, role, builder = scenario
+    barrier = threading.Barrier(len(contexts))
+    samples = []
+    lock = threading.Lock()
+
+    def worker(ctx):
+        try:
+            account = {'customer': ctx.customer_id, 'shopkeeper': ctx.shop_id, 'delivery': ctx.partner_id}
+            client = logged_in(role, account[role]) if role else client_class()()
+            for _ in range(warmup):
+                send(client, ctx, builder)
+            barrier.wait()
+            local = [send(client, ctx, builder) for _ in range(requests)]
+            with lock:
+                samples.extend(local)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(ctx,)) for ctx in contexts]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    result = summarize([s[0] for s in samples])
+    queries = [s[1] for s in samples]
+    statuses = {}
+    for s in samples:
+        statuses[str(s[2])] = statuses.get(str(s[2]), 0) + 1
+    result.update({
+        'requests_per_s': round(len(samples) / wall, 1) if wall else 0.0,
+        'queries_mean': round(sum(queries) / len(queries), 1) if queries else 0.0,
+        'queries_max': max(queries, default=0),
+        'failures': sum(1 for s in samples if s[3]),
+        'statuses': statuses,
+    })
+    return result
+
+
+def count_regressions(current, baseline, metrics, slack=0.0):
+    """Any increase in a count beyond `slack`, including up from zero."""
+    regressions = []
+    for name, values in current.items():
+        for metric in metrics:
+            new, old = values.get(metric), baseline.get(name, {}).get(metric)
+            if new is not None and old is not None and new > old + slack:
+                regressions.append({'name': name, 'metric': metric, 'baseline': old, 'current': new,
+                                    'change_pct': round((new - old) / old * 100, 1) if old else None})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', help='Comma-separated scenario names (default: all)')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent client threads')
+    parser.add_argument('--requests', type=int, default=20, help='Timed requests per worker per route')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed requests per worker first')
+    parser.add_argument('--shops', type=int, default=20)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--password', default='password123')
+    parser.add_argument('--output', help='Write JSON results to this path')
+    parser.add_argument('--baseline', help='Compare against this results file')
+    parser.add_argument('--write-baseline', help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative latency growth')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.conf import settings
+    settings.MESSAGE_STORAGE = 'benchmarks.http_routes.RecordingStorage'
+    # Every client thread shares one IP; measure the views, not members.ratelimit
+    settings.RATE_LIMIT_ENABLED = False
+    # 5xx responses are counted per route; don't print a traceback for each
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    scenarios = SCENARIOS
+    if args.routes:
+        wanted = set(args.routes.split(','))
+        unknown = wanted - {s[0] for s in SCENARIOS}
+        if unknown:
+            parser.error(f"unknown route(s): {', '.join(sorted(unknown))}")
+        scenarios = [s for s in SCENARIOS if s[0] in wanted]
+    missing = uncovered_routes()
+    if missing:
+        print(f"WARNING: no scenario for {', '.join(missing)}")
+
+    client_class()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        with test_database(path=os.path.join(tmp, 'routes.sqlite3')):
+            contexts = seed(args)
+            for scenario in scenarios:
+                results[scenario[0]] = run_route(scenario, contexts, args.requests, args.warmup)
+                r = results[scenario[0]]
+                print(f"{scenario[0]:<26}{r['requests_per_s']:>9.1f}/s  p50 {r['p50_ms']:>8.1f}  "
+                      f"p99 {r['p99_ms']:>8.1f} ms  {r['queries_mean']:>6.1f} queries"
+                      + (f"  {r['failures']} failed {r['statuses']}" if r['failures'] else ''))
+
+    report = {'benchmark': 'http_routes', 'env': environment(), 'args': vars(args), 'routes': results}
+    if args.baseline:
+        baseline = load_json(args.baseline)['routes']
+        report['regressions'] = (
+            compare_to_baseline(results, baseline, ('p50_ms', 'p99_ms'), tolerance=args.tolerance, min_delta=1.0)
+            # Mean, not max: a few requests also create counter rows or queue tasks
+            + count_regressions(results, baseline, ('queries_mean',), slack=0.5)
+            + count_regressions(results, baseline, ('failures',))
+        )
+        for reg in report['regressions']:
+            change = f" ({reg['change_pct']:+}%)" if reg['change_pct'] is not None else ''
+            print(f"REGRESSION {reg['name']}.{reg['metric']}: {reg['baseline']} -> {reg['current']}{change}")
+    if args.output:
+        write_json(args.output, report)
+    if args.write_baseline:
+        write_json(args.write_baseline, report)
+    if any(r['failures'] for r in results.values()):
+        print('Some requests failed; see "failures" and "statuses" per route')
+    if args.fail_on_regression and report.get('regressions'):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Compare the chat model's CPU backends: fp32 pipeline vs int8 ONNX Runtime vs torch dynamic int8.
+
+Each backend runs in its own subprocess so resident memory is measured in isolation.
+
+    python manage.py export_quantized_model      # once, for the onnx backend
+    python -m benchmarks.textgen_backends --runs 20 --output bench/textgen.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from benchmarks._common import REPO_ROOT, environment, peak_rss_mb, rss_mb, summarize, write_json
+
+PROMPTS = [
+    "How do I track my order?",
+    "What payment methods do you accept?",
+    "Tell me about fresh vegetables from local shops.",
+    "Can I return a damaged item?",
+    "Which shops deliver in the evening?",
+]
+
+
+def run_worker(backend, runs, max_new_tokens):
+    from benchmarks._common import setup_django
+    setup_django()
+    from members import ai_bot
+
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    pipe = ai_bot._load_pipeline_optional(backend)
+    load_s = time.perf_counter() - started
+    if pipe is None:
+        return {'backend': backend, 'available': False}
+    rss_loaded = rss_mb()
+
+    kwargs = {'max_new_tokens': max_new_tokens, 'do_sample': False, 'return_full_text': False}
+    pipe(PROMPTS[0], **kwargs)  # warm-up
+
+    latencies, tokens = [], 0
+    for i in range(runs):
+        prompt = PROMPTS[i % len(PROMPTS)]
+        t0 = time.perf_counter()
+        out = pipe(prompt, **kwargs)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        tokens += len(pipe.tokenizer(out[0]['generated_text'])['input_ids'])
+
+    total_s = sum(latencies) / 1000
+    return {
+        'backend': backend,
+        'available': True,
+        'load_s': round(load_s, 3),
+        'latency': summarize(latencies),
+        'generated_tokens': tokens,
+        'tokens_per_s': round(tokens / total_s, 2) if total_s else 0.0,
+        'rss_model_mb': round(rss_loaded - rss_before, 1),
+        'rss_peak_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', default='pipeline,onnx,torch_int8')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--max-new-tokens', type=int, default=48)
+    parser.add_argument('--output', help='Write JSON results to this path')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.runs, args.max_new_tokens)))
+        return
+
+    results = []
+    for backend in [b.strip() for b in args.backends.split(',') if b.strip()]:
+        proc = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.textgen_backends', '--worker', backend,
+             '--runs', str(args.runs), '--max-new-tokens', str(args.max_new_tokens)],
+            cwd=REPO_ROOT, capture_output=True, text=True,
+        )
+        lines = [l for l in proc.stdout.splitlines() if l.startswith('{')]
+        if proc.returncode or not lines:
+            results.append({'backend': backend, 'available': False, 'error': proc.stderr.strip()[-500:]})
+        else:
+            results.append(json.loads(lines[-1]))
+
+    print(f"{'backend':<12}{'p50 ms':>10}{'p95 ms':>10}{'tok/s':>10}{'model MB':>10}{'peak MB':>10}")
+    for r in results:
+        if not r['available']:
+            print(f"{r['backend']:<12}{'unavailable':>10}")
+            continue
+        print(f"{r['backend']:<12}{r['latency']['p50_ms']:>10.1f}{r['latency']['p95_ms']:>10.1f}"
+              f"{r['tokens_per_s']:>10.1f}{r['rss_model_mb']:>10.1f}{r['rss_peak_mb']:>10.1f}")
+
+    if args.output:
+        write_json(args.output, {'benchmark': 'textgen_backends', 'env': environment(), 'results': results})
+
+
+if __name__ == '__main__':
+    main()
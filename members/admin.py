@@ -1,87 +1,100 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib import messages
-from django.db import transaction, models
-from .models import Shopkeeper, Customer, DeliveryPartner, Product, Order, OrderItem
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .models import Shopkeeper, Customer, DeliveryPartner, Product, Order, OrderItem, ArchivedOrder, Task
+from .purge import purge
+
+
+# ---------- Paginator for large tables ----------
+class LargeTablePaginator(Paginator):
+    """Paginator that never runs an unbounded COUNT(*).
+
+    Unfiltered PostgreSQL tables use the planner's row estimate; everything else
+    counts at most `count_limit` rows, so pages past the limit are reached by
+    filtering or searching rather than paging.
+    """
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if not hasattr(qs, 'query'):
+            return super().count
+        if not qs.query.where and connections[qs.db].vendor == 'postgresql':
+            with connections[qs.db].cursor() as cursor:
+                cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [qs.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] > self.count_limit:
+                return int(row[0])
+        return qs.order_by().values('pk')[:self.count_limit].count()
 
 
 # ---------- Base Admin with Safe Delete ----------
 class SafeDeleteAdmin(admin.ModelAdmin):
-    """Base admin that cascades deletes to related objects to avoid FK errors."""
-    actions = ['safe_delete_selected']
+    """Base admin that cascades deletes to related objects to avoid FK errors.
+    The actual work is done by members.purge in short, chunked transactions."""
+    actions = ['safe_delete_selected', 'preview_delete_selected']
 
     def get_actions(self, request):
         """Remove default delete and use our safe cascade delete."""
         actions = super().get_actions(request)
         if 'delete_selected' in actions:
             del actions['delete_selected']
-        # Ensure our safe delete action is properly registered
+        # Ensure our safe delete actions are properly registered
         if 'safe_delete_selected' not in actions:
             actions['safe_delete_selected'] = (
                 SafeDeleteAdmin.safe_delete_selected,
                 'safe_delete_selected',
                 "Delete selected safely (cascade)"
             )
+        if 'preview_delete_selected' not in actions:
+            actions['preview_delete_selected'] = (
+                SafeDeleteAdmin.preview_delete_selected,
+                'preview_delete_selected',
+                "Preview safe delete (dry run)"
+            )
         return actions
 
     def safe_delete_selected(self, request, queryset):
         """Custom admin action to delete with cascade cleanup."""
         self.delete_queryset(request, queryset)
+    safe_delete_selected.short_description = "Delete selected safely (cascade)"
+
+    def preview_delete_selected(self, request, queryset):
+        """Report what a safe delete would touch without changing anything."""
+        result = purge(self.model, queryset, dry_run=True)
+        self.message_user(request, result.summary(), messages.INFO)
+    preview_delete_selected.short_description = "Preview safe delete (dry run)"
 
     def delete_queryset(self, request, queryset):
+        model_name = self.model.__name__
         try:
-            with transaction.atomic():
-                model_name = self.model.__name__
-
-                if model_name == "Product":
-                    # ✅ FIXED: Don't delete OrderItems - let Django handle it with SET_NULL
-                    # The OrderItem.product field will be set to NULL automatically
-                    # This preserves order history while removing the product reference
-                    count = queryset.count()
-                    queryset.delete()  # Django will automatically set OrderItem.product to NULL
-                    
-                    self.message_user(
-                        request,
-                        f"Deleted {count} Product(s). Order history preserved with product references set to null.",
-                        messages.SUCCESS
-                    )
-                    return  # Early return to avoid duplicate deletion
-
-                elif model_name == "Order":
-                    OrderItem.objects.filter(order__in=queryset).delete()
-
-                elif model_name == "Customer":
-                    orders = Order.objects.filter(customer__in=queryset)
-                    OrderItem.objects.filter(order__in=orders).delete()
-                    orders.delete()
-
-                elif model_name == "Shopkeeper":
-                    # Delete orders linked directly to shopkeeper
-                    direct_orders = Order.objects.filter(shopkeeper__in=queryset)
-                    OrderItem.objects.filter(order__in=direct_orders).delete()
-                    direct_orders.delete()
-
-                    # For products: let Django handle SET_NULL for OrderItems automatically
-                    products = Product.objects.filter(shopkeeper__in=queryset)
-                    products.delete()  # OrderItems will have product set to NULL
-
-                elif model_name == "DeliveryPartner":
-                    # Unassign delivery partner from orders
-                    Order.objects.filter(delivery_partner__in=queryset).update(delivery_partner=None)
-
-                count = queryset.count()
-                queryset.delete()
-                self.message_user(
-                    request,
-                    f"Deleted {count} {model_name}(s) and related records successfully.",
-                    messages.SUCCESS
-                )
+            result = purge(self.model, queryset)
         except Exception as e:
             self.message_user(
                 request,
-                f"Error deleting {self.model.__name__}: {str(e)}",
+                f"Error deleting {model_name}: {str(e)}",
                 messages.ERROR
             )
+            return
+
+        if model_name == "Product":
+            self.message_user(
+                request,
+                f"Deleted {result.target_count} Product(s). Order history preserved with product references set to null.",
+                messages.SUCCESS
+            )
+        else:
+            self.message_user(
+                request,
+                f"Deleted {result.target_count} {model_name}(s) and related records successfully. {result.summary()}.",
+                messages.SUCCESS
+            )
 
 
 # ---------- Shopkeeper Admin ----------
@@ -108,38 +121,58 @@ class ShopkeeperAdmin(UserAdmin, SafeDeleteAdmin):
 class ProductAdmin(SafeDeleteAdmin):
     list_display = ('name', 'shopkeeper', 'price', 'quantity', 'has_orders')
     list_filter = ('shopkeeper',)
+    list_select_related = ('shopkeeper',)
     search_fields = ('name', 'description')
-    
+
+    def get_queryset(self, request):
+        # One correlated EXISTS in the changelist query instead of one query per row
+        return super().get_queryset(request).annotate(
+            _has_orders=Exists(OrderItem.objects.filter(product=OuterRef('pk')))
+        )
+
     def has_orders(self, obj):
+        if hasattr(obj, '_has_orders'):
+            return obj._has_orders
         return obj.has_orders()
     has_orders.boolean = True
     has_orders.short_description = 'Has Orders'
+    has_orders.admin_order_field = '_has_orders'
 
 
 # ---------- Order Admin ----------  
 class OrderAdmin(SafeDeleteAdmin):
     list_display = ('id', 'customer', 'shopkeeper', 'status', 'total_amount', 'date')
     list_filter = ('status', 'date', 'shopkeeper')
+    list_select_related = ('customer', 'shopkeeper')
     search_fields = ('customer__name', 'shopkeeper__name', 'id')
+    paginator = LargeTablePaginator
+    show_full_result_count = False
 
 
 # ---------- OrderItem Admin (Enhanced to show deleted products) ----------
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('order_id', 'product_name', 'quantity', 'price', 'order_status')
     list_filter = ('order__status',)
+    list_select_related = ('order', 'product')
     search_fields = ('order__id', 'product__name')
+    paginator = LargeTablePaginator
+    show_full_result_count = False
     
     def order_id(self, obj):
-        return f"Order #{obj.order.id}"
+        return f"Order #{obj.order_id}"
     order_id.short_description = 'Order'
+    order_id.admin_order_field = 'order_id'
     
     def product_name(self, obj):
-        return obj.product.name if obj.product else '[Deleted Product]'
+        if obj.product:
+            return obj.product.name
+        return f"{obj.product_name} [Deleted Product]" if obj.product_name else '[Deleted Product]'
     product_name.short_description = 'Product'
     
     def order_status(self, obj):
         return obj.order.status
     order_status.short_description = 'Order Status'
+    order_status.admin_order_field = 'order__status'
 
 
 # ---------- Customer Admin ----------
@@ -154,10 +187,49 @@ class DeliveryPartnerAdmin(SafeDeleteAdmin):
     search_fields = ('name', 'email', 'vehicle')
 
 
+# ---------- Archived Order Admin (read-only) ----------
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'customer_id', 'shop_name', 'status', 'total_amount', 'date', 'archived_at')
+    list_filter = ('status', 'month')
+    search_fields = ('id', 'shop_name')
+    paginator = LargeTablePaginator
+    show_full_result_count = False
+    exclude = ('payload',)
+    readonly_fields = ('id', 'customer_id', 'shopkeeper_id', 'shop_name', 'status', 'total_amount', 'date',
+                       'month', 'archived_at', 'details')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# ---------- Background Task Admin ----------
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('name', 'payload', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at',
+                       'started_at', 'finished_at', 'locked_by', 'last_error')
+    paginator = LargeTablePaginator
+    show_full_result_count = False
+    actions = ['retry_tasks']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Retry selected failed tasks')
+    def retry_tasks(self, request, queryset):
+        n = queryset.filter(status=Task.FAILED).update(status=Task.QUEUED, attempts=0, run_at=timezone.now())
+        self.message_user(request, f'{n} task(s) queued again.', messages.SUCCESS)
+
+
 # ---------- Register Admin Classes ----------
 admin.site.register(Shopkeeper, ShopkeeperAdmin)
 admin.site.register(Customer, CustomerAdmin)
 admin.site.register(DeliveryPartner, DeliveryPartnerAdmin)
 admin.site.register(Product, ProductAdmin)
 admin.site.register(Order, OrderAdmin)
-admin.site.register(OrderItem, OrderItemAdmin)
\ No newline at end of file
+admin.site.register(OrderItem, OrderItemAdmin)
+admin.site.register(ArchivedOrder, ArchivedOrderAdmin)
+admin.site.register(Task, TaskAdmin)
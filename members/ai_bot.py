@@ -1,60 +1,356 @@
 import os
+import re
 import threading
-from typing import List, Optional
+import time
+from typing import List, Optional, Tuple
 
 # Lazy state
 _model_lock = threading.Lock()
-_model = None
+_models = {}  # backend name -> loaded pipeline, or None if it failed to load
 _default_gen_model = os.environ.get('AI_TEXT_GEN_MODEL', 'distilgpt2')
+# 'pipeline' (fp32 transformers), 'onnx' (int8 ONNX Runtime export) or 'torch_int8' (dynamic quantization)
+_default_backend = os.environ.get('AI_TEXT_GEN_BACKEND', 'pipeline').lower()
+TEXT_GEN_BACKENDS = ('pipeline', 'onnx', 'torch_int8')
 
+# Which path answered each reply and how long it took ('catalog', 'intent', 'local', 'hf', 'rule')
+REPLY_PATHS = ('catalog', 'intent', 'local', 'hf', 'rule')
+_reply_local = threading.local()
+_reply_stats_lock = threading.Lock()
+_reply_stats = {'model_cache_hits': 0, 'model_cache_misses': 0}
+_reply_paths = {path: {'count': 0, 'ms_total': 0.0} for path in REPLY_PATHS}
 
-def _load_pipeline_optional():
-	"""Try to load a local transformers pipeline if libs are installed; otherwise None."""
-	global _model
+
+def _record_reply(path: str, started: float) -> None:
+	elapsed_ms = (time.perf_counter() - started) * 1000
+	_reply_local.path = path
+	_reply_local.elapsed_ms = elapsed_ms
+	with _reply_stats_lock:
+		_reply_paths[path]['count'] += 1
+		_reply_paths[path]['ms_total'] += elapsed_ms
+
+
+def last_reply_path() -> Optional[str]:
+	"""Path that produced the most recent reply on this thread."""
+	return getattr(_reply_local, 'path', None)
+
+
+def get_reply_stats() -> dict:
+	"""Per-path reply counts and total time, plus local model cache hits/misses."""
+	with _reply_stats_lock:
+		paths = {path: dict(v) for path, v in _reply_paths.items()}
+		stats = dict(_reply_stats)
+	stats['paths'] = paths
+	return stats
+
+
+def reset_reply_stats() -> None:
+	with _reply_stats_lock:
+		for key in _reply_stats:
+			_reply_stats[key] = 0
+		for v in _reply_paths.values():
+			v['count'] = 0
+			v['ms_total'] = 0.0
+
+
+def default_onnx_model_dir(model_name: str = _default_gen_model) -> str:
+	"""Where `manage.py export_quantized_model` writes the int8 ONNX export by default.
+	A relative path is taken from BASE_DIR, not from the directory the server was started in."""
+	from django.conf import settings
+	path = os.environ.get('AI_ONNX_MODEL_DIR') or os.path.join('models', model_name.replace('/', '--') + '-onnx-int8')
+	return os.path.join(settings.BASE_DIR, path)
+
+
+def _conv1d_to_linear(model):
+	"""GPT-2 style models use transformers' Conv1D, which quantize_dynamic skips; swap in equivalent nn.Linear."""
+	import torch  # type: ignore
+	from transformers.pytorch_utils import Conv1D  # type: ignore
+	for parent in list(model.modules()):
+		for name, child in list(parent.named_children()):
+			if isinstance(child, Conv1D):
+				in_features, out_features = child.weight.shape
+				linear = torch.nn.Linear(in_features, out_features)
+				linear.weight.data = child.weight.data.t().contiguous()
+				linear.bias.data = child.bias.data
+				setattr(parent, name, linear)
+	return model
+
+
+def _build_pipeline(backend: str):
+	from transformers import pipeline  # type: ignore
+	if backend == 'onnx':
+		from optimum.onnxruntime import ORTModelForCausalLM  # type: ignore
+		from transformers import AutoTokenizer  # type: ignore
+		model_dir = default_onnx_model_dir()
+		model = ORTModelForCausalLM.from_pretrained(model_dir, file_name='model_quantized.onnx')
+		tokenizer = AutoTokenizer.from_pretrained(model_dir)
+		return pipeline('text-generation', model=model, tokenizer=tokenizer, device=-1)
+	if backend == 'torch_int8':
+		import torch  # type: ignore
+		from transformers import AutoModelForCausalLM, AutoTokenizer  # type: ignore
+		model = AutoModelForCausalLM.from_pretrained(_default_gen_model, torch_dtype=torch.float32)
+		model = _conv1d_to_linear(model).eval()
+		model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+		tokenizer = AutoTokenizer.from_pretrained(_default_gen_model)
+		return pipeline('text-generation', model=model, tokenizer=tokenizer, device=-1)
+	return pipeline('text-generation', model=_default_gen_model, device=-1)
+
+
+def _load_pipeline_optional(backend: Optional[str] = None):
+	"""Try to load a local text-generation pipeline for `backend` (default AI_TEXT_GEN_BACKEND).
+	Returns None if the libs or model files are missing; the failure is remembered so it isn't retried per message."""
+	backend = (backend or _default_backend).lower()
+	if backend not in TEXT_GEN_BACKENDS:
+		backend = 'pipeline'
 	with _model_lock:
-		if _model is not None:
-			return _model
+		hit = backend in _models
+		if not hit:
+			try:
+				_models[backend] = _build_pipeline(backend)
+			except Exception:
+				_models[backend] = None
+		pipe = _models[backend]
+	with _reply_stats_lock:
+		_reply_stats['model_cache_hits' if hit else 'model_cache_misses'] += 1
+	return pipe
+
+
+_approx_token_re = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def count_tokens(text: str) -> int:
+	"""Token count with the loaded model's tokenizer, else a word/punctuation approximation."""
+	tokenizer = getattr(_models.get(_default_backend), 'tokenizer', None)
+	if tokenizer is not None:
 		try:
-			from transformers import pipeline  # type: ignore
-			_model = pipeline('text-generation', model=_default_gen_model, device=-1)
-			return _model
+			return len(tokenizer(text)['input_ids'])
 		except Exception:
-			_model = None
-			return None
+			pass
+	return len(_approx_token_re.findall(text or ''))
+
+
+class _CircuitBreaker:
+	"""Minimal closed/open/half-open breaker so a dead endpoint is skipped instead of retried per message."""
+
+	def __init__(self, threshold: int, cooldown: float):
+		self.threshold = threshold
+		self.cooldown = cooldown
+		self._lock = threading.Lock()
+		self._failures = 0
+		self._opened_at: Optional[float] = None
+
+	@property
+	def state(self) -> str:
+		with self._lock:
+			if self._opened_at is None:
+				return 'closed'
+			if time.monotonic() - self._opened_at >= self.cooldown:
+				return 'half_open'
+			return 'open'
+
+	def allow(self) -> bool:
+		"""True if a call may go out. After the cooldown one probe is let through (half-open)."""
+		with self._lock:
+			if self._opened_at is None:
+				return True
+			if time.monotonic() - self._opened_at >= self.cooldown:
+				# Re-arm the timer so concurrent callers don't all probe at once
+				self._opened_at = time.monotonic()
+				return True
+			return False
+
+	def record_success(self) -> None:
+		with self._lock:
+			self._failures = 0
+			self._opened_at = None
+
+	def record_failure(self) -> None:
+		with self._lock:
+			self._failures += 1
+			if self._failures >= self.threshold:
+				self._opened_at = time.monotonic()
+
+	def reset(self) -> None:
+		self.record_success()
+
+
+# Pooled HTTP state for the HF fallback (created lazily, shared by all threads)
+_hf_session_lock = threading.Lock()
+_hf_session = None
+_hf_breaker = _CircuitBreaker(
+	threshold=int(os.environ.get('HF_BREAKER_THRESHOLD', '3')),
+	cooldown=float(os.environ.get('HF_BREAKER_COOLDOWN', '30')),
+)
+_hf_metrics_lock = threading.Lock()
+_hf_metrics = {
+	'requests': 0,
+	'successes': 0,
+	'failures': 0,
+	'timeouts': 0,
+	'short_circuited': 0,
+	'latency_ms_total': 0.0,
+	'latency_ms_max': 0.0,
+}
+
+
+def _hf_timeout() -> Tuple[float, float]:
+	"""(connect, read) timeout budget in seconds; kept tight so a slow endpoint can't pin a worker."""
+	return (
+		float(os.environ.get('HF_CONNECT_TIMEOUT', '2')),
+		float(os.environ.get('HF_READ_TIMEOUT', '8')),
+	)
+
+
+def _get_hf_session():
+	"""Return the module-level keep-alive session, creating it on first use."""
+	global _hf_session
+	with _hf_session_lock:
+		if _hf_session is not None:
+			return _hf_session
+		import requests  # type: ignore
+		from requests.adapters import HTTPAdapter  # type: ignore
+		pool_size = int(os.environ.get('HF_POOL_SIZE', '8'))
+		session = requests.Session()
+		# No adapter-level retries: the breaker decides when to try again
+		adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+		session.mount('https://', adapter)
+		session.mount('http://', adapter)
+		session.headers.update({'Accept': 'application/json', 'Connection': 'keep-alive'})
+		_hf_session = session
+		return _hf_session
+
+
+def _hf_record(outcome: str, elapsed_ms: float = 0.0) -> None:
+	with _hf_metrics_lock:
+		_hf_metrics[outcome] += 1
+		if outcome != 'short_circuited':
+			_hf_metrics['requests'] += 1
+			_hf_metrics['latency_ms_total'] += elapsed_ms
+			_hf_metrics['latency_ms_max'] = max(_hf_metrics['latency_ms_max'], elapsed_ms)
+
+
+def get_hf_metrics() -> dict:
+	"""Snapshot of HF fallback counters plus the current breaker state."""
+	with _hf_metrics_lock:
+		snapshot = dict(_hf_metrics)
+	snapshot['latency_ms_avg'] = (snapshot['latency_ms_total'] / snapshot['requests']) if snapshot['requests'] else 0.0
+	snapshot['breaker_state'] = _hf_breaker.state
+	return snapshot
+
+
+def reset_hf_state() -> None:
+	"""Clear metrics, close the breaker and drop the pooled session (used by tests and benchmarks)."""
+	global _hf_session
+	with _hf_metrics_lock:
+		for key in _hf_metrics:
+			_hf_metrics[key] = 0.0 if key.startswith('latency') else 0
+	_hf_breaker.reset()
+	with _hf_session_lock:
+		if _hf_session is not None:
+			_hf_session.close()
+		_hf_session = None
+
+
+def _parse_hf_response(data, prompt: str) -> Optional[str]:
+	if isinstance(data, list) and data and isinstance(data[0], dict):
+		gen = data[0].get('generated_text')
+		if isinstance(gen, str) and gen:
+			return gen[len(prompt):].strip() or gen.strip()
+		for key in ('summary_text', 'text'):
+			if key in data[0] and isinstance(data[0][key], str):
+				return data[0][key].strip()
+	elif isinstance(data, dict):
+		for key in ('generated_text', 'summary_text', 'text'):
+			val = data.get(key)
+			if isinstance(val, str) and val:
+				return val.strip()
+	return None
 
 
 def _hf_generate(prompt: str) -> Optional[str]:
-	"""Call Hugging Face Inference API if HF_API_TOKEN is set. Returns text or None."""
+	"""Call Hugging Face Inference API if HF_API_TOKEN is set. Returns text or None.
+	Uses the pooled session, a short timeout budget and the circuit breaker."""
 	hf_token = os.environ.get('HF_API_TOKEN') or os.environ.get('HUGGINGFACEHUB_API_TOKEN')
 	if not hf_token:
 		return None
+	try:
+		from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout  # type: ignore
+	except ImportError:
+		return None
+	if not _hf_breaker.allow():
+		_hf_record('short_circuited')
+		return None
 	model_id = os.environ.get('HF_MODEL_ID', 'google/gemma-2-2b-it')
-	api_url = f"https://api-inference.huggingface.co/models/{model_id}"
+	api_base = os.environ.get('HF_API_BASE', 'https://api-inference.huggingface.co/models').rstrip('/')
+	api_url = f"{api_base}/{model_id}"
 	payload = {
 		"inputs": prompt,
 		"parameters": {"max_new_tokens": 120, "temperature": 0.7, "top_p": 0.9},
 	}
+	started = time.perf_counter()
 	try:
-		import requests  # type: ignore
-		headers = {"Authorization": f"Bearer {hf_token}", "Accept": "application/json"}
-		resp = requests.post(api_url, headers=headers, json=payload, timeout=30)
+		session = _get_hf_session()
+		headers = {"Authorization": f"Bearer {hf_token}"}
+		resp = session.post(api_url, headers=headers, json=payload, timeout=_hf_timeout())
 		resp.raise_for_status()
-		data = resp.json()
-		if isinstance(data, list) and data and isinstance(data[0], dict):
-			gen = data[0].get('generated_text')
-			if isinstance(gen, str) and gen:
-				return gen[len(prompt):].strip() or gen.strip()
-			for key in ('summary_text', 'text'):
-				if key in data[0] and isinstance(data[0][key], str):
-					return data[0][key].strip()
-		elif isinstance(data, dict):
-			for key in ('generated_text', 'summary_text', 'text'):
-				val = data.get(key)
-				if isinstance(val, str) and val:
-					return val.strip()
+		text = _parse_hf_response(resp.json(), prompt)
+	except Timeout:
+		# Connect and read timeouts both; checked first since ConnectTimeout is also a ConnectionError
+		outcome = 'timeouts'
+	except RequestsConnectionError:
+		# Refused or reset: the endpoint is down, not slow
+		outcome = 'failures'
+	except Exception:
+		# HTTP error status or a body that isn't JSON
+		outcome = 'failures'
+	else:
+		_hf_breaker.record_success()
+		_hf_record('successes', (time.perf_counter() - started) * 1000)
+		return text
+	_hf_breaker.record_failure()
+	_hf_record(outcome, (time.perf_counter() - started) * 1000)
+	return None
+
+
+_product_query_re = re.compile(
+	r'^(?:please\s+)?(?:search(?:\s+for)?|find|look\s+for|show\s+me|do\s+you\s+have|price\s+of|buy)\s+(.+?)[?.!]*$'
+)
+
+
+def _product_query(prompt: str) -> Optional[str]:
+	"""Extract the product phrase from requests like 'search rice' or 'do you have mustard oil?'."""
+	m = _product_query_re.match((prompt or '').strip().lower())
+	if not m:
+		return None
+	term = m.group(1).strip()
+	# 'show me products' / 'find my orders' are navigation, not catalog lookups
+	if not term or term in ('products', 'product', 'all products') or 'order' in term or 'dashboard' in term:
+		return None
+	return term
+
+
+def _catalog_reply(prompt: str) -> Optional[str]:
+	"""Answer product lookups from the in-memory catalog index instead of a language model."""
+	term = _product_query(prompt)
+	if not term:
 		return None
+	try:
+		from .catalog_index import search_products
+		matches = search_products(term, limit=5)
 	except Exception:
 		return None
+	if not matches:
+		# "show me customer login", "find help": not a product, let the intent rules answer
+		return None
+	lines = [f"{m['name']} — ₹{m['price']:.2f} ({m['shop']})" for m in matches]
+	reply = f"Here is what I found for '{term}':\n" + "\n".join(lines)
+	try:
+		from .recommendations import also_bought
+		extras = also_bought([matches[0]['id']], limit=3, exclude=[m['id'] for m in matches])
+	except Exception:
+		extras = []
+	if extras:
+		reply += f"\nCustomers who bought {matches[0]['name']} also bought: " + ", ".join(p.name for p in extras)
+	return reply
 
 
 def _intent_reply(prompt: str) -> Optional[str]:
@@ -106,7 +402,7 @@ def _intent_reply(prompt: str) -> Optional[str]:
 		return "Which dashboard should I open: Shopkeeper, Customer, or Delivery?"
 
 	# Browse products (customer-side discovery)
-	if any(_has(w) for w in [('browse', 'products'), ('show', 'products'), ('find', 'products')]) or 'browse products' in p or 'products' in p:
+	if any(_has(*w) for w in [('browse', 'products'), ('show', 'products'), ('find', 'products')]) or 'browse products' in p or 'products' in p:
 		return "You can browse products from the Customer menu or by saying 'customer dashboard'. I can also list product names — try 'search rice' or 'search oil'."
 
 	# Orders intents
@@ -126,37 +422,56 @@ def _intent_reply(prompt: str) -> Optional[str]:
 	return None
 
 
-def generate_ai_reply(messages: List[dict]) -> str:
+def generate_ai_reply(messages: List[dict], context=None) -> str:
 	"""Generate a reply given a chat history. Prefers local pipeline; falls back to HF API; then rules.
-	Also includes deterministic intent handling so common UX requests are always answered well."""
+	Also includes deterministic intent handling so common UX requests are always answered well.
+	`context` is an optional conversations.ChatContext whose pre-rendered, token-bounded prompt is
+	sent to the generators instead of the bare last message; they tokenize it themselves."""
+	started = time.perf_counter()
 	user_texts = [m['content'] for m in messages if m.get('role') == 'user']
 	prompt = user_texts[-1] if user_texts else ''
+	gen_prompt = context.prompt if context is not None and prompt else prompt
 
-	# 0) Intent handler first – ensures consistent UX answers
+	# 0) Catalog lookups and intent handler first – ensures consistent UX answers
+	catalog_text = _catalog_reply(prompt)
+	if catalog_text:
+		_record_reply('catalog', started)
+		return catalog_text
 	intent_text = _intent_reply(prompt)
 	if intent_text:
+		_record_reply('intent', started)
 		return intent_text
 
 	# 1) Try local transformers pipeline if available
 	pipe = _load_pipeline_optional()
 	if pipe is not None and prompt:
 		try:
-			out = pipe(prompt, max_new_tokens=100, do_sample=True, top_p=0.9, temperature=0.7, num_return_sequences=1)
+			out = pipe(gen_prompt, max_new_tokens=100, do_sample=True, top_p=0.9, temperature=0.7, num_return_sequences=1)
 			text = out[0].get('generated_text', '') if isinstance(out, list) else ''
-			return (text[len(prompt):].strip() or text.strip() or _rule_fallback(prompt))
+			reply = _first_turn(text[len(gen_prompt):]) or text.strip()
+			if reply:
+				_record_reply('local', started)
+				return reply
 		except Exception:
 			pass
 
 	# 2) Try hosted Hugging Face Inference API if token present
 	if prompt:
-		gen = _hf_generate(prompt)
+		gen = _hf_generate(gen_prompt)
 		if gen:
-			return gen
+			_record_reply('hf', started)
+			return _first_turn(gen) or gen
 
 	# 3) Rule-based fallback
+	_record_reply('rule', started)
 	return _rule_fallback(prompt)
 
 
+def _first_turn(text: str) -> str:
+	"""Cut a dialogue continuation at the point where the model starts writing the next user turn."""
+	return text.split('\nUser:', 1)[0].strip()
+
+
 def _rule_fallback(prompt: str) -> str:
 	if not prompt:
 		return "Hi! Ask me anything about products, orders, payments, and delivery."
@@ -0,0 +1,52 @@
+"""Move completed orders out of the hot Order/OrderItem tables into ArchivedOrder.
+
+Orders are archived in primary-key batches, one short transaction per batch: the
+archive rows are inserted and the hot rows deleted together, so an order is always
+in exactly one place. Run it on a schedule (`manage.py archive_orders`) and the hot
+tables only hold recent and in-flight orders.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, Order, OrderItem
+
+ARCHIVABLE_STATUSES = ('delivered', 'cancelled')
+DEFAULT_BATCH_SIZE = 500
+
+
+def archivable_orders(older_than_days=None, now=None):
+    if older_than_days is None:
+        older_than_days = settings.ORDER_ARCHIVE_AFTER_DAYS
+    cutoff = (now or timezone.now()) - timedelta(days=older_than_days)
+    return Order.objects.filter(status__in=ARCHIVABLE_STATUSES, date__lt=cutoff)
+
+
+def archive_orders(older_than_days=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, now=None):
+    """Archive delivered/cancelled orders older than the cutoff. Returns {'orders': n, 'items': n}."""
+    qs = archivable_orders(older_than_days, now)
+    if dry_run:
+        return {'orders': qs.count(), 'items': OrderItem.objects.filter(order__in=qs.values('pk')).count()}
+
+    totals = {'orders': 0, 'items': 0}
+    while True:
+        with transaction.atomic():
+            batch = list(
+                qs.select_related('shopkeeper').prefetch_related('items').order_by('pk')[:batch_size]
+            )
+            if not batch:
+                break
+            ArchivedOrder.objects.bulk_create(
+                [ArchivedOrder.from_order(order) for order in batch], ignore_conflicts=True
+            )
+            ids = [order.pk for order in batch]
+            totals['items'] += OrderItem.objects.filter(order_id__in=ids).delete()[0]
+            totals['orders'] += Order.objects.filter(pk__in=ids).delete()[1].get(Order._meta.label, 0)
+    return totals
+
+
+def customer_order_history(customer_id, limit=50):
+    """Archived orders for a customer, newest first (the read path for customer_orders)."""
+    return list(ArchivedOrder.objects.filter(customer_id=customer_id).order_by('-date')[:limit])
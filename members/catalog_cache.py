@@ -0,0 +1,39 @@
+"""Catalog version used to key cached product-grid fragments.
+
+Every product or shop change bumps the version (model signals, bulk import,
+thumbnail updates), which retires the cached customer_dashboard grid at once.
+Individual cards are cached under a digest of their own fields instead, so after
+a bump the grid is re-assembled from mostly warm cards. The version lives in the
+default cache; with the per-process LocMemCache other processes only see a bump
+when their grid fragment expires (CATALOG_CACHE_TIMEOUT), so use a shared cache
+backend when running several workers.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'catalog:version'
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a restarted cache never reuses an old version
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, int(time.time() * 1000), None)
+        return cache.get(VERSION_KEY)
+
+
+def catalog_product_count(version=None):
+    from .models import Product
+    version = version or catalog_version()
+    return cache.get_or_set(f'catalog:count:{version}', Product.objects.count, settings.CATALOG_CACHE_TIMEOUT)
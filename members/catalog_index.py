@@ -0,0 +1,206 @@
+"""In-memory product retrieval index used to ground bot answers in the real catalog.
+
+Products are embedded as hashed character n-gram TF vectors (name, description and
+shop name, with the name weighted highest). Postings are kept in NumPy arrays sorted
+by feature, so a query only touches the postings of its own n-grams and is scored
+with one `np.bincount`. Rows are updated one product at a time from model signals;
+the flat arrays are re-packed lazily on the next search.
+"""
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+N_FEATURES = 1 << 18
+NGRAM = 3
+FIELD_WEIGHTS = (('name', 3.0), ('shop', 1.5), ('description', 1.0))
+# Other processes don't see our signals, so fully reload after this many seconds
+MAX_AGE = float(os.environ.get('CATALOG_INDEX_MAX_AGE', '300'))
+
+_word_re = re.compile(r'[^\w]+', re.UNICODE)
+
+
+def _ngram_features(text, weight):
+    """Hashed char n-grams of each word (padded with spaces) -> {feature: weight}."""
+    feats = {}
+    for word in _word_re.split((text or '').lower()):
+        if not word:
+            continue
+        padded = f' {word} '
+        for i in range(max(1, len(padded) - NGRAM + 1)):
+            f = zlib.crc32(padded[i:i + NGRAM].encode('utf-8')) % N_FEATURES
+            feats[f] = feats.get(f, 0.0) + weight
+    return feats
+
+
+def _vectorize(fields):
+    feats = {}
+    for field, weight in FIELD_WEIGHTS:
+        for f, w in _ngram_features(fields.get(field), weight).items():
+            feats[f] = feats.get(f, 0.0) + w
+    if not feats:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    idx = np.fromiter(feats.keys(), dtype=np.int32, count=len(feats))
+    tf = np.fromiter(feats.values(), dtype=np.float32, count=len(feats))
+    # Sublinear TF, L2-normalised so long descriptions don't dominate
+    tf = 1.0 + np.log(tf)
+    tf /= np.linalg.norm(tf)
+    return idx, tf
+
+
+class ProductIndex:
+    """Thread-safe TF-IDF index over products, keyed by product id."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._rows = {}      # product id -> (feature idx, tf weights)
+        self._meta = {}      # product id -> {'id', 'name', 'price', 'shop'}
+        self._df = np.zeros(N_FEATURES, dtype=np.int32)
+        self._loaded_at = None
+        self._dirty = True
+        self.stats = {'searches': 0, 'rebuilds': 0, 'repacks': 0}
+        # Packed postings, sorted by feature
+        self._post_feat = np.empty(0, dtype=np.int32)
+        self._post_row = np.empty(0, dtype=np.int32)
+        self._post_tf = np.empty(0, dtype=np.float32)
+        self._row_ids = np.empty(0, dtype=np.int64)
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    def __len__(self):
+        return len(self._rows)
+
+    # --- maintenance -------------------------------------------------------
+
+    def rebuild(self):
+        """Full reload from the database."""
+        from .models import Product
+        with self._lock:
+            self._rows.clear()
+            self._meta.clear()
+            self._df[:] = 0
+            qs = Product.objects.values_list('id', 'name', 'description', 'price', 'shopkeeper__name')
+            for pid, name, description, price, shop in qs.iterator(chunk_size=2000):
+                self._put(pid, name, description, price, shop)
+            self._loaded_at = time.monotonic()
+            self._dirty = True
+            self.stats['rebuilds'] += 1
+
+    def upsert(self, product):
+        """Re-index a single product. No-op until the index has been loaded."""
+        with self._lock:
+            if not self.loaded:
+                return
+            self._drop(product.pk)
+            self._put(product.pk, product.name, product.description, product.price, product.shopkeeper.name)
+            self._dirty = True
+
+    def remove(self, product_id):
+        with self._lock:
+            if self.loaded and self._drop(product_id):
+                self._dirty = True
+
+    def reindex_shop(self, shopkeeper):
+        """A shop rename changes every product row of that shop."""
+        from .models import Product
+        with self._lock:
+            if not self.loaded:
+                return
+            for product in Product.objects.filter(shopkeeper=shopkeeper).select_related('shopkeeper'):
+                self.upsert(product)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _put(self, pid, name, description, price, shop):
+        idx, tf = _vectorize({'name': name, 'description': description, 'shop': shop})
+        self._rows[pid] = (idx, tf)
+        self._meta[pid] = {'id': pid, 'name': name, 'price': float(price), 'shop': shop or 'Unknown Shop'}
+        self._df[idx] += 1
+
+    def _drop(self, pid):
+        row = self._rows.pop(pid, None)
+        self._meta.pop(pid, None)
+        if row is None:
+            return False
+        self._df[row[0]] -= 1
+        return True
+
+    def _pack(self):
+        ids = list(self._rows)
+        lengths = np.fromiter((len(self._rows[i][0]) for i in ids), dtype=np.int64, count=len(ids))
+        if lengths.sum():
+            feat = np.concatenate([self._rows[i][0] for i in ids])
+            tf = np.concatenate([self._rows[i][1] for i in ids])
+        else:
+            feat = np.empty(0, dtype=np.int32)
+            tf = np.empty(0, dtype=np.float32)
+        row = np.repeat(np.arange(len(ids), dtype=np.int32), lengths)
+        order = np.argsort(feat, kind='stable')
+        self._post_feat = feat[order]
+        self._post_row = row[order]
+        self._post_tf = tf[order]
+        self._row_ids = np.asarray(ids, dtype=np.int64)
+        self._dirty = False
+        self.stats['repacks'] += 1
+
+    def _ensure_ready(self):
+        if not self.loaded or time.monotonic() - self._loaded_at > MAX_AGE:
+            self.rebuild()
+        if self._dirty:
+            self._pack()
+
+    # --- queries -----------------------------------------------------------
+
+    def search(self, query, limit=5, min_score=0.15):
+        """Return up to `limit` products ranked by cosine-style TF-IDF similarity."""
+        q_idx, q_tf = _vectorize({'name': query})
+        if not len(q_idx):
+            return []
+        with self._lock:
+            self.stats['searches'] += 1
+            self._ensure_ready()
+            n_docs = len(self._row_ids)
+            if not n_docs:
+                return []
+            idf = np.log((1.0 + n_docs) / (1.0 + self._df[q_idx])) + 1.0
+            q_w = q_tf * idf
+            q_w /= np.linalg.norm(q_w)
+            lo = np.searchsorted(self._post_feat, q_idx, side='left')
+            hi = np.searchsorted(self._post_feat, q_idx, side='right')
+            spans = hi - lo
+            if not spans.sum():
+                return []
+            sel = np.concatenate([np.arange(a, b) for a, b in zip(lo, hi) if b > a])
+            weights = self._post_tf[sel] * np.repeat(q_w * idf, spans)
+            scores = np.bincount(self._post_row[sel], weights=weights, minlength=n_docs)
+            # Scale so a perfect self-match scores ~1 regardless of catalog size
+            scores /= float(np.dot(q_w, q_tf * idf)) or 1.0
+            k = min(limit, n_docs)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            results = []
+            for r in top:
+                if scores[r] < min_score:
+                    break
+                item = dict(self._meta[int(self._row_ids[r])])
+                item['score'] = round(float(scores[r]), 4)
+                results.append(item)
+            return results
+
+
+_index = ProductIndex()
+
+
+def get_index():
+    return _index
+
+
+def search_products(query, limit=5):
+    return _index.search(query, limit=limit)
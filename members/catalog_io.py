@@ -0,0 +1,176 @@
+"""Streaming CSV/JSONL import and export of a shop's products.
+
+Import reads rows one at a time, validates and upserts them in batches keyed on
+(shopkeeper, name): one SELECT for the batch's existing names, then one
+bulk_update and one bulk_create. Export walks the catalog with `.iterator()` and
+yields encoded lines, so memory stays flat whatever the catalog size.
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .catalog_cache import bump_catalog_version
+from .catalog_index import get_index
+from .models import Product
+
+FIELDS = ('name', 'price', 'quantity', 'description')
+FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 50
+
+_name_max = Product._meta.get_field('name').max_length
+_quantity_max = Product._meta.get_field('quantity').max_length
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.rows = 0
+        self.errors = []  # (line number, message), capped at MAX_REPORTED_ERRORS
+        self.error_count = 0
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def summary(self):
+        text = f"{self.created} created, {self.updated} updated"
+        if self.error_count:
+            text += f", {self.error_count} row(s) skipped"
+        return text
+
+
+def detect_format(filename, default='csv'):
+    lower = (filename or '').lower()
+    if lower.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if lower.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def _read_rows(stream, fmt):
+    """Yield (line number, dict) pairs from a text stream without loading it whole."""
+    if fmt == 'jsonl':
+        for line_no, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_no, None
+                continue
+            yield line_no, row if isinstance(row, dict) else None
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def _clean(row):
+    """Validated field dict for a raw row, or raise ValueError with a readable message."""
+    if row is None:
+        raise ValueError('not a valid record')
+    name = str(row.get('name') or '').strip()
+    quantity = str(row.get('quantity') or '').strip()
+    description = str(row.get('description') or '').strip()
+    if not name:
+        raise ValueError('name is required')
+    if len(name) > _name_max:
+        raise ValueError(f'name is longer than {_name_max} characters')
+    if not quantity:
+        raise ValueError('quantity is required')
+    if len(quantity) > _quantity_max:
+        raise ValueError(f'quantity is longer than {_quantity_max} characters')
+    try:
+        price = Decimal(str(row.get('price')).strip())
+        # NaN survives quantize() and then fails comparisons with InvalidOperation
+        if not price.is_finite():
+            raise ValueError
+        price = price.quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise ValueError('price must be a number')
+    if price < 0 or price >= Decimal('100000000'):
+        raise ValueError('price is out of range')
+    return {'name': name, 'price': price, 'quantity': quantity, 'description': description}
+
+
+def _flush(shopkeeper, batch, result):
+    # Last row wins when a name repeats inside the batch
+    by_name = {}
+    for fields in batch:
+        by_name[fields['name']] = fields
+    existing = {}
+    for product in Product.objects.filter(shopkeeper=shopkeeper, name__in=list(by_name)).order_by('-id'):
+        existing[product.name] = product  # lowest id wins if the shop already has duplicates
+    to_update, to_create = [], []
+    for name, fields in by_name.items():
+        product = existing.get(name)
+        if product is None:
+            to_create.append(Product(shopkeeper=shopkeeper, **fields))
+        else:
+            product.price = fields['price']
+            product.quantity = fields['quantity']
+            product.description = fields['description']
+            to_update.append(product)
+    with transaction.atomic():
+        if to_update:
+            Product.objects.bulk_update(to_update, ['price', 'quantity', 'description'])
+        if to_create:
+            Product.objects.bulk_create(to_create)
+    result.updated += len(to_update)
+    result.created += len(to_create)
+
+
+def import_products(shopkeeper, stream, fmt='csv', batch_size=DEFAULT_BATCH_SIZE):
+    """Upsert products for `shopkeeper` from a text stream. Invalid rows are skipped and reported."""
+    result = ImportResult()
+    batch = []
+    for line_no, row in _read_rows(stream, fmt):
+        result.rows += 1
+        try:
+            batch.append(_clean(row))
+        except ValueError as e:
+            result.add_error(line_no, str(e))
+            continue
+        if len(batch) >= batch_size:
+            _flush(shopkeeper, batch, result)
+            batch = []
+    if batch:
+        _flush(shopkeeper, batch, result)
+    if result.created or result.updated:
+        # bulk_create/bulk_update don't send model signals
+        get_index().invalidate()
+        bump_catalog_version()
+    return result
+
+
+def export_products(shopkeeper, fmt='csv', chunk_size=2000):
+    """Yield the shop's catalog as encoded CSV or JSONL lines."""
+    rows = (
+        Product.objects.filter(shopkeeper=shopkeeper)
+        .order_by('id')
+        .values_list(*FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    if fmt == 'jsonl':
+        for name, price, quantity, description in rows:
+            record = {'name': name, 'price': str(price), 'quantity': quantity, 'description': description}
+            yield (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
@@ -0,0 +1,132 @@
+"""Server-side chat history for ai_chat, keyed by session.
+
+Each turn is rendered as a "Role: text" line and token-counted once when it is
+appended. The conversation is trimmed to a token budget right away, so the
+prompt is a join of at most a handful of lines and stays within the budget. The
+generator still tokenizes that prompt on every turn. Conversations are kept in
+an LRU that evicts idle ones. The store is per process, like the model pipelines
+in members.ai_bot.
+
+Logged-in users are keyed by their Django session. Anonymous API clients get a
+random id in the CHAT_COOKIE cookie instead of a database session, so a chat
+call costs no session write. A client that doesn't send the cookie back simply
+starts a new conversation each time.
+"""
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from .ai_bot import count_tokens as default_count_tokens
+
+ROLE_LABELS = {'user': 'User', 'assistant': 'Assistant'}
+CHAT_COOKIE = 'ai_chat'
+
+
+class Turn(NamedTuple):
+    role: str
+    content: str
+    line: str
+    n_tokens: int
+
+
+class ChatContext(NamedTuple):
+    messages: List[dict]
+    prompt: str
+    n_tokens: int
+
+
+class _Conversation:
+    __slots__ = ('turns', 'n_tokens', 'touched')
+
+    def __init__(self):
+        self.turns = deque()
+        self.n_tokens = 0
+        self.touched = time.monotonic()
+
+
+class ConversationStore:
+    def __init__(self, token_budget: int = 384, max_turns: int = 12, max_sessions: int = 2000,
+                 idle_ttl: float = 1800.0, count_tokens: Optional[Callable[[str], int]] = None):
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.count_tokens = count_tokens or default_count_tokens
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # session key -> _Conversation, least recently used first
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def append(self, key: str, role: str, content: str) -> Turn:
+        content = (content or '').strip()
+        n_tokens = self.count_tokens(content)
+        if n_tokens > self.token_budget:
+            # Keep the tail of an oversized message; trimming by character ratio is plenty here
+            keep = max(1, len(content) * self.token_budget // n_tokens)
+            content = content[-keep:]
+            n_tokens = self.count_tokens(content)
+        turn = Turn(role, content, f"{ROLE_LABELS.get(role, role.title())}: {content}", n_tokens)
+        now = time.monotonic()
+        with self._lock:
+            convo = self._sessions.pop(key, None) or _Conversation()
+            convo.turns.append(turn)
+            convo.n_tokens += n_tokens
+            while len(convo.turns) > 1 and (convo.n_tokens > self.token_budget or len(convo.turns) > self.max_turns):
+                convo.n_tokens -= convo.turns.popleft().n_tokens
+            convo.touched = now
+            self._sessions[key] = convo
+            self._evict(now)
+        return turn
+
+    def context(self, key: str) -> ChatContext:
+        """Bounded history plus a ready-to-generate prompt ending with 'Assistant:'."""
+        with self._lock:
+            convo = self._sessions.get(key)
+            turns = list(convo.turns) if convo else []
+            n_tokens = convo.n_tokens if convo else 0
+        messages = [{'role': t.role, 'content': t.content} for t in turns]
+        prompt = '\n'.join([t.line for t in turns] + ['Assistant:'])
+        return ChatContext(messages, prompt, n_tokens)
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def _evict(self, now: float) -> None:
+        while self._sessions:
+            oldest_key, oldest = next(iter(self._sessions.items()))
+            if len(self._sessions) > self.max_sessions or now - oldest.touched > self.idle_ttl:
+                del self._sessions[oldest_key]
+            else:
+                break
+
+
+_store = ConversationStore(
+    token_budget=int(os.environ.get('AI_CHAT_TOKEN_BUDGET', '384')),
+    max_turns=int(os.environ.get('AI_CHAT_MAX_TURNS', '12')),
+    max_sessions=int(os.environ.get('AI_CHAT_MAX_SESSIONS', '2000')),
+    idle_ttl=float(os.environ.get('AI_CHAT_IDLE_TTL', '1800')),
+)
+
+
+def get_store() -> ConversationStore:
+    return _store
+
+
+def conversation_key(request) -> Tuple[str, Optional[str]]:
+    """(key, new_cookie) for the request's conversation.
+
+    `new_cookie` is a fresh CHAT_COOKIE value for the response to set, or None.
+    """
+    session_key = request.session.session_key
+    if session_key:
+        return session_key, None
+    chat_id = request.COOKIES.get(CHAT_COOKIE, '')
+    if len(chat_id) == 32 and chat_id.isalnum():
+        return f'anon:{chat_id}', None
+    chat_id = secrets.token_hex(16)
+    return f'anon:{chat_id}', chat_id
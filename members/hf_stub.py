@@ -0,0 +1,92 @@
+"""Local stand-in for the Hugging Face Inference API.
+
+Lets the HF fallback in members.ai_bot be exercised without the network:
+
+	with HFStubServer() as stub:
+		os.environ['HF_API_BASE'] = stub.base_url
+		...
+
+`mode` can be switched at runtime to 'ok', 'error' (HTTP 503) or 'slow'
+(sleeps `delay` seconds before answering) to drive the timeout and breaker paths.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is observable
+	disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+	def do_POST(self):
+		stub = self.server.stub
+		length = int(self.headers.get('Content-Length') or 0)
+		body = self.rfile.read(length) if length else b''
+		stub._record(self.client_address, body)
+		if stub.mode == 'slow':
+			time.sleep(stub.delay)
+		if stub.mode == 'error':
+			self._send(503, {'error': 'Model is currently loading'})
+			return
+		try:
+			prompt = json.loads(body.decode('utf-8')).get('inputs', '')
+		except ValueError:
+			prompt = ''
+		self._send(200, [{'generated_text': f"{prompt} {stub.reply}"}])
+
+	def _send(self, status, data):
+		payload = json.dumps(data).encode('utf-8')
+		try:
+			self.send_response(status)
+			self.send_header('Content-Type', 'application/json')
+			self.send_header('Content-Length', str(len(payload)))
+			self.end_headers()
+			self.wfile.write(payload)
+		except (BrokenPipeError, ConnectionResetError):
+			# Client gave up (read timeout) before we answered
+			pass
+
+	def log_message(self, format, *args):
+		pass
+
+
+class HFStubServer:
+	"""Threaded HTTP server on 127.0.0.1 that answers like the HF text-generation endpoint."""
+
+	def __init__(self, mode='ok', reply='Stub reply from the inference API.', delay=1.0, port=0):
+		self.mode = mode
+		self.reply = reply
+		self.delay = delay
+		self.requests = 0
+		self.client_ports = set()
+		self._lock = threading.Lock()
+		self._server = ThreadingHTTPServer(('127.0.0.1', port), _StubHandler)
+		self._server.daemon_threads = True
+		self._server.stub = self
+		self._thread = None
+
+	@property
+	def base_url(self):
+		host, port = self._server.server_address[:2]
+		return f"http://{host}:{port}/models"
+
+	def _record(self, client_address, body):
+		with self._lock:
+			self.requests += 1
+			self.client_ports.add(client_address[1])
+
+	def start(self):
+		self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self):
+		self._server.shutdown()
+		self._server.server_close()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc):
+		self.stop()
@@ -0,0 +1,99 @@
+"""Idempotency keys for checkout.
+
+The cart page and the dashboard's checkout modal embed a fresh `new_key()` in
+the checkout form. The first POST with that key claims it: the (customer, key)
+unique constraint lets exactly one request insert the `CheckoutKey` row. That
+request then splits the cart and creates the orders, and `complete` stores the
+outcome in the same transaction. A resubmission of the same form, such as a
+retry after a timeout, finds the row instead. It gets the original result back
+without touching the cart, the stock or the order tables. If the first request
+is still running, the resubmission is told to wait.
+
+A checkout that fails before creating orders (empty cart, out of stock, errors)
+`release`s its key, so submitting the same form again runs the checkout again.
+A claim that is neither completed nor released within CHECKOUT_KEY_LEASE seconds
+belongs to a request that died, e.g. a worker killed on timeout. The next
+submission takes it over and places the orders. Keep the lease longer than the
+web server's request timeout, so a slow request is never taken over while it runs.
+The fingerprint of the submitted fields catches a key reused for a different cart.
+
+Keys replay for CHECKOUT_KEY_TTL seconds. `purge_expired` deletes them. The
+worker runs it hourly as the periodic `checkout_keys.purge` task, and
+`manage.py purge_checkout_keys` runs it by hand.
+"""
+import hashlib
+import json
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import CheckoutKey
+
+FORM_FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = CheckoutKey._meta.get_field('key').max_length
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def clean_key(value):
+    """The submitted key, or '' when it is missing or too long to be one of ours."""
+    value = (value or '').strip()
+    return value if len(value) <= MAX_KEY_LENGTH else ''
+
+
+def fingerprint(fields):
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+def claim(customer_id, key, digest, now=None):
+    """Claim `key` for a new checkout.
+
+    Returns None when this request claimed it (and must `complete` or `release`
+    it), or the CheckoutKey of an earlier submission with the same key.
+    """
+    now = now or timezone.now()
+    expires_at = now + timedelta(seconds=settings.CHECKOUT_KEY_TTL)
+    abandoned_before = now - timedelta(seconds=settings.CHECKOUT_KEY_LEASE)
+    while True:
+        try:
+            with transaction.atomic():
+                CheckoutKey.objects.create(customer_id=customer_id, key=key, fingerprint=digest,
+                                           expires_at=expires_at)
+            return None
+        except IntegrityError:
+            existing = CheckoutKey.objects.filter(customer_id=customer_id, key=key).first()
+            # Gone again if the other request released it; try to claim it ourselves
+            if existing is None:
+                continue
+            if (existing.completed_at is None and existing.created_at <= abandoned_before
+                    and existing.fingerprint == digest):
+                # Conditional on the old claim time, so only one retry takes it over
+                if CheckoutKey.objects.filter(pk=existing.pk, completed_at__isnull=True,
+                                              created_at=existing.created_at).update(
+                        created_at=now, expires_at=expires_at):
+                    return None
+                continue
+            return existing
+
+
+def complete(customer_id, key, message, order_ids, now=None):
+    """Record the result; call inside the transaction that created the orders."""
+    CheckoutKey.objects.filter(customer_id=customer_id, key=key).update(
+        message=message, order_ids=list(order_ids), completed_at=now or timezone.now(),
+    )
+
+
+def release(customer_id, key):
+    """Forget a claim whose checkout failed, so the same form can be submitted again."""
+    CheckoutKey.objects.filter(customer_id=customer_id, key=key, completed_at__isnull=True).delete()
+
+
+def purge_expired(now=None):
+    """Delete keys past their expiry. Returns the number deleted."""
+    deleted, _ = CheckoutKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
@@ -0,0 +1,146 @@
+"""Integer stock with reservations taken at checkout.
+
+`reserve` takes every cart line out of `Product.stock` in one short transaction,
+one conditional UPDATE per product:
+
+    UPDATE product SET stock = stock - n WHERE id = ? AND stock >= n
+
+A line that matches no row means there isn't enough stock, and the whole
+transaction rolls back. Nothing is read and then written back, and no row stays
+locked while the order is built, so concurrent checkouts never oversell and never
+queue behind each other for longer than those few UPDATEs. (On SQLite every
+statement in the transaction is a write, so it never has to upgrade a read lock,
+which SQLite would fail with "database is locked" instead of waiting.)
+
+The taken units are recorded as held `StockReservation`s. `confirm` attaches them
+to the created order; held rows that are never confirmed are released back into
+stock once they pass STOCK_RESERVATION_TTL, by `release_expired` (run lazily on the
+next reservation of the same product and by `manage.py release_reservations`).
+Cancelling an order returns its units, and a cancelled order can't be moved to
+another status (members.order_status), so returned units are never sold twice.
+Products with `stock=None` aren't tracked and are never reserved.
+"""
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+
+class OutOfStock(Exception):
+    def __init__(self, shortages):
+        # [(product_id, name, available, requested)]
+        self.shortages = shortages
+        super().__init__(', '.join(f"{name}: {available} left, {requested} requested"
+                                   for _, name, available, requested in shortages))
+
+
+class ReservationExpired(Exception):
+    pass
+
+
+def reserve(lines, ttl=None, now=None):
+    """Take {product_id: quantity} out of stock. Returns the reservation token.
+
+    Raises OutOfStock (taking nothing) if any tracked product has too little stock.
+    """
+    lines = Counter({int(pid): int(n) for pid, n in dict(lines).items()})
+    if any(n < 1 for n in lines.values()):
+        raise ValueError('Quantities must be at least 1')
+    now = now or timezone.now()
+    tracked = sorted(Product.objects.filter(pk__in=list(lines), stock__isnull=False).values_list('pk', flat=True))
+    release_expired(tracked, now=now)
+
+    token = uuid.uuid4().hex
+    expires_at = now + timedelta(seconds=settings.STOCK_RESERVATION_TTL if ttl is None else ttl)
+    short = []
+    with transaction.atomic():
+        # Fixed order, so two carts with the same products take them in the same sequence
+        for product_id in tracked:
+            n = lines[product_id]
+            if not Product.objects.filter(pk=product_id, stock__gte=n).update(stock=F('stock') - n):
+                short.append(product_id)
+        if short:
+            transaction.set_rollback(True)
+        else:
+            StockReservation.objects.bulk_create([
+                StockReservation(token=token, product_id=product_id, quantity=lines[product_id],
+                                 expires_at=expires_at)
+                for product_id in tracked
+            ])
+    if short:
+        available = Product.objects.filter(pk__in=short).values_list('pk', 'name', 'stock')
+        raise OutOfStock([(pk, name, stock or 0, lines[pk]) for pk, name, stock in available])
+    return token
+
+
+def confirm(token, order, product_ids):
+    """Attach the token's held lines for `product_ids` to `order`.
+
+    Call inside the transaction that creates the order; raises ReservationExpired
+    if any of them was released in the meantime.
+    """
+    StockReservation.objects.filter(
+        token=token, status=StockReservation.HELD, product_id__in=list(product_ids),
+    ).update(status=StockReservation.CONFIRMED, order=order)
+    if StockReservation.objects.filter(
+        token=token, product_id__in=list(product_ids), status=StockReservation.RELEASED,
+    ).exists():
+        raise ReservationExpired('Your reservation expired before the order was placed.')
+
+
+def _give_back(reservations, from_status, to_status):
+    """Move each reservation from_status -> to_status and return its units. Returns units returned."""
+    returned = 0
+    for pk, product_id, quantity in list(reservations.values_list('pk', 'product_id', 'quantity')):
+        with transaction.atomic():
+            # Conditional UPDATE first: only one caller can return a given reservation
+            if StockReservation.objects.filter(pk=pk, status=from_status).update(status=to_status):
+                Product.objects.filter(pk=product_id, stock__isnull=False).update(stock=F('stock') + quantity)
+                returned += quantity
+    return returned
+
+
+def release(token):
+    """Return a checkout's held (unconfirmed) units, e.g. when creating its orders failed."""
+    held = StockReservation.objects.filter(token=token, status=StockReservation.HELD)
+    return _give_back(held, StockReservation.HELD, StockReservation.RELEASED)
+
+
+def release_expired(product_ids=None, now=None):
+    """Return held units whose reservation has expired. Returns units returned."""
+    expired = StockReservation.objects.filter(status=StockReservation.HELD,
+                                              expires_at__lte=now or timezone.now())
+    if product_ids is not None:
+        expired = expired.filter(product_id__in=list(product_ids))
+    return _give_back(expired, StockReservation.HELD, StockReservation.RELEASED)
+
+
+def return_cancelled(order_ids):
+    """Return the units of cancelled orders."""
+    confirmed = StockReservation.objects.filter(order_id__in=list(order_ids), status=StockReservation.CONFIRMED)
+    return _give_back(confirmed, StockReservation.CONFIRMED, StockReservation.RETURNED)
+
+
+def record_status_change(changes, status):
+    """order_status_changed receiver: cancelling an order returns its stock."""
+    if status == 'cancelled':
+        return_cancelled([order_id for order_id, old in changes.items() if old not in (None, 'cancelled')])
+
+
+def set_stock(product_id, stock):
+    """Set a product's stock outright (shopkeeper edits); None stops tracking it."""
+    return Product.objects.filter(pk=product_id).update(stock=stock)
+
+
+def purge_finished(older_than=timedelta(days=7), now=None):
+    """Delete reservations that are no longer held and older than `older_than`."""
+    cutoff = (now or timezone.now()) - older_than
+    deleted, _ = (StockReservation.objects.exclude(status=StockReservation.HELD)
+                  .filter(created_at__lt=cutoff).delete())
+    return deleted
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from members.archive import DEFAULT_BATCH_SIZE, archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Move delivered/cancelled orders older than N days into the compressed order archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+                            help='Archive orders older than this many days (default: ORDER_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Orders per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many orders would be archived')
+
+    def handle(self, *args, **options):
+        totals = archive_orders(options['days'], batch_size=options['batch_size'], dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f"Would archive {totals['orders']} order(s) with {totals['items']} item(s)")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {totals['orders']} order(s) with {totals['items']} item(s)"
+            ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from members.recommendations import TOP_K, rebuild, update
+
+
+class Command(BaseCommand):
+    help = 'Fold new orders into "customers also bought" recommendations (or rebuild them with --full)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Recompute from all live and archived orders (corrects cancellations)')
+        parser.add_argument('--top', type=int, default=TOP_K, help='Neighbours kept per product')
+
+    def handle(self, *args, **options):
+        if options['full']:
+            totals = rebuild(k=options['top'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt recommendations for {totals['products']} product(s) from {totals['pairs']} pair count(s)"
+            ))
+        else:
+            orders = update(k=options['top'])
+            self.stdout.write(self.style.SUCCESS(f"Folded {orders} new order(s) into recommendations"))
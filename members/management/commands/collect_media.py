@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from members.storage import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Recount product image references and delete stored images no product uses any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Keep unreferenced files touched within this many hours (default: 24)')
+        parser.add_argument('--untracked', action='store_true',
+                            help='Also delete unreferenced files under product_images/ that predate content addressing')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        result = collect_garbage(grace=timedelta(hours=options['grace_hours']),
+                                 dry_run=options['dry_run'], untracked=options['untracked'])
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(f"Recounted {result['recounted']} blob(s)")
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['deleted']} unreferenced and {result['untracked']} untracked file(s), "
+            f"{result['bytes'] / 1024:.0f} KB"
+        ))
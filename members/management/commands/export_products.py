@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from members.catalog_io import FORMATS, detect_format, export_products
+from members.models import Shopkeeper
+
+
+class Command(BaseCommand):
+    help = "Write a shop's products to a CSV or JSONL file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shopkeeper', required=True, help='Shopkeeper email')
+        parser.add_argument('--file', default='-', help="Output path, or '-' for stdout (default)")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension, else csv')
+
+    def handle(self, *args, **options):
+        try:
+            shopkeeper = Shopkeeper.objects.get(email=options['shopkeeper'])
+        except Shopkeeper.DoesNotExist:
+            raise CommandError(f"No shopkeeper with email {options['shopkeeper']}")
+
+        path = options['file']
+        fmt = options['format'] or detect_format(path)
+        if path == '-':
+            for chunk in export_products(shopkeeper, fmt):
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.flush()
+            return
+        with open(path, 'wb') as out:
+            for chunk in export_products(shopkeeper, fmt):
+                out.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Exported products to {path}"))
@@ -0,0 +1,43 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from members.ai_bot import _default_gen_model, default_onnx_model_dir
+
+
+class Command(BaseCommand):
+    help = 'Export the chat model to ONNX and dynamically quantize it to int8 for AI_TEXT_GEN_BACKEND=onnx'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=_default_gen_model, help='Hugging Face model id (default: AI_TEXT_GEN_MODEL)')
+        parser.add_argument('--output', help='Output directory (default: AI_ONNX_MODEL_DIR or models/<model>-onnx-int8)')
+        parser.add_argument('--per-channel', action='store_true', help='Quantize weights per channel (slower export, better accuracy)')
+
+    def handle(self, *args, **options):
+        try:
+            from optimum.onnxruntime import ORTModelForCausalLM
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise CommandError(f"Missing dependency ({e}). Install with: pip install optimum[onnxruntime]")
+
+        model_id = options['model']
+        output = options['output'] or default_onnx_model_dir(model_id)
+        os.makedirs(output, exist_ok=True)
+
+        self.stdout.write(f"Exporting {model_id} to ONNX in {output} ...")
+        model = ORTModelForCausalLM.from_pretrained(model_id, export=True)
+        model.save_pretrained(output)
+        AutoTokenizer.from_pretrained(model_id).save_pretrained(output)
+
+        fp32_path = os.path.join(output, 'model.onnx')
+        int8_path = os.path.join(output, 'model_quantized.onnx')
+        self.stdout.write("Applying dynamic int8 quantization ...")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8, per_channel=options['per_channel'])
+
+        fp32_mb = os.path.getsize(fp32_path) / 1e6
+        int8_mb = os.path.getsize(int8_path) / 1e6
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {int8_path} ({int8_mb:.1f} MB, fp32 was {fp32_mb:.1f} MB). "
+            f"Set AI_TEXT_GEN_BACKEND=onnx to use it."
+        ))
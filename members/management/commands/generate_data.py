@@ -0,0 +1,65 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from members import order_counts, recommendations, sales
+from members.synthetic import BATCH_SIZE, DEFAULT_PASSWORD, PRESETS, email, generate
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic shops, customers, delivery partners, products and orders for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(PRESETS), default='small',
+                            help='Preset sizes (small: 10k orders, medium: 500k, large: 10M); '
+                                 'the options below override single counts')
+        for name in ('shops', 'customers', 'partners', 'products', 'orders'):
+            parser.add_argument(f'--{name}', type=int)
+        parser.add_argument('--days', type=int, default=365, help='Spread orders over this many days up to now')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--tag', help='Suffix for generated e-mail addresses (default: random)')
+        parser.add_argument('--password', default=DEFAULT_PASSWORD, help='Password of every generated account')
+        parser.add_argument('--stock', type=int, help='Initial stock of every product (default: not tracked)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--rebuild-derived', action='store_true',
+                            help='Rebuild the sales rollup, order counters and recommendations afterwards')
+        parser.add_argument('--force', action='store_true', help='Run even with DEBUG off')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('DEBUG is off; pass --force to write synthetic data to this database')
+        counts = {name: options[name] if options[name] is not None else default
+                  for name, default in PRESETS[options['scale']].items()}
+        self.stdout.write('Generating ' + ', '.join(f'{n:,} {name}' for name, n in counts.items()))
+
+        started = time.perf_counter()
+        last = {}
+
+        def progress(label, done, total):
+            # Report roughly every 10%
+            step = max(total // 10, 1)
+            if done == total or done // step != last.get(label, 0) // step:
+                self.stdout.write(f'  {label}: {done:,}/{total:,} ({time.perf_counter() - started:.1f}s)')
+            last[label] = done
+
+        try:
+            result = generate(days=options['days'], seed=options['seed'], tag=options['tag'],
+                              password=options['password'], stock=options['stock'],
+                              batch_size=options['batch_size'], progress=progress, **counts)
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Done in {elapsed:.1f}s'))
+        tag = result['tag']
+        self.stdout.write(f"Log in as {email('customer', 0, tag)}, {email('shop', 0, tag)} or "
+                          f"{email('partner', 0, tag)} with password {options['password']!r}")
+
+        if options['rebuild_derived']:
+            self.stdout.write(f'Sales rollup: {sales.rebuild():,} row(s)')
+            self.stdout.write(f'Order counters: {len(order_counts.reconcile()):,} shop(s) recounted')
+            totals = recommendations.rebuild()
+            self.stdout.write(f"Recommendations: {totals['products']:,} product(s)")
+        else:
+            self.stdout.write('Run with --rebuild-derived (or rebuild_sales, reconcile_order_counts and '
+                              'build_recommendations --full) to refresh the derived tables')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from members.models import Product
+from members.thumbnails import refresh_variants, variants_current
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/JPEG variants for product images that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate variants even if they are up to date')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many products need variants')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image__isnull=True).only('id', 'image', 'image_variants')
+        pending = 0
+        generated = 0
+        for product in products.order_by('id').iterator(chunk_size=200):
+            if not options['force'] and variants_current(product):
+                continue
+            pending += 1
+            if options['dry_run']:
+                continue
+            refresh_variants(product, force=True)
+            if len(product.image_variants) > 1:
+                generated += 1
+            else:
+                self.stderr.write(f"Product {product.id}: could not read {product.image.name}")
+        if options['dry_run']:
+            self.stdout.write(f"{pending} product(s) need image variants")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Generated variants for {generated} of {pending} product(s)"))
@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from members.catalog_io import DEFAULT_BATCH_SIZE, FORMATS, detect_format, import_products
+from members.models import Shopkeeper
+
+
+class Command(BaseCommand):
+    help = "Create or update a shop's products from a CSV or JSONL file (upsert by product name)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shopkeeper', required=True, help='Shopkeeper email')
+        parser.add_argument('--file', required=True, help="Path to the file, or '-' for stdin")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension, else csv')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            shopkeeper = Shopkeeper.objects.get(email=options['shopkeeper'])
+        except Shopkeeper.DoesNotExist:
+            raise CommandError(f"No shopkeeper with email {options['shopkeeper']}")
+
+        path = options['file']
+        fmt = options['format'] or detect_format(path)
+        if path == '-':
+            result = import_products(shopkeeper, sys.stdin, fmt, options['batch_size'])
+        else:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                result = import_products(shopkeeper, stream, fmt, options['batch_size'])
+
+        for line, error in result.errors:
+            self.stdout.write(self.style.WARNING(f"Line {line}: {error}"))
+        self.stdout.write(self.style.SUCCESS(f"Imported {result.rows} row(s): {result.summary()}"))
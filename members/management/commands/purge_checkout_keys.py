@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from members.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired checkout idempotency keys (run periodically, e.g. hourly)'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired checkout key(s)'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from members.models import Shopkeeper
+from members.sales import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollup from live and archived orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shopkeeper', help='Only rebuild this shop (id or email)')
+
+    def handle(self, *args, **options):
+        shopkeeper_id = None
+        if options['shopkeeper']:
+            value = options['shopkeeper']
+            lookup = {'pk': int(value)} if value.isdigit() else {'email': value}
+            shopkeeper = Shopkeeper.objects.filter(**lookup).first()
+            if shopkeeper is None:
+                raise CommandError(f"Shopkeeper {value!r} not found")
+            shopkeeper_id = shopkeeper.pk
+        rows = rebuild(shopkeeper_id)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} daily sales row(s)"))
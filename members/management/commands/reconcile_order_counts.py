@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from members.models import Shopkeeper
+from members.order_counts import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recount the per-shop order status counters and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shopkeeper', help='Only reconcile this shop (id or email)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report drift, change nothing')
+
+    def handle(self, *args, **options):
+        shopkeeper_ids = None
+        if options['shopkeeper']:
+            value = options['shopkeeper']
+            lookup = {'pk': int(value)} if value.isdigit() else {'email': value}
+            shopkeeper = Shopkeeper.objects.filter(**lookup).first()
+            if shopkeeper is None:
+                raise CommandError(f"Shopkeeper {value!r} not found")
+            shopkeeper_ids = [shopkeeper.pk]
+        drift = reconcile(shopkeeper_ids, dry_run=options['dry_run'])
+        for shop_id, diff in drift.items():
+            parts = ', '.join(f"{status} {stored} -> {actual}" for status, (stored, actual) in diff.items())
+            self.stdout.write(f"Shop {shop_id}: {parts}")
+        verb = 'Would fix' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(drift)} shop(s) with drifted counts"))
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from members.inventory import purge_finished, release_expired
+
+
+class Command(BaseCommand):
+    help = 'Return expired checkout stock reservations to stock and delete old finished ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=7,
+                            help='Delete confirmed/released reservations older than this many days')
+
+    def handle(self, *args, **options):
+        units = release_expired()
+        deleted = purge_finished(timedelta(days=options['keep_days']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Returned {units} unit(s) from expired reservations; deleted {deleted} old reservation(s)"
+        ))
@@ -0,0 +1,34 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from members.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks (thumbnails, archival, ...) on a thread pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.TASKS_WORKER_CONCURRENCY,
+                            help='Tasks run in parallel (default: TASKS_WORKER_CONCURRENCY)')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between polls when idle')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--no-periodic', action='store_true',
+                            help="Don't queue periodic tasks (archival, purges); another worker does")
+
+    def handle(self, *args, **options):
+        worker = Worker(concurrency=options['concurrency'], poll_interval=options['poll_interval'],
+                        periodic=not options['no_periodic'])
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: worker.stop())
+        self.stdout.write(f"Worker {worker.worker_id} started with {worker.concurrency} thread(s)")
+        started = time.monotonic()
+        worker.run_forever(burst=options['burst'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{worker.stats['done']} task(s) done, {worker.stats['failed']} failed in {elapsed:.1f}s"
+        ))
+        self.stdout.write('Queue latency (due -> started):\n' + worker.wait.render())
+        self.stdout.write('Run time:\n' + worker.run.render())
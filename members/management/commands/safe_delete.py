@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from members.models import Product, Order, OrderItem, Customer, Shopkeeper, DeliveryPartner
+from members.purge import DEFAULT_CHUNK_SIZE, purge
+
+
+class Command(BaseCommand):
+    help = 'Safely delete records with foreign key constraints (chunked, same rules as the admin safe delete)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', type=str, required=True, help='Model name to delete from')
+        parser.add_argument('--ids', type=str, help='Comma-separated IDs to delete')
+        parser.add_argument('--cascade', action='store_true',
+                            help='Allow deleting products that have orders (order history is kept, product set to null)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would be affected')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows per transaction')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between chunks')
+
+    def handle(self, *args, **options):
+        model_name = options['model']
+        ids = [i.strip() for i in options['ids'].split(',') if i.strip()] if options['ids'] else []
+        cascade = options['cascade']
+
+        models_map = {
+            'product': Product,
+            'order': Order,
+            'customer': Customer,
+            'shopkeeper': Shopkeeper,
+            'deliverypartner': DeliveryPartner,
+        }
+
+        if model_name.lower() not in models_map:
+            self.stdout.write(
+                self.style.ERROR(f"Invalid model: {model_name}. Available: {list(models_map.keys())}")
+            )
+            return
+
+        model = models_map[model_name.lower()]
+        queryset = model.objects.filter(id__in=ids)
+
+        if not queryset.exists():
+            self.stdout.write(self.style.WARNING("No records found with given IDs"))
+            return
+
+        # Check for dependencies
+        if model is Product and not cascade and not options['dry_run']:
+            products_with_orders = (
+                OrderItem.objects.filter(product__in=queryset)
+                .values_list('product_id', flat=True).distinct().order_by('product_id')
+            )
+            if products_with_orders:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"Cannot delete products: {','.join(str(pid) for pid in products_with_orders)} - they have existing orders. "
+                        f"Use --cascade flag to delete them and keep order history."
+                    )
+                )
+                return
+
+        try:
+            result = purge(model, queryset, chunk_size=options['chunk_size'],
+                           dry_run=options['dry_run'], pause=options['pause'])
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Error deleting records: {str(e)}"))
+            return
+
+        if result.dry_run:
+            self.stdout.write(result.summary())
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"Successfully deleted {result.target_count} {model_name}(s) in {result.chunks} chunk(s). {result.summary()}")
+            )
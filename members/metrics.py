@@ -0,0 +1,259 @@
+"""Per-process request, SQL and AI backend metrics, served as Prometheus text.
+
+`MetricsMiddleware` (first in MIDDLEWARE) times every request and, through
+`connection.execute_wrapper`, counts and times the SQL it runs. Everything is
+labelled with the route, the resolved URL name (or view path), so label sets stay
+bounded by members.urls. Recording is a few additions under one lock per
+request; `render` builds the text only when /metrics is scraped, and reads the AI
+reply and HF fallback counters members.ai_bot already keeps.
+
+Queries slower than SLOW_QUERY_MS (0 = off) are logged to the `members.metrics`
+logger with their SQL (placeholders, not parameters) and the route that ran them.
+
+Counters live in process memory: each web worker reports its own, and they
+reset on restart. Scrape every worker, or sum them in Prometheus.
+"""
+import bisect
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; the last bucket catches everything slower
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram; cheap to update from many threads."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.total += seconds
+            self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (None if empty)."""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+                seen += n
+                if seen >= rank:
+                    return bound
+        return float('inf')
+
+    def snapshot(self):
+        """(buckets, per-bucket counts, sum, count), taken under the lock."""
+        with self._lock:
+            return self.buckets, list(self.counts), self.total, self.count
+
+    def render(self):
+        lines = []
+        with self._lock:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+                cumulative += n
+                label = f"<= {bound:g}s" if bound != float('inf') else f"> {self.buckets[-1]:g}s"
+                lines.append(f"  {label:>10} {n:>7} {cumulative:>7}")
+            mean = self.total / self.count if self.count else 0.0
+        return '\n'.join(lines + [f"  {'mean':>10} {mean:.3f}s over {self.count}"])
+
+
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+MAX_SLOW_SQL = 2000  # characters of SQL kept in a slow-query log line
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _histogram(lines, name, histogram, **labels):
+    buckets, counts, total, count = histogram.snapshot()
+    cumulative = 0
+    for bound, n in zip(buckets + (float('inf'),), counts):
+        cumulative += n
+        le = '+Inf' if bound == float('inf') else f'{bound:g}'
+        lines.append(f'{name}_bucket{_labels(**labels, le=le)} {cumulative}')
+    lines.append(f'{name}_sum{_labels(**labels)} {total:g}')
+    lines.append(f'{name}_count{_labels(**labels)} {count}')
+
+
+class Registry:
+    """Request metrics for this process, keyed by route."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}        # (route, method, status) -> count
+            self.durations = {}       # route -> LatencyHistogram (seconds)
+            self.sizes = {}           # route -> LatencyHistogram (bytes)
+            self.query_counts = {}    # route -> LatencyHistogram (queries per request)
+            self.query_seconds = {}   # route -> total seconds in SQL
+            self.slow_queries = {}    # route -> count
+
+    def _route_histograms(self, route):
+        if route not in self.durations:
+            self.durations[route] = LatencyHistogram(HTTP_BUCKETS)
+            self.sizes[route] = LatencyHistogram(SIZE_BUCKETS)
+            self.query_counts[route] = LatencyHistogram(QUERY_COUNT_BUCKETS)
+            self.query_seconds[route] = 0.0
+            self.slow_queries[route] = 0
+        return self.durations[route], self.sizes[route], self.query_counts[route]
+
+    def observe(self, route, method, status, seconds, size, queries, query_seconds, slow=0):
+        method = method if method in METHODS else 'other'
+        with self._lock:
+            key = (route, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            durations, sizes, query_counts = self._route_histograms(route)
+            self.query_seconds[route] += query_seconds
+            self.slow_queries[route] += slow
+        durations.observe(seconds)
+        query_counts.observe(queries)
+        if size is not None:
+            sizes.observe(size)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        from .ai_bot import get_hf_metrics, get_reply_stats
+
+        with self._lock:
+            requests = sorted(self.requests.items())
+            routes = sorted(self.durations)
+            durations, sizes, query_counts = dict(self.durations), dict(self.sizes), dict(self.query_counts)
+            query_seconds = dict(self.query_seconds)
+            slow_queries = dict(self.slow_queries)
+        lines = [
+            '# HELP http_requests_total Requests handled, by route, method and status.',
+            '# TYPE http_requests_total counter',
+        ]
+        for (route, method, status), n in requests:
+            lines.append(f'http_requests_total{_labels(route=route, method=method, status=status)} {n}')
+        for name, source, help_text in (
+            ('http_request_duration_seconds', durations, 'Time from first middleware in to response out.'),
+            ('http_response_size_bytes', sizes, 'Response body size.'),
+            ('db_queries_per_request', query_counts, 'SQL queries run per request.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for route in routes:
+                _histogram(lines, name, source[route], route=route)
+        lines += ['# HELP db_query_seconds_total Time spent executing SQL.',
+                  '# TYPE db_query_seconds_total counter']
+        lines += [f'db_query_seconds_total{_labels(route=r)} {query_seconds[r]:g}' for r in routes]
+        lines += ['# HELP db_slow_queries_total Queries slower than SLOW_QUERY_MS.',
+                  '# TYPE db_slow_queries_total counter']
+        lines += [f'db_slow_queries_total{_labels(route=r)} {slow_queries[r]}' for r in routes]
+
+        replies = get_reply_stats()
+        lines += ['# HELP ai_replies_total AI chat replies, by the path that answered.',
+                  '# TYPE ai_replies_total counter']
+        lines += [f'ai_replies_total{_labels(path=p)} {v["count"]}' for p, v in replies['paths'].items()]
+        lines += ['# HELP ai_reply_seconds_total Time spent producing AI chat replies.',
+                  '# TYPE ai_reply_seconds_total counter']
+        lines += [f'ai_reply_seconds_total{_labels(path=p)} {v["ms_total"] / 1000:g}'
+                  for p, v in replies['paths'].items()]
+        lines += ['# TYPE ai_model_cache_hits_total counter', f'ai_model_cache_hits_total {replies["model_cache_hits"]}',
+                  '# TYPE ai_model_cache_misses_total counter',
+                  f'ai_model_cache_misses_total {replies["model_cache_misses"]}']
+
+        hf = get_hf_metrics()
+        lines += ['# HELP ai_hf_requests_total Hugging Face fallback calls, by outcome.',
+                  '# TYPE ai_hf_requests_total counter']
+        lines += [f'ai_hf_requests_total{_labels(outcome=o)} {hf[o]}'
+                  for o in ('successes', 'failures', 'timeouts', 'short_circuited')]
+        lines += ['# TYPE ai_hf_latency_seconds_total counter',
+                  f'ai_hf_latency_seconds_total {hf["latency_ms_total"] / 1000:g}',
+                  '# TYPE ai_hf_latency_seconds_max gauge',
+                  f'ai_hf_latency_seconds_max {hf["latency_ms_max"] / 1000:g}',
+                  '# HELP ai_hf_breaker_state Circuit breaker state (1 for the current one).',
+                  '# TYPE ai_hf_breaker_state gauge']
+        lines += [f'ai_hf_breaker_state{_labels(state=s)} {int(hf["breaker_state"] == s)}'
+                  for s in ('closed', 'open', 'half_open')]
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class QueryStats:
+    """execute_wrapper counting and timing one request's queries."""
+
+    def __init__(self, slow_seconds=0.0):
+        self.count = 0
+        self.seconds = 0.0
+        self.slow_seconds = slow_seconds
+        self.slow = []  # (sql, seconds), logged once the route is known
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if self.slow_seconds and elapsed >= self.slow_seconds:
+                self.slow.append((sql, elapsed))
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+def response_size(response):
+    if not getattr(response, 'streaming', False):
+        return len(response.content)
+    length = response.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_seconds = getattr(settings, 'SLOW_QUERY_MS', 0) / 1000
+
+    def __call__(self, request):
+        stats = QueryStats(self.slow_seconds)
+        started = time.perf_counter()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        route = route_name(request)
+        for sql, seconds in stats.slow:
+            logger.warning('Slow query (%.1f ms) in %s %s: %s', seconds * 1000, request.method, route,
+                           sql[:MAX_SLOW_SQL])
+        REGISTRY.observe(route, request.method, response.status_code, elapsed, response_size(response),
+                         stats.count, stats.seconds, len(stats.slow))
+        return response
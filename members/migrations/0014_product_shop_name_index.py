@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0013_archivedorder'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['shopkeeper', 'name'], name='product_shop_name'),
+        ),
+    ]
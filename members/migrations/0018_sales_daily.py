@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0017_task_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shopkeeper_id', models.BigIntegerField()),
+                ('day', models.DateField()),
+                ('product_id', models.BigIntegerField()),
+                ('product_name', models.CharField(blank=True, default='', max_length=255)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('shopkeeper_id', 'day', 'product_id'), name='sales_daily_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0018_sales_daily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopOrderCounts',
+            fields=[
+                ('shopkeeper_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('pending', models.IntegerField(default=0)),
+                ('confirmed', models.IntegerField(default=0)),
+                ('ready', models.IntegerField(default=0)),
+                ('assigned', models.IntegerField(default=0)),
+                ('out_for_delivery', models.IntegerField(default=0)),
+                ('delivered', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
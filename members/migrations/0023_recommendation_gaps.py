@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0022_checkout_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationstate',
+            name='gaps',
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0023_recommendation_gaps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='deleted_product_id',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
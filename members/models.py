@@ -1,6 +1,13 @@
+import json
+import zlib
+from decimal import Decimal
+
 from django.db import models
+from django.utils.functional import cached_property
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 
+from .storage import product_image_storage
+
 class ShopkeeperManager(BaseUserManager):
     def create_user(self, email, name, address, password=None):
         if not email:
@@ -64,16 +71,66 @@ class DeliveryPartner(models.Model):
 class Product(models.Model):
     shopkeeper = models.ForeignKey(Shopkeeper, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
-    image = models.ImageField(upload_to='product_images/', blank=True, null=True)
+    image = models.ImageField(upload_to='product_images/', storage=product_image_storage, blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.CharField(max_length=50)
     description = models.TextField()
+    # Units in stock; None means stock isn't tracked for this product. Only change it
+    # through members.inventory, which decrements with conditional UPDATEs.
+    stock = models.PositiveIntegerField(null=True, blank=True)
+    # Resized copies of `image`, maintained by members.thumbnails:
+    # {'source': image name, 'webp': {'200': name, ...}, 'jpeg': {...}}
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        # Lookups by (shop, name) drive bulk import upserts
+        indexes = [models.Index(fields=['shopkeeper', 'name'], name='product_shop_name')]
 
     def has_orders(self):
         """Check if this product has any orders"""
         # Removed self.order_set as Order no longer has product FK
         return OrderItem.objects.filter(product=self).exists()
 
+    def image_variant_urls(self, fmt='jpeg'):
+        """[(width, url), ...] for the current image, narrowest first; empty if not generated yet."""
+        variants = self.image_variants or {}
+        if not self.image or variants.get('source') != self.image.name:
+            return []
+        storage = self.image.storage
+        return sorted((int(w), storage.url(name)) for w, name in variants.get(fmt, {}).items())
+
+    def image_srcset(self, fmt='jpeg'):
+        return ', '.join(f"{url} {width}w" for width, url in self.image_variant_urls(fmt))
+
+    @property
+    def webp_srcset(self):
+        return self.image_srcset('webp')
+
+    @property
+    def jpeg_srcset(self):
+        return self.image_srcset('jpeg')
+
+    def thumbnail_url(self, width=400):
+        """URL of the narrowest variant at least `width` px wide, falling back to the original."""
+        if not self.image:
+            return ''
+        urls = self.image_variant_urls('jpeg')
+        for w, url in urls:
+            if w >= width:
+                return url
+        return urls[-1][1] if urls else self.image.url
+
+    @property
+    def card_image_url(self):
+        return self.thumbnail_url(400)
+
+    @property
+    def card_cache_key(self):
+        """Changes whenever anything shown on the product card does (cache key for its fragment)."""
+        fields = (self.name, self.price, self.quantity, self.description, self.image.name if self.image else '',
+                  (self.image_variants or {}).get('source', ''), self.shopkeeper.name)
+        return f"{self.pk}.{zlib.crc32(repr(fields).encode('utf-8')):08x}"
+
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     shopkeeper = models.ForeignKey(Shopkeeper, on_delete=models.CASCADE)
@@ -108,6 +165,9 @@ class Order(models.Model):
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)
+    # `product`'s id, kept when the product is deleted and `product` is set to NULL,
+    # so the sales rollup can still find the line's row (members.sales)
+    deleted_product_id = models.BigIntegerField(null=True, blank=True, editable=False)
     product_name = models.CharField(max_length=255, null=True, blank=True)
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -120,3 +180,277 @@ class OrderItem(models.Model):
     @property
     def subtotal(self):
         return self.quantity * self.price
+
+
+class _ArchivedItems(list):
+    """List of archived order lines that also answers `.all()` like a related manager."""
+
+    def all(self):
+        return self
+
+
+class ArchivedOrderItem:
+    __slots__ = ('product_id', 'product_name', 'quantity', 'price')
+
+    def __init__(self, product_id, product_name, quantity, price):
+        self.product_id = product_id
+        self.product_name = product_name
+        self.quantity = quantity
+        self.price = Decimal(price)
+
+    @property
+    def subtotal(self):
+        return self.quantity * self.price
+
+
+class ArchivedOrder(models.Model):
+    """Completed order moved out of the hot Order/OrderItem tables by `manage.py archive_orders`.
+
+    Only the columns needed to list and filter history are kept as real columns; delivery
+    details and line items live in `payload`, a zlib-compressed JSON document. Ids are the
+    original Order ids and there are no FKs, so archived history survives later deletes.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    customer_id = models.BigIntegerField()
+    shopkeeper_id = models.BigIntegerField(db_index=True)
+    shop_name = models.CharField(max_length=100)
+    status = models.CharField(max_length=20)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    date = models.DateTimeField()
+    month = models.DateField(db_index=True)
+    payload = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['customer_id', '-date'], name='archived_customer_date')]
+
+    def __str__(self):
+        return f"Archived order #{self.id} from {self.shop_name}"
+
+    @classmethod
+    def from_order(cls, order):
+        """Build (unsaved) from an Order whose shopkeeper and items are already loaded."""
+        data = {
+            'delivery_partner_id': order.delivery_partner_id,
+            'delivery_name': order.delivery_name,
+            'delivery_address': order.delivery_address,
+            'delivery_phone': order.delivery_phone,
+            'payment_method': order.payment_method,
+            'special_instructions': order.special_instructions,
+            'delivery_time': order.delivery_time.isoformat() if order.delivery_time else None,
+            'items': [
+                [item.product_id, item.product_name, item.quantity, str(item.price)]
+                for item in order.items.all()
+            ],
+        }
+        return cls(
+            id=order.id,
+            customer_id=order.customer_id,
+            shopkeeper_id=order.shopkeeper_id,
+            shop_name=order.shopkeeper.name,
+            status=order.status,
+            total_amount=order.total_amount,
+            date=order.date,
+            month=order.date.date().replace(day=1),
+            payload=zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8')),
+        )
+
+    @cached_property
+    def details(self):
+        return json.loads(zlib.decompress(bytes(self.payload)).decode('utf-8'))
+
+    @property
+    def items(self):
+        return _ArchivedItems(ArchivedOrderItem(*row) for row in self.details['items'])
+
+    @property
+    def archived(self):
+        return True
+
+
+class MediaBlob(models.Model):
+    """One content-addressed file in product image storage (see members.storage)."""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    # Number of products whose image is this file; recounted by collect_media
+    refcount = models.PositiveIntegerField(default=0)
+    touched_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
+
+
+class Task(models.Model):
+    """A unit of deferred work for `manage.py runworker` (see members.tasks)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, default=QUEUED, choices=[
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ])
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        # The worker polls for the oldest due task of a status
+        indexes = [models.Index(fields=['status', 'run_at'], name='task_status_run_at')]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class SalesDaily(models.Model):
+    """Units and revenue per (shopkeeper, day, product), kept current by members.sales.
+
+    Cancelled orders are not counted. Like ArchivedOrder there are no FKs, so the
+    rollup outlives deleted products; `manage.py rebuild_sales` recomputes it.
+    """
+    shopkeeper_id = models.BigIntegerField()
+    day = models.DateField()
+    # A deleted product keeps its id (OrderItem.deleted_product_id); 0 only for
+    # archived lines whose product was deleted before the order was archived
+    product_id = models.BigIntegerField()
+    product_name = models.CharField(max_length=255, blank=True, default='')
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['shopkeeper_id', 'day', 'product_id'], name='sales_daily_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} shop {self.shopkeeper_id} product {self.product_id}: {self.units} units"
+
+
+class ShopOrderCounts(models.Model):
+    """Number of a shop's orders in each status, live and archived (see members.order_counts).
+
+    Keyed by shopkeeper id so a dashboard badge is a primary-key read; kept current with
+    F() increments from order_status_changed and rebuilt by `manage.py reconcile_order_counts`.
+    """
+    shopkeeper_id = models.BigIntegerField(primary_key=True)
+    pending = models.IntegerField(default=0)
+    confirmed = models.IntegerField(default=0)
+    ready = models.IntegerField(default=0)
+    assigned = models.IntegerField(default=0)
+    out_for_delivery = models.IntegerField(default=0)
+    delivered = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Order counts for shop {self.shopkeeper_id}"
+
+
+class StockReservation(models.Model):
+    """Units of a product held for a checkout (see members.inventory).
+
+    Held reservations have already been taken out of Product.stock; they become
+    confirmed when the order is created, or are released (stock returned) when
+    they expire. Cancelling the order returns confirmed units.
+    """
+    HELD = 'held'
+    CONFIRMED = 'confirmed'
+    RELEASED = 'released'
+    RETURNED = 'returned'
+
+    token = models.CharField(max_length=32, db_index=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, default=HELD, choices=[
+        (HELD, 'Held'),
+        (CONFIRMED, 'Confirmed'),
+        (RELEASED, 'Released'),
+        (RETURNED, 'Returned'),
+    ])
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        # The expiry sweep looks for held rows past their deadline
+        indexes = [models.Index(fields=['status', 'expires_at'], name='reservation_status_expiry')]
+
+    def __str__(self):
+        return f"{self.quantity} x product {self.product_id} ({self.status})"
+
+
+class CoPurchase(models.Model):
+    """Number of baskets (orders) containing both products, kept by members.recommendations.
+
+    Stored in both directions so a product's row is one index range; the diagonal
+    (product_id == other_id) counts the baskets containing the product at all.
+    """
+    product_id = models.BigIntegerField()
+    other_id = models.BigIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product_id', 'other_id'], name='copurchase_pair'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} & {self.other_id}: {self.count}"
+
+
+class ProductRecommendations(models.Model):
+    """Precomputed "customers also bought" list for one product: [[product_id, score], ...]."""
+    product_id = models.BigIntegerField(primary_key=True)
+    neighbours = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Recommendations for product {self.product_id}"
+
+
+class RecommendationState(models.Model):
+    """Single row recording the last order folded into CoPurchase.
+
+    `gaps` lists [order_id, first_seen_timestamp] for ids at or below
+    last_order_id that had no committed order yet, to be folded in if they appear.
+    """
+    last_order_id = models.BigIntegerField(default=0)
+    gaps = models.JSONField(default=list)
+    built_at = models.DateTimeField(null=True, blank=True)
+
+
+class CheckoutKey(models.Model):
+    """Idempotency key of a checkout form submission (see members.idempotency).
+
+    Claimed before the orders are created; `completed_at` and the result are set
+    in the same transaction as the orders, so a completed key always has them.
+    `created_at` is when the current claim was taken; an unfinished claim older
+    than CHECKOUT_KEY_LEASE is taken over by the next submission.
+    """
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    key = models.CharField(max_length=64)
+    fingerprint = models.CharField(max_length=64)
+    order_ids = models.JSONField(default=list)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'key'], name='checkout_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"Checkout key {self.key} ({'completed' if self.completed_at else 'pending'})"
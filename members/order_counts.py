@@ -0,0 +1,82 @@
+"""Per-shop order counts by status, for dashboard badges.
+
+`ShopOrderCounts` has one row per shopkeeper and one column per order status. Each
+`order_status_changed` batch moves counts between columns with F() increments,
+inside the transaction that changes the orders, so the counts never see a status
+change that was rolled back. Archiving an order keeps its status, so archived
+orders stay counted. A shop's row is created on first use by counting its orders;
+`reconcile` recounts after changes made outside members.order_status (purges,
+manual SQL) and reports any drift it fixed.
+"""
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import ArchivedOrder, Order, ShopOrderCounts
+
+STATUSES = tuple(value for value, _ in Order._meta.get_field('status').choices)
+
+
+def _actual(shopkeeper_id):
+    counts = Counter()
+    for model in (Order, ArchivedOrder):
+        rows = model.objects.filter(shopkeeper_id=shopkeeper_id).values('status').annotate(n=Count('pk'))
+        counts.update({r['status']: r['n'] for r in rows if r['status'] in STATUSES})
+    return {status: counts[status] for status in STATUSES}
+
+
+def _create(shopkeeper_id):
+    """Create a shop's row from a recount; returns None if another transaction got there first."""
+    try:
+        with transaction.atomic():
+            return ShopOrderCounts.objects.create(shopkeeper_id=shopkeeper_id, **_actual(shopkeeper_id))
+    except IntegrityError:
+        return None
+
+
+def order_counts(shopkeeper_id):
+    """The shop's ShopOrderCounts row, counting its orders the first time."""
+    row = ShopOrderCounts.objects.filter(pk=shopkeeper_id).first()
+    return row or _create(shopkeeper_id) or ShopOrderCounts.objects.get(pk=shopkeeper_id)
+
+
+def record_status_change(changes, status):
+    """Fold an order_status_changed batch ({order_id: old_status}) into the counts."""
+    deltas = defaultdict(Counter)
+    shops = dict(Order.objects.filter(pk__in=list(changes)).values_list('pk', 'shopkeeper_id'))
+    for order_id, old_status in changes.items():
+        shop_id = shops.get(order_id)
+        if shop_id is None or old_status == status:
+            continue
+        deltas[shop_id][status] += 1
+        if old_status is not None:
+            deltas[shop_id][old_status] -= 1
+    for shop_id, delta in deltas.items():
+        increments = {s: F(s) + n for s, n in delta.items() if n and s in STATUSES}
+        if not increments or ShopOrderCounts.objects.filter(pk=shop_id).update(**increments):
+            continue
+        # No row yet: the recount already sees this transaction's changes
+        if _create(shop_id) is None:
+            ShopOrderCounts.objects.filter(pk=shop_id).update(**increments)
+
+
+def reconcile(shopkeeper_ids=None, dry_run=False):
+    """Recount shops (all with a row or any order, by default). Returns {shop_id: {status: (stored, actual)}} for drift."""
+    if shopkeeper_ids is None:
+        shopkeeper_ids = (set(ShopOrderCounts.objects.values_list('pk', flat=True))
+                          | set(Order.objects.values_list('shopkeeper_id', flat=True).distinct())
+                          | set(ArchivedOrder.objects.values_list('shopkeeper_id', flat=True).distinct()))
+    drift = {}
+    for shop_id in sorted(shopkeeper_ids):
+        with transaction.atomic():
+            row = ShopOrderCounts.objects.select_for_update().filter(pk=shop_id).first()
+            actual = _actual(shop_id)
+            stored = {s: getattr(row, s) if row else 0 for s in STATUSES}
+            diff = {s: (stored[s], actual[s]) for s in STATUSES if stored[s] != actual[s]}
+            if diff:
+                drift[shop_id] = diff
+            if dry_run or (row and not diff):
+                continue
+            ShopOrderCounts.objects.update_or_create(shopkeeper_id=shop_id, defaults=actual)
+    return drift
@@ -0,0 +1,116 @@
+"""Order status changes, applied as conditional UPDATEs and announced to listeners.
+
+Every place that creates orders or changes their status goes through here, so
+`order_status_changed` receivers (sales rollups, per-shop counters) see every
+change, inside the same transaction. Cancelled is final: cancelling returns the
+order's stock (members.inventory), so the order can't be reopened.
+"""
+from django.db import transaction
+
+from .models import Order
+from .signals import order_status_changed
+
+# target status -> statuses a shopkeeper may move an order from
+SHOPKEEPER_TRANSITIONS = {
+    'confirmed': ('pending',),
+    'ready': ('pending', 'confirmed'),
+    'cancelled': ('pending', 'confirmed', 'ready'),
+}
+MAX_BULK_ORDERS = 500
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+class TooManyOrders(ValueError):
+    pass
+
+
+class InvalidOrderIds(ValueError):
+    pass
+
+
+def _notify(changes, status, actor):
+    if changes:
+        order_status_changed.send(sender=Order, changes=changes, status=status, actor=actor)
+
+
+def notify_created(orders, actor='customer'):
+    """Announce freshly created orders (old status None). Call after their items exist."""
+    by_status = {}
+    for order in orders:
+        by_status.setdefault(order.status, {})[order.id] = None
+    for status, changes in by_status.items():
+        _notify(changes, status, actor)
+
+
+def change_status(order, new_status, actor, **fields):
+    """Move one order from the status it was loaded with to `new_status`.
+
+    Extra `fields` (e.g. delivery_partner) are written in the same UPDATE. Returns
+    False, changing nothing, if someone else changed the order's status meanwhile.
+    Raises InvalidTransition for a cancelled order.
+    """
+    old_status = order.status
+    if old_status == 'cancelled' and new_status != 'cancelled':
+        raise InvalidTransition(f'Order #{order.pk} is cancelled and its stock was returned; it cannot be reopened.')
+    with transaction.atomic():
+        updated = Order.objects.filter(pk=order.pk, status=old_status).update(status=new_status, **fields)
+        if not updated:
+            return False
+        if old_status != new_status:
+            _notify({order.pk: old_status}, new_status, actor)
+    order.status = new_status
+    for name, value in fields.items():
+        setattr(order, name, value)
+    return True
+
+
+def bulk_transition(shopkeeper_id, order_ids, new_status):
+    """Move many of a shop's orders to `new_status` with a single conditional UPDATE.
+
+    Returns (results, updated_count) where results is one dict per requested id:
+    {'id', 'ok', 'status', 'error'}. Orders of other shops are reported as not found.
+    Raises InvalidOrderIds unless `order_ids` is a list of ints, and TooManyOrders
+    for more than MAX_BULK_ORDERS of them; either way nothing is changed.
+    """
+    allowed_from = SHOPKEEPER_TRANSITIONS.get(new_status)
+    if allowed_from is None:
+        raise ValueError(f"'{new_status}' is not a bulk status")
+    # A JSON string would otherwise be iterated as digits, and True as order 1
+    if not isinstance(order_ids, (list, tuple)) or any(type(i) is not int for i in order_ids):
+        raise InvalidOrderIds('order_ids must be a list of order ids.')
+    if len(order_ids) > MAX_BULK_ORDERS:
+        raise TooManyOrders(f'At most {MAX_BULK_ORDERS} orders can be updated at once; {len(order_ids)} were selected.')
+    ids = list(dict.fromkeys(order_ids))
+
+    with transaction.atomic():
+        scoped = Order.objects.filter(shopkeeper_id=shopkeeper_id, id__in=ids)
+        before = dict(scoped.values_list('id', 'status'))
+        eligible = [i for i in ids if before.get(i) in allowed_from]
+        updated = 0
+        if eligible:
+            updated = scoped.filter(id__in=eligible, status__in=allowed_from).update(status=new_status)
+        if updated != len(eligible):
+            # Someone else changed some of these between our read and the UPDATE
+            after = dict(scoped.filter(id__in=eligible).values_list('id', 'status'))
+            applied = {i for i in eligible if after.get(i) == new_status}
+        else:
+            applied = set(eligible)
+        _notify({i: before[i] for i in ids if i in applied}, new_status, 'shopkeeper')
+
+    results = []
+    for i in ids:
+        if i in applied:
+            results.append({'id': i, 'ok': True, 'status': new_status, 'error': None})
+        elif i not in before:
+            results.append({'id': i, 'ok': False, 'status': None, 'error': 'Order not found'})
+        elif before[i] == new_status:
+            results.append({'id': i, 'ok': True, 'status': new_status, 'error': None})
+        elif i in eligible:
+            results.append({'id': i, 'ok': False, 'status': None, 'error': 'Order changed concurrently'})
+        else:
+            results.append({'id': i, 'ok': False, 'status': before[i],
+                            'error': f"Cannot change a {before[i]} order to {new_status}"})
+    return results, len(applied)
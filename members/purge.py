@@ -0,0 +1,145 @@
+"""Set-based, chunked deletes shared by SafeDeleteAdmin and `manage.py safe_delete`.
+
+Every affected set (order items, orders, products, ...) is expressed as a subquery
+on the target ids, and each step is applied in primary-key chunks inside its own
+short transaction, so deleting a large shop never holds the SQLite write lock for
+the whole purge. Steps run in dependency order (items before orders before the
+target rows); if a purge is interrupted, re-running it picks up where it stopped.
+"""
+import time
+
+from django.db import transaction
+
+from .models import (
+    ArchivedOrder, Customer, DeliveryPartner, Order, OrderItem, Product, SalesDaily, ShopOrderCounts, Shopkeeper,
+)
+from .order_counts import reconcile as reconcile_order_counts
+
+DEFAULT_CHUNK_SIZE = 500
+
+DELETE = 'delete'
+DETACH = 'detach'  # set a nullable FK to NULL, keeping the row (order history)
+
+
+class PurgeStep:
+    def __init__(self, label, queryset, action=DELETE, field=None):
+        self.label = label
+        self.queryset = queryset
+        self.action = action
+        self.field = field
+
+    @property
+    def description(self):
+        if self.action == DETACH:
+            return f"{self.label} ({self.field} set to null)"
+        return self.label
+
+
+class PurgeResult:
+    def __init__(self, model_name, dry_run):
+        self.model_name = model_name
+        self.dry_run = dry_run
+        self.counts = {}  # step description -> rows affected (or that would be)
+        self.chunks = 0
+
+    def add(self, key, n):
+        self.counts[key] = self.counts.get(key, 0) + n
+
+    @property
+    def target_count(self):
+        return self.counts.get(self.model_name, 0)
+
+    def summary(self):
+        verb = 'Would affect' if self.dry_run else 'Affected'
+        parts = [f"{n} {key}" for key, n in self.counts.items() if n]
+        return f"{verb}: {', '.join(parts) if parts else 'nothing'}"
+
+
+def _steps(model, targets):
+    """Ordered purge steps for deleting `targets` (a queryset of `model`)."""
+    ids = targets.values('pk')
+    if model is Product:
+        return [
+            PurgeStep('OrderItem', OrderItem.objects.filter(product__in=ids), DETACH, 'product'),
+            PurgeStep('Product', targets),
+        ]
+    if model is Order:
+        return [
+            PurgeStep('OrderItem', OrderItem.objects.filter(order__in=ids)),
+            PurgeStep('Order', targets),
+        ]
+    if model is Customer:
+        return [
+            PurgeStep('OrderItem', OrderItem.objects.filter(order__customer__in=ids)),
+            PurgeStep('Order', Order.objects.filter(customer__in=ids)),
+            PurgeStep('ArchivedOrder', ArchivedOrder.objects.filter(customer_id__in=ids)),
+            PurgeStep('Customer', targets),
+        ]
+    if model is Shopkeeper:
+        return [
+            PurgeStep('OrderItem', OrderItem.objects.filter(order__shopkeeper__in=ids)),
+            PurgeStep('Order', Order.objects.filter(shopkeeper__in=ids)),
+            PurgeStep('ArchivedOrder', ArchivedOrder.objects.filter(shopkeeper_id__in=ids)),
+            PurgeStep('SalesDaily', SalesDaily.objects.filter(shopkeeper_id__in=ids)),
+            PurgeStep('ShopOrderCounts', ShopOrderCounts.objects.filter(shopkeeper_id__in=ids)),
+            # Items of this shop's products sold through other shops' orders can't exist today,
+            # but detach rather than delete so history is never lost
+            PurgeStep('OrderItem', OrderItem.objects.filter(product__shopkeeper__in=ids)
+                      .exclude(order__shopkeeper__in=ids), DETACH, 'product'),
+            PurgeStep('Product', Product.objects.filter(shopkeeper__in=ids)),
+            PurgeStep('Shopkeeper', targets),
+        ]
+    if model is DeliveryPartner:
+        return [
+            PurgeStep('Order', Order.objects.filter(delivery_partner__in=ids), DETACH, 'delivery_partner'),
+            PurgeStep('DeliveryPartner', targets),
+        ]
+    return [PurgeStep(model.__name__, targets)]
+
+
+def _run_step(step, result, chunk_size, pause):
+    model = step.queryset.model
+    while True:
+        with transaction.atomic():
+            chunk = list(step.queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not chunk:
+                return
+            rows = model.objects.filter(pk__in=chunk)
+            if step.action == DETACH:
+                result.add(step.description, rows.update(**{step.field: None}))
+            else:
+                _, per_model = rows.delete()
+                result.add(step.label, per_model.get(model._meta.label, 0))
+        result.chunks += 1
+        if pause:
+            time.sleep(pause)
+
+
+def purge(model, targets, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, pause=0.0):
+    """Delete `targets` (a queryset or an iterable of pks of `model`) with their dependants.
+
+    With dry_run=True nothing is written; the result holds one COUNT per step instead.
+    `pause` sleeps between chunks to give other writers a turn on busy databases.
+    """
+    if not hasattr(targets, 'values'):
+        targets = model.objects.filter(pk__in=list(targets))
+    else:
+        targets = model.objects.filter(pk__in=targets.values('pk'))
+    result = PurgeResult(model.__name__, dry_run)
+    # Deleting orders bypasses members.order_status, so recount the shops that had them
+    affected_shops = set()
+    if not dry_run and model in (Customer, Order):
+        orders = targets if model is Order else Order.objects.filter(customer__in=targets.values('pk'))
+        affected_shops.update(orders.values_list('shopkeeper_id', flat=True).distinct())
+        if model is Customer:
+            affected_shops.update(ArchivedOrder.objects.filter(customer_id__in=targets.values('pk'))
+                                  .values_list('shopkeeper_id', flat=True).distinct())
+    for step in _steps(model, targets):
+        if dry_run:
+            key = step.description if step.action == DETACH else step.label
+            result.add(key, step.queryset.count())
+        else:
+            _run_step(step, result, chunk_size, pause)
+    if affected_shops:
+        reconcile_order_counts(affected_shops)
+    return result
@@ -0,0 +1,128 @@
+"""Token-bucket rate limits for expensive endpoints.
+
+`RateLimitMiddleware` runs in process_view, after URL resolution and before the
+view, so a throttled request costs one cache round trip instead of a model
+generation (ai_chat) or a PBKDF2 hash (the JSON logins). RATE_LIMITS maps URL
+names to rates like '10/m': a bucket holds that many tokens and refills at that
+rate, so a client can burst up to the limit and then sustain the rate.
+
+Every request to a limited route spends a token from two buckets: one for its
+session, and one for its client IP with RATE_LIMIT_IP_FACTOR times the capacity
+and rate. The IP bucket catches clients that drop or rotate session cookies. The
+factor leaves room for several users behind one NAT. Only unsafe methods spend
+tokens, so rendering a login form is never throttled. When either bucket is
+empty the response is a 429 with Retry-After.
+
+Buckets live in the RATE_LIMIT_CACHE cache as (tokens, timestamp) and expire
+once they would be full again. Reads and writes are serialized by a
+process-local lock. With a shared cache backend, the limits hold across all
+workers, but two processes racing on the same bucket can both spend its last
+token.
+"""
+import math
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.http import HttpResponse, JsonResponse
+
+from .metrics import route_name
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """'10/m' -> (capacity 10, refill 10/60 tokens per second)."""
+    try:
+        count, period = rate.split('/')
+        count = int(count)
+        seconds = PERIODS[period.strip()]
+    except (AttributeError, KeyError, ValueError):
+        raise ImproperlyConfigured(f"Invalid rate {rate!r}; expected e.g. '10/s', '10/m' or '10/h'")
+    if count < 1:
+        raise ImproperlyConfigured(f'Invalid rate {rate!r}; the count must be positive')
+    return count, count / seconds
+
+
+def client_ip(request):
+    header = getattr(settings, 'RATE_LIMIT_IP_HEADER', None)
+    if header and request.META.get(header):
+        # Proxies append; the left-most address is the client
+        return request.META[header].split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def take(buckets, now=None):
+    """Spend one token from every (key, capacity, refill) bucket, or from none.
+
+    Returns 0 when the tokens were spent, otherwise the seconds until the emptiest
+    bucket has one again.
+    """
+    cache = caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+    now = time.time() if now is None else now
+    with _lock:
+        stored = cache.get_many([key for key, _, _ in buckets])
+        levels = {}
+        wait = 0.0
+        for key, capacity, refill in buckets:
+            tokens, stamp = stored.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(now - stamp, 0) * refill)
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) / refill)
+            levels[key] = tokens
+        if wait:
+            return wait
+        # Expire a bucket once it would have refilled completely
+        ttl = max(math.ceil(capacity / refill) for _, capacity, refill in buckets)
+        cache.set_many({key: (tokens - 1, now) for key, tokens in levels.items()}, ttl)
+    return 0
+
+
+def check(request, route):
+    """Seconds the request has to wait under RATE_LIMITS, or 0 when it may proceed."""
+    rate = getattr(settings, 'RATE_LIMITS', {}).get(route)
+    if not rate or request.method in SAFE_METHODS:
+        return 0
+    capacity, refill = parse_rate(rate)
+    factor = getattr(settings, 'RATE_LIMIT_IP_FACTOR', 1)
+    buckets = [(f'ratelimit:{route}:ip:{client_ip(request)}', capacity * factor, refill * factor)]
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        buckets.append((f'ratelimit:{route}:session:{session.session_key}', capacity, refill))
+    return take(buckets)
+
+
+def too_many_requests(request, wait):
+    retry_after = max(math.ceil(wait), 1)
+    message = f'Too many requests, try again in {retry_after} second(s)'
+    if request.path.startswith('/api/'):
+        response = JsonResponse({'success': False, 'error': message}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type='text/plain')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+class RateLimitMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'RATE_LIMIT_ENABLED', True):
+            raise MiddlewareNotUsed
+        for rate in getattr(settings, 'RATE_LIMITS', {}).values():
+            parse_rate(rate)
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        wait = check(request, route_name(request))
+        if wait:
+            return too_many_requests(request, wait)
+        return None
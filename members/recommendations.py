@@ -0,0 +1,231 @@
+""""Customers also bought" recommendations from order co-occurrence.
+
+Orders are baskets: a sparse order x product incidence matrix B, kept as CSR
+arrays (indptr, indices) in NumPy. C = BᵀB counts, for every product pair, the
+baskets containing both, with basket counts per product on the diagonal. It is
+built without SciPy by expanding each basket into its item pairs and counting
+them with `np.unique`. Pairs are scored by cosine similarity,
+C[a, b] / sqrt(C[a, a] * C[b, b]), so popular staples don't top every list.
+
+`rebuild` computes C from all live and archived orders. It stores the non-zero
+counts in `CoPurchase` and the best TOP_K neighbours of each product in
+`ProductRecommendations`. `update` folds in only the orders placed since the
+last run: it increments the affected CoPurchase counts with F() and re-ranks the
+products in those orders and their co-purchase partners. Reads are one
+primary-key lookup of a k-item list. Orders cancelled after they were folded in
+stay counted until the next rebuild (`manage.py build_recommendations --full`,
+e.g. nightly).
+
+"Since the last run" is a watermark, the highest order id seen. A checkout can
+commit after an order with a higher id was already folded in. Ids at or below
+the watermark that had no committed order are therefore kept as gaps and folded
+in if their order shows up within GAP_TTL. Ids of rolled-back checkouts simply
+age out. Both `rebuild` and `update` take the watermark from the Order table, and
+only the last GAP_SCAN ids below it are checked for gaps.
+"""
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from .models import (
+    ArchivedOrder, CoPurchase, Order, OrderItem, Product, ProductRecommendations, RecommendationState,
+)
+
+TOP_K = 10
+# Baskets bigger than this are bulk/catering orders and say little about affinity
+MAX_BASKET = 50
+# Seconds between a checkout and the queued update, so a burst of checkouts shares one run
+UPDATE_DELAY = 60
+# Seconds a missing order id below the watermark is waited for (see the module docstring)
+GAP_TTL = 15 * 60
+# Missing ids are only looked for among this many ids below the watermark, so a
+# first update (or one after a long pause) doesn't walk every order id ever issued
+GAP_SCAN = 1000
+
+
+def basket_matrix(order_ids, product_ids):
+    """CSR (indptr, indices, products) of the order x product incidence matrix.
+
+    `order_ids`/`product_ids` are parallel arrays of basket lines; duplicates are
+    collapsed and over-large baskets dropped. Column j is product `products[j]`.
+    """
+    pairs = np.unique(np.column_stack([np.asarray(order_ids, dtype=np.int64),
+                                       np.asarray(product_ids, dtype=np.int64)]), axis=0)
+    orders, rows = np.unique(pairs[:, 0], return_inverse=True)
+    products, cols = np.unique(pairs[:, 1], return_inverse=True)
+    sizes = np.bincount(rows, minlength=len(orders))
+    keep = np.repeat(sizes <= MAX_BASKET, sizes)
+    rows, cols = rows[keep], cols[keep]
+    sizes = np.bincount(rows, minlength=len(orders))
+    indptr = np.concatenate([[0], np.cumsum(sizes)])
+    # np.unique sorted the lines by order id, so `cols` is already in row order
+    return indptr, cols, products
+
+
+def cooccurrence(indptr, indices, n_cols):
+    """CSR (indptr, indices, data) of BᵀB for the incidence matrix B."""
+    sizes = np.diff(indptr)
+    per_item = np.repeat(sizes, sizes)            # size of the basket each line is in
+    left = np.repeat(indices, per_item)
+    first = np.repeat(np.cumsum(per_item) - per_item, per_item)
+    offset = np.arange(per_item.sum()) - first    # position within that basket's pairs
+    right = indices[np.repeat(np.repeat(indptr[:-1], sizes), per_item) + offset]
+    keys, counts = np.unique(left * n_cols + right, return_counts=True)
+    rows, cols = keys // n_cols, keys % n_cols
+    c_indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n_cols))])
+    return c_indptr, cols, counts
+
+
+def _rank(product, others, counts, own_count, other_counts, k):
+    """Top-k [[other_id, score], ...] for one product's row of C (diagonal excluded)."""
+    mask = others != product
+    others, counts, other_counts = others[mask], counts[mask], other_counts[mask]
+    if not len(others):
+        return []
+    scores = counts / np.sqrt(own_count * other_counts)
+    # Best score first, then more shared baskets, then lower id for stable output
+    order = np.lexsort((others, -counts, -scores))[:k]
+    return [[int(others[i]), round(float(scores[i]), 4)] for i in order]
+
+
+def _claim_state(now):
+    """Lock the state row (write first, then read). Returns (last order folded in, gaps)."""
+    if not RecommendationState.objects.filter(pk=1).update(built_at=now):
+        RecommendationState.objects.create(pk=1, built_at=now)
+    return RecommendationState.objects.values_list('last_order_id', 'gaps').get(pk=1)
+
+
+def _find_gaps(after, upto, gaps, now):
+    """Ids in (after, upto] without an order, plus earlier gaps still missing and younger than GAP_TTL.
+
+    Only the last GAP_SCAN ids of the range are checked.
+    """
+    after = max(after, upto - GAP_SCAN)
+    waiting = [order_id for order_id, _ in gaps]
+    present = set(Order.objects.filter(Q(id__gt=after, id__lte=upto) | Q(id__in=waiting))
+                  .values_list('id', flat=True))
+    stamp = now.timestamp()
+    kept = [[order_id, seen] for order_id, seen in gaps if order_id not in present and stamp - seen < GAP_TTL]
+    return kept + [[order_id, stamp] for order_id in range(after + 1, upto + 1) if order_id not in present]
+
+
+def _latest_order_id():
+    """The watermark candidate; rebuild and update must read it from the same table."""
+    return Order.objects.aggregate(m=Max('id'))['m'] or 0
+
+
+def _live_lines(after=0, upto=None, also=()):
+    window = Q(order_id__gt=after) if upto is None else Q(order_id__gt=after, order_id__lte=upto)
+    lines = (OrderItem.objects.exclude(order__status='cancelled').filter(product__isnull=False)
+             .filter(window | Q(order_id__in=list(also))))
+    return list(lines.values_list('order_id', 'product_id'))
+
+
+def rebuild(k=TOP_K, now=None):
+    """Recompute everything from live and archived orders. Returns {'products', 'pairs'}."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        _claim_state(now)
+        upto = _latest_order_id()
+        lines = _live_lines(upto=upto)
+        for order in ArchivedOrder.objects.exclude(status='cancelled').iterator(chunk_size=500):
+            lines.extend((order.id, item.product_id) for item in order.items if item.product_id)
+
+        CoPurchase.objects.all().delete()
+        ProductRecommendations.objects.all().delete()
+        pairs = 0
+        if lines:
+            order_ids, product_ids = zip(*lines)
+            indptr, indices, products = basket_matrix(order_ids, product_ids)
+            c_indptr, c_cols, c_data = cooccurrence(indptr, indices, len(products))
+            diag = np.zeros(len(products), dtype=np.int64)
+            rows = np.repeat(np.arange(len(products)), np.diff(c_indptr))
+            on_diag = rows == c_cols
+            diag[rows[on_diag]] = c_data[on_diag]
+            CoPurchase.objects.bulk_create(
+                (CoPurchase(product_id=int(products[r]), other_id=int(products[c]), count=int(n))
+                 for r, c, n in zip(rows, c_cols, c_data)),
+                batch_size=2000,
+            )
+            pairs = len(c_data)
+            recs = []
+            for r in range(len(products)):
+                start, end = c_indptr[r], c_indptr[r + 1]
+                cols = c_cols[start:end]
+                ranked = _rank(products[r], products[cols], c_data[start:end], diag[r], diag[cols], k)
+                recs.append(ProductRecommendations(product_id=int(products[r]), neighbours=ranked))
+            ProductRecommendations.objects.bulk_create(recs, batch_size=1000)
+        gaps = _find_gaps(0, upto, [], now)
+        RecommendationState.objects.filter(pk=1).update(last_order_id=upto, gaps=gaps)
+    return {'products': ProductRecommendations.objects.count(), 'pairs': pairs}
+
+
+def _rerank(product_ids, k):
+    rows = list(CoPurchase.objects.filter(product_id__in=product_ids).values_list('product_id', 'other_id', 'count'))
+    if not rows:
+        return
+    arr = np.array(rows, dtype=np.int64)
+    others = np.unique(arr[:, 1])
+    diag = dict(CoPurchase.objects.filter(product_id__in=others.tolist(), other_id=F('product_id'))
+                .values_list('product_id', 'count'))
+    arr = arr[np.argsort(arr[:, 0], kind='stable')]
+    starts = np.searchsorted(arr[:, 0], product_ids)
+    ends = np.searchsorted(arr[:, 0], product_ids, side='right')
+    for pid, start, end in zip(product_ids, starts, ends):
+        if start == end or not diag.get(pid):
+            continue
+        row = arr[start:end]
+        other_counts = np.array([diag.get(int(o), 0) for o in row[:, 1]], dtype=np.int64)
+        ranked = _rank(pid, row[:, 1], row[:, 2], diag[pid], np.maximum(other_counts, 1), k)
+        ProductRecommendations.objects.update_or_create(product_id=pid, defaults={'neighbours': ranked})
+
+
+def update(k=TOP_K, now=None):
+    """Fold orders placed since the last run into the counts. Returns the number of orders added."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        last, gaps = _claim_state(now)
+        upto = max(_latest_order_id(), last)
+        lines = _live_lines(after=last, upto=upto, also=[order_id for order_id, _ in gaps])
+        RecommendationState.objects.filter(pk=1).update(last_order_id=upto,
+                                                        gaps=_find_gaps(last, upto, gaps, now))
+        if not lines:
+            return 0
+        order_ids, product_ids = zip(*lines)
+        indptr, indices, products = basket_matrix(order_ids, product_ids)
+        c_indptr, c_cols, c_data = cooccurrence(indptr, indices, len(products))
+        rows = np.repeat(np.arange(len(products)), np.diff(c_indptr))
+        for r, c, n in zip(rows, c_cols, c_data):
+            key = dict(product_id=int(products[r]), other_id=int(products[c]))
+            if CoPurchase.objects.filter(**key).update(count=F('count') + int(n)):
+                continue
+            try:
+                with transaction.atomic():
+                    CoPurchase.objects.create(count=int(n), **key)
+            except IntegrityError:
+                CoPurchase.objects.filter(**key).update(count=F('count') + int(n))
+        # A changed basket count moves the score of every pair it is in, so re-rank
+        # the partners of the touched products too
+        touched = [int(p) for p in products]
+        partners = set(CoPurchase.objects.filter(other_id__in=touched).values_list('product_id', flat=True))
+        _rerank(sorted(partners | set(touched)), k)
+    return len(set(order_ids))
+
+
+def neighbours(product_ids, limit=TOP_K, exclude=()):
+    """Product ids most bought with `product_ids` (best first), merging their lists by summed score."""
+    scores = {}
+    for rec in ProductRecommendations.objects.filter(product_id__in=list(product_ids)):
+        for other, score in rec.neighbours:
+            scores[other] = scores.get(other, 0.0) + score
+    skip = set(product_ids) | set(exclude)
+    ranked = sorted((pid for pid in scores if pid not in skip), key=lambda pid: (-scores[pid], pid))
+    return ranked[:limit]
+
+
+def also_bought(product_ids, limit=4, exclude=()):
+    """Products (with their shopkeeper) most bought with `product_ids`, best first."""
+    ids = neighbours(product_ids, limit=limit * 2, exclude=exclude)
+    found = Product.objects.select_related('shopkeeper').in_bulk(ids)
+    return [found[pid] for pid in ids if pid in found][:limit]
@@ -0,0 +1,182 @@
+"""Daily sales rollup per (shopkeeper, day, product) and the reports read from it.
+
+`SalesDaily` is updated incrementally from `order_status_changed`: new orders are
+added, cancelled ones subtracted (and added back if un-cancelled), using F()
+increments inside the transaction that changes the order. Reports then read one
+row per product per day, so their cost follows the date range shown rather than
+the number of orders placed. `rebuild` recomputes the table from Order/OrderItem
+and ArchivedOrder for backfills or after manual data fixes.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import ArchivedOrder, OrderItem, SalesDaily
+
+CANCELLED = 'cancelled'
+MAX_REPORT_DAYS = 366
+TREND_WINDOW = 7  # days in the moving average
+
+
+def _counts(old_status, new_status):
+    """Whether an order moving old -> new status enters (+1) or leaves (-1) the rollup."""
+    was = old_status is not None and old_status != CANCELLED
+    now = new_status != CANCELLED
+    return int(now) - int(was)
+
+
+def _line_deltas(order_ids, sign):
+    """{(shopkeeper_id, day, product_id): [product_name, orders, units, revenue]} for the orders' lines."""
+    deltas = {}
+    seen = set()
+    rows = (OrderItem.objects.filter(order_id__in=order_ids)
+            .values_list('order_id', 'order__shopkeeper_id', 'order__date', 'product_id',
+                         'deleted_product_id', 'product_name', 'quantity', 'price'))
+    for order_id, shop_id, date, product_id, deleted_id, name, quantity, price in rows:
+        # Same key the line was counted under, even if its product was deleted since
+        key = (shop_id, timezone.localdate(date), product_id or deleted_id or 0)
+        delta = deltas.setdefault(key, [name or '', 0, 0, Decimal('0')])
+        if (order_id, key) not in seen:
+            seen.add((order_id, key))
+            delta[1] += sign
+        delta[2] += sign * quantity
+        delta[3] += sign * quantity * price
+    return deltas
+
+
+def _apply(deltas):
+    for (shop_id, day, product_id), (name, orders, units, revenue) in deltas.items():
+        increments = dict(orders=F('orders') + orders, units=F('units') + units,
+                          revenue=F('revenue') + revenue)
+        key = dict(shopkeeper_id=shop_id, day=day, product_id=product_id)
+        if SalesDaily.objects.filter(**key).update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                SalesDaily.objects.create(product_name=name, orders=orders, units=units,
+                                          revenue=revenue, **key)
+        except IntegrityError:
+            # Another transaction created the row first
+            SalesDaily.objects.filter(**key).update(**increments)
+
+
+def record_status_change(changes, status):
+    """Fold an order_status_changed batch ({order_id: old_status}) into the rollup."""
+    by_sign = defaultdict(list)
+    for order_id, old_status in changes.items():
+        sign = _counts(old_status, status)
+        if sign:
+            by_sign[sign].append(order_id)
+    for sign, order_ids in by_sign.items():
+        _apply(_line_deltas(order_ids, sign))
+
+
+def rebuild(shopkeeper_id=None):
+    """Recompute the rollup (for one shop, or all) from live and archived orders. Returns rows written."""
+    live = OrderItem.objects.exclude(order__status=CANCELLED)
+    archived = ArchivedOrder.objects.exclude(status=CANCELLED)
+    if shopkeeper_id is not None:
+        live = live.filter(order__shopkeeper_id=shopkeeper_id)
+        archived = archived.filter(shopkeeper_id=shopkeeper_id)
+
+    rows = {}
+    live = (live.annotate(day=TruncDate('order__date'), sold_id=Coalesce('product_id', 'deleted_product_id'))
+            .values('order__shopkeeper_id', 'day', 'sold_id')
+            .annotate(name=Max('product_name'), orders=Count('order_id', distinct=True),
+                      units=Sum('quantity'),
+                      revenue=Sum(ExpressionWrapper(F('quantity') * F('price'),
+                                                    output_field=DecimalField(max_digits=14, decimal_places=2)))))
+    for r in live:
+        key = (r['order__shopkeeper_id'], r['day'], r['sold_id'] or 0)
+        row = rows.setdefault(key, [r['name'] or '', 0, 0, Decimal('0')])
+        row[1] += r['orders']
+        row[2] += r['units']
+        row[3] += r['revenue']
+    for order in archived.iterator(chunk_size=500):
+        day = timezone.localdate(order.date)
+        counted = set()
+        for item in order.items:
+            key = (order.shopkeeper_id, day, item.product_id or 0)
+            row = rows.setdefault(key, [item.product_name or '', 0, 0, Decimal('0')])
+            if key not in counted:
+                counted.add(key)
+                row[1] += 1
+            row[2] += item.quantity
+            row[3] += item.subtotal
+
+    with transaction.atomic():
+        existing = SalesDaily.objects.all()
+        if shopkeeper_id is not None:
+            existing = existing.filter(shopkeeper_id=shopkeeper_id)
+        existing.delete()
+        SalesDaily.objects.bulk_create([
+            SalesDaily(shopkeeper_id=shop_id, day=day, product_id=product_id, product_name=name,
+                       orders=orders, units=units, revenue=revenue)
+            for (shop_id, day, product_id), (name, orders, units, revenue) in rows.items()
+        ], batch_size=1000)
+    return len(rows)
+
+
+def report(shopkeeper_id, start, end, top=5):
+    """Daily revenue/units series, totals, trend and top products for start..end (inclusive)."""
+    if end < start:
+        raise ValueError('end is before start')
+    if (end - start).days >= MAX_REPORT_DAYS:
+        raise ValueError(f'ranges are limited to {MAX_REPORT_DAYS} days')
+    n_days = (end - start).days + 1
+    rows = list(SalesDaily.objects.filter(shopkeeper_id=shopkeeper_id, day__range=(start, end))
+                .values_list('day', 'product_id', 'product_name', 'units', 'revenue'))
+
+    day_index = np.array([(r[0] - start).days for r in rows], dtype=np.int64)
+    units = np.array([r[3] for r in rows], dtype=np.int64)
+    revenue = np.array([float(r[4]) for r in rows], dtype=np.float64)
+    daily_revenue = np.bincount(day_index, weights=revenue, minlength=n_days)
+    daily_units = np.bincount(day_index, weights=units, minlength=n_days).astype(np.int64)
+
+    if n_days >= TREND_WINDOW:
+        kernel = np.ones(TREND_WINDOW) / TREND_WINDOW
+        moving = np.convolve(daily_revenue, kernel, mode='valid')
+        moving = np.concatenate([np.full(TREND_WINDOW - 1, np.nan), moving])
+    else:
+        moving = np.full(n_days, np.nan)
+    # Least-squares slope of daily revenue, in currency units per day
+    slope = float(np.polyfit(np.arange(n_days), daily_revenue, 1)[0]) if n_days > 1 else 0.0
+
+    top_products = []
+    if rows:
+        product_ids = np.array([r[1] for r in rows], dtype=np.int64)
+        names = {r[1]: r[2] for r in rows}
+        ids, inverse = np.unique(product_ids, return_inverse=True)
+        product_revenue = np.bincount(inverse, weights=revenue)
+        product_units = np.bincount(inverse, weights=units)
+        for i in np.argsort(-product_revenue, kind='stable')[:top]:
+            top_products.append({
+                'product_id': int(ids[i]) or None,
+                'name': names[int(ids[i])],
+                'units': int(product_units[i]),
+                'revenue': round(float(product_revenue[i]), 2),
+            })
+
+    days = [start + timedelta(days=i) for i in range(n_days)]
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': [d.isoformat() for d in days],
+        'revenue': [round(float(v), 2) for v in daily_revenue],
+        'units': [int(v) for v in daily_units],
+        'moving_average': [None if np.isnan(v) else round(float(v), 2) for v in moving],
+        'totals': {
+            'revenue': round(float(daily_revenue.sum()), 2),
+            'units': int(daily_units.sum()),
+            'average_daily_revenue': round(float(daily_revenue.mean()), 2),
+            'best_day': days[int(np.argmax(daily_revenue))].isoformat() if daily_revenue.any() else None,
+        },
+        'trend_per_day': round(slope, 2),
+        'top_products': top_products,
+    }
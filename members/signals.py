@@ -0,0 +1,73 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from . import inventory, order_counts, recommendations, sales
+from .catalog_cache import bump_catalog_version
+from .catalog_index import get_index
+from .models import Order, OrderItem, Product, Shopkeeper
+from .storage import release, retain
+from .tasks import refresh_thumbnails, update_recommendations
+from .thumbnails import discard_variants, variants_current
+
+# Sent once per batch of order status changes (see members.order_status), inside the
+# transaction that makes them, so receivers' writes commit or roll back with it.
+# kwargs: changes={order_id: old_status or None for new orders}, status=new status,
+# actor='customer'|'shopkeeper'|'delivery'
+order_status_changed = Signal()
+
+
+@receiver(pre_save, sender=Product)
+def product_saving(sender, instance, update_fields=None, **kwargs):
+    # Remember the stored image so post_save can move its reference count
+    if instance._state.adding or (update_fields is not None and 'image' not in update_fields):
+        instance._previous_image = None
+    else:
+        instance._previous_image = (
+            Product.objects.filter(pk=instance.pk).values_list('image', flat=True).first() or None
+        )
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, update_fields=None, **kwargs):
+    get_index().upsert(instance)
+    bump_catalog_version()
+    if update_fields is None or 'image' in update_fields:
+        previous = getattr(instance, '_previous_image', None)
+        current = instance.image.name or None
+        if previous != current:
+            release(previous)
+            retain(current)
+        if not variants_current(instance):
+            refresh_thumbnails.enqueue(product_id=instance.pk)
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    # Runs before the delete sets OrderItem.product to NULL; the sales rollup
+    # keeps counting these lines under the product's id
+    OrderItem.objects.filter(product=instance).update(deleted_product_id=instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    get_index().remove(instance.pk)
+    bump_catalog_version()
+    release(instance.image.name)
+    discard_variants(instance)
+
+
+@receiver(post_save, sender=Shopkeeper)
+def shopkeeper_saved(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or 'name' in update_fields):
+        get_index().reindex_shop(instance)
+        bump_catalog_version()
+
+
+@receiver(order_status_changed, sender=Order)
+def order_status_updated(sender, changes, status, **kwargs):
+    sales.record_status_change(changes, status)
+    order_counts.record_status_change(changes, status)
+    inventory.record_status_change(changes, status)
+    if None in changes.values():
+        # New baskets: one queued catch-up run folds in every order placed meanwhile
+        update_recommendations.enqueue_once(delay=recommendations.UPDATE_DELAY)
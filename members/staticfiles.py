@@ -0,0 +1,97 @@
+"""Content-hashed, pre-compressed static files.
+
+`collectstatic` writes every asset under a content-hashed name (gram.3f2a9c1b7d4e.css)
+via ManifestStaticFilesStorage, then emits `.gz` and, when the `brotli` package is
+installed, `.br` siblings for text assets. `best_encoding` picks the smallest
+variant the client accepts, so `serve_static` only ever streams pre-built files,
+and hashed names can be cached by browsers for a year.
+"""
+import gzip
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # optional; gzip alone still covers every browser
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map', '.xml')
+# Skip siblings that save less than this fraction of the original
+MIN_SAVING = 0.05
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress_file(path):
+    """Write `path.gz` (and `path.br`) next to `path`. Returns the encodings written."""
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    written = []
+    candidates = [('gzip', '.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        candidates.insert(0, ('br', '.br', lambda d: brotli.compress(d, quality=11)))
+    for encoding, suffix, compress in candidates:
+        packed = compress(data)
+        if len(packed) <= len(data) * (1 - MIN_SAVING):
+            with open(path + suffix, 'wb') as fh:
+                fh.write(packed)
+            written.append(encoding)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Fall back to the plain name for files that haven't been collected yet
+    # (tests, fresh checkouts) instead of failing the page render
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in list(self.hashed_files.values()) + list(paths):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                compress_file(self.path(name))
+
+
+def accepted_encodings(accept_encoding):
+    """Encodings the client accepts, ignoring any with q=0."""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        token, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        if token:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+def best_encoding(name, accept_encoding, root=None):
+    """(filesystem path, content encoding or None) of the best file to send for `name`."""
+    root = os.path.realpath(root or settings.STATIC_ROOT)
+    path = os.path.realpath(os.path.join(root, name))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return None, None
+    accepted = accepted_encodings(accept_encoding)
+    for encoding, suffix in ENCODINGS:
+        if (encoding in accepted or '*' in accepted) and os.path.isfile(path + suffix):
+            return path + suffix, encoding
+    return path, None
+
+
+def content_type(name):
+    guessed, _ = mimetypes.guess_type(name)
+    return guessed or 'application/octet-stream'
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME_RE.search(name))
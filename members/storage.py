@@ -0,0 +1,148 @@
+"""Content-addressed, deduplicating storage for product images.
+
+Uploads are stored once under their SHA-256: `product_images/ab/cd/<sha256>.png`.
+Saving bytes that are already stored writes nothing and returns the existing
+name, so the same photo used on many products (or re-uploaded on every edit)
+takes space once. Each stored file has a `MediaBlob` row whose refcount is the
+number of products pointing at it, kept up to date by the Product signals;
+`collect_garbage` (`manage.py collect_media`) recounts and deletes files nobody
+references any more. Because a name can only ever hold one content, these URLs
+are safe to serve with far-future immutable cache headers.
+"""
+import hashlib
+import os
+import re
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Count, F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[a-z0-9]+)?$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_GRACE = timedelta(hours=24)
+
+
+def is_content_addressed(name):
+    return bool(HASHED_NAME_RE.search(name or ''))
+
+
+def _digest(content):
+    sha = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        sha.update(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+    content.seek(0)
+    return sha.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, digest):
+        directory = os.path.dirname(name)
+        ext = os.path.splitext(name)[1].lower()
+        return '/'.join(p for p in (directory, digest[:2], digest[2:4], digest + ext) if p)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        hashed = self.hashed_name(name, _digest(content))
+        if not self.exists(hashed):
+            saved = super().save(hashed, content, max_length=max_length)
+            if saved != hashed:
+                # Lost a race with an identical upload; keep the first copy
+                self.delete(saved)
+        _touch_blob(hashed, content.size)
+        return hashed
+
+
+_product_image_storage = ContentAddressedStorage()
+
+
+def product_image_storage():
+    return _product_image_storage
+
+
+def _touch_blob(name, size):
+    from .models import MediaBlob
+    now = timezone.now()
+    if not MediaBlob.objects.filter(name=name).update(touched_at=now):
+        MediaBlob.objects.get_or_create(name=name, defaults={'size': size or 0, 'touched_at': now})
+
+
+def retain(name):
+    from .models import MediaBlob
+    if name:
+        MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+
+def release(name):
+    from .models import MediaBlob
+    if name:
+        MediaBlob.objects.filter(name=name, refcount__gt=0).update(refcount=F('refcount') - 1)
+
+
+def _walk(storage, directory):
+    dirs, files = storage.listdir(directory)
+    for f in files:
+        yield f"{directory}/{f}"
+    for d in dirs:
+        yield from _walk(storage, f"{directory}/{d}")
+
+
+def collect_garbage(grace=DEFAULT_GRACE, dry_run=False, untracked=False, now=None):
+    """Recount references, then delete unreferenced blobs untouched for `grace`.
+
+    With untracked=True also delete files under product_images/ that have no blob
+    row and no product pointing at them (uploads from before this storage, or
+    files orphaned by old edits), if they are older than `grace`.
+    Returns {'recounted', 'deleted', 'untracked', 'bytes'}.
+    """
+    from .models import MediaBlob, Product
+    now = now or timezone.now()
+    cutoff = now - grace
+    storage = _product_image_storage
+    counts = dict(
+        Product.objects.exclude(image='').exclude(image__isnull=True)
+        .values_list('image').annotate(n=Count('id')).order_by()
+    )
+    result = {'recounted': 0, 'deleted': 0, 'untracked': 0, 'bytes': 0}
+
+    drifted = []
+    for blob in MediaBlob.objects.only('id', 'name', 'refcount').iterator(chunk_size=2000):
+        actual = counts.get(blob.name, 0)
+        if blob.refcount != actual:
+            blob.refcount = actual
+            drifted.append(blob)
+    result['recounted'] = len(drifted)
+    if drifted and not dry_run:
+        MediaBlob.objects.bulk_update(drifted, ['refcount'], batch_size=500)
+
+    candidates = MediaBlob.objects.filter(touched_at__lt=cutoff).values_list('id', 'name', 'size')
+    garbage = [(pk, name, size) for pk, name, size in candidates if name not in counts]
+    for pk, name, size in garbage:
+        if not dry_run:
+            # Re-check in the DELETE itself so a blob re-uploaded meanwhile survives
+            deleted, _ = MediaBlob.objects.filter(pk=pk, refcount=0, touched_at__lt=cutoff).delete()
+            if not deleted:
+                continue
+            storage.delete(name)
+        result['deleted'] += 1
+        result['bytes'] += size
+
+    if untracked:
+        directory = Product._meta.get_field('image').upload_to.rstrip('/')
+        tracked = set(MediaBlob.objects.values_list('name', flat=True))
+        if storage.exists(directory):
+            for name in _walk(storage, directory):
+                if name in counts or name in tracked or storage.get_modified_time(name) >= cutoff:
+                    continue
+                result['untracked'] += 1
+                result['bytes'] += storage.size(name)
+                if not dry_run:
+                    storage.delete(name)
+    return result
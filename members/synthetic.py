@@ -0,0 +1,269 @@
+"""Synthetic shops, customers, partners, products and orders for load and scale tests.
+
+`generate` writes everything with `bulk_create` in large batches, one transaction
+per batch, with primary keys assigned up front so orders and their items go in
+without reading ids back. Passwords are hashed once and shared by every account
+(log in as any generated user with DEFAULT_PASSWORD). Random choices are
+vectorised with NumPy and seeded, so the same arguments give the same data.
+
+The shape aims to look like a real marketplace rather than uniform noise:
+
+- shop catalogue sizes and shop popularity are skewed (a few big shops, a long tail)
+- within a shop a handful of products take most of the sales
+- order volume grows over the `days` window and ids increase with order date
+- orders older than a day are delivered (or cancelled); recent ones are spread
+  over the in-flight statuses, with a delivery partner from `assigned` onwards
+
+bulk_create sends no model signals, so the derived tables (sales rollup, order
+counters, recommendations) are not updated; `manage.py generate_data
+--rebuild-derived` rebuilds them afterwards. The catalog caches and the bot's
+search index are invalidated once the products are in.
+"""
+import secrets
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .catalog_cache import bump_catalog_version
+from .catalog_index import get_index
+from .models import Customer, DeliveryPartner, Order, OrderItem, Product, Shopkeeper
+
+PRESETS = {
+    'small': dict(shops=20, customers=500, partners=10, products=2_000, orders=10_000),
+    'medium': dict(shops=1_000, customers=50_000, partners=200, products=100_000, orders=500_000),
+    'large': dict(shops=10_000, customers=500_000, partners=2_000, products=1_000_000, orders=10_000_000),
+}
+BATCH_SIZE = 5000
+DEFAULT_PASSWORD = 'password123'
+MAX_LINES = 8
+
+SHOP_WORDS = (('Fresh', 'Green', 'Daily', 'City', 'Corner', 'Family', 'Village', 'Royal', 'Super', 'Sunrise'),
+              ('Mart', 'Grocers', 'Kirana', 'Store', 'Bazaar', 'Provisions', 'Foods', 'Supermarket'))
+FIRST_NAMES = ('Aarav', 'Priya', 'Rohan', 'Ananya', 'Vikram', 'Sneha', 'Arjun', 'Meera', 'Kabir', 'Isha',
+               'Rahul', 'Divya', 'Sanjay', 'Neha', 'Amit', 'Pooja', 'Karan', 'Riya', 'Suresh', 'Lakshmi')
+LAST_NAMES = ('Sharma', 'Patel', 'Reddy', 'Nair', 'Iyer', 'Singh', 'Gupta', 'Das', 'Menon', 'Khan',
+              'Joshi', 'Rao', 'Verma', 'Pillai', 'Bose')
+STREETS = ('MG Road', 'Station Road', 'Temple Street', 'Market Road', 'Lake View', 'Gandhi Nagar',
+           'Park Avenue', 'Church Street', 'Hill Road', 'Main Bazaar')
+VEHICLES = ('Bicycle', 'Scooter', 'Motorbike', 'Van')
+BRANDS = ('Village Farm', 'Golden Harvest', 'Daily Fresh', 'Pure Choice', 'Green Valley', 'Sunrise',
+          'Home Style', 'Nature Best')
+# (name, pack size, typical price)
+ITEMS = (
+    ('Basmati Rice', '1 kg', 120), ('Sona Masoori Rice', '5 kg', 310), ('Wheat Flour', '5 kg', 240),
+    ('Toor Dal', '1 kg', 150), ('Moong Dal', '1 kg', 130), ('Chana Dal', '1 kg', 95),
+    ('Sugar', '1 kg', 45), ('Salt', '1 kg', 22), ('Tea', '250 g', 140), ('Coffee', '200 g', 210),
+    ('Sunflower Oil', '1 l', 165), ('Mustard Oil', '1 l', 180), ('Ghee', '500 ml', 320),
+    ('Milk', '500 ml', 28), ('Curd', '400 g', 35), ('Paneer', '200 g', 90), ('Butter', '100 g', 56),
+    ('Eggs', '12 pcs', 84), ('Bread', '400 g', 40), ('Biscuits', '200 g', 30), ('Poha', '500 g', 45),
+    ('Rava', '1 kg', 55), ('Turmeric Powder', '100 g', 32), ('Chilli Powder', '100 g', 38),
+    ('Garam Masala', '100 g', 70), ('Jeera', '100 g', 60), ('Onions', '1 kg', 35), ('Potatoes', '1 kg', 30),
+    ('Tomatoes', '1 kg', 40), ('Bananas', '12 pcs', 60), ('Apples', '1 kg', 160), ('Soap', '4 pcs', 120),
+    ('Detergent', '1 kg', 110), ('Toothpaste', '150 g', 95), ('Shampoo', '180 ml', 150),
+    ('Instant Noodles', '4 pack', 56), ('Jam', '500 g', 130), ('Peanut Butter', '340 g', 180),
+    ('Honey', '250 g', 150), ('Pickle', '300 g', 85),
+)
+IN_FLIGHT = ('pending', 'confirmed', 'ready', 'assigned', 'out_for_delivery', 'delivered', 'cancelled')
+IN_FLIGHT_P = (0.3, 0.2, 0.15, 0.1, 0.1, 0.1, 0.05)
+WITH_PARTNER = {'assigned', 'out_for_delivery', 'delivered'}
+CANCELLED_SHARE = 0.06  # of orders older than a day
+
+
+def email(kind, i, tag):
+    """Address of the i-th generated account of `kind` ('shop', 'customer' or 'partner')."""
+    return f'{kind}{i}.{tag}@example.com'
+
+
+def _next_id(model):
+    return (model.objects.aggregate(m=Max('pk'))['m'] or 0) + 1
+
+
+def _skewed_sizes(rng, total, n, exponent=0.8):
+    """Split `total` into n Zipf-like parts, in random order."""
+    if not n:
+        return np.zeros(0, dtype=np.int64)
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    sizes = np.floor(weights / weights.sum() * total).astype(np.int64)
+    sizes[:total - sizes.sum()] += 1
+    return rng.permutation(sizes)
+
+
+@contextmanager
+def _bulk_load():
+    """Skip fsync between batches on SQLite, and let Order.date be set explicitly."""
+    date_field = Order._meta.get_field('date')
+    # SQLite refuses to change this inside a transaction (where it wouldn't help anyway)
+    sqlite = connection.vendor == 'sqlite' and not connection.in_atomic_block
+    if sqlite:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            synchronous = cursor.fetchone()[0]
+            cursor.execute('PRAGMA synchronous = OFF')
+    date_field.auto_now_add = False
+    try:
+        yield
+    finally:
+        date_field.auto_now_add = True
+        if sqlite:
+            with connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA synchronous = {int(synchronous)}')
+
+
+def _batches(total, batch_size):
+    for start in range(0, total, batch_size):
+        yield start, min(start + batch_size, total)
+
+
+def _person(rng, n):
+    first = rng.integers(0, len(FIRST_NAMES), n)
+    last = rng.integers(0, len(LAST_NAMES), n)
+    return [f'{FIRST_NAMES[a]} {LAST_NAMES[b]}' for a, b in zip(first, last)]
+
+
+def _addresses(rng, n):
+    numbers = rng.integers(1, 400, n)
+    streets = rng.integers(0, len(STREETS), n)
+    return [f'{num} {STREETS[s]}' for num, s in zip(numbers, streets)]
+
+
+def _accounts(model, make, total, batch_size, rng, progress, label):
+    first_id = _next_id(model)
+    for start, end in _batches(total, batch_size):
+        names, addresses = _person(rng, end - start), _addresses(rng, end - start)
+        with transaction.atomic():
+            model.objects.bulk_create(
+                [make(first_id + i, i, names[i - start], addresses[i - start]) for i in range(start, end)],
+                batch_size=batch_size,
+            )
+        if progress:
+            progress(label, end, total)
+    return first_id
+
+
+def generate(shops, customers, partners, products, orders, days=365, seed=0, tag=None,
+             password=DEFAULT_PASSWORD, stock=None, batch_size=BATCH_SIZE, progress=None, now=None):
+    """Write the requested numbers of rows. Returns their tag and first ids.
+
+    `progress(label, done, total)` is called after every batch.
+    """
+    if min(shops, customers, products) < 1 and orders:
+        raise ValueError('orders need at least one shop, customer and product')
+    rng = np.random.default_rng(seed)
+    tag = tag or secrets.token_hex(3)
+    now = now or timezone.now()
+    hashed = make_password(password)
+
+    with _bulk_load():
+        shop_id = _accounts(
+            Shopkeeper, lambda pk, i, name, address: Shopkeeper(
+                pk=pk, email=email('shop', i, tag), password=hashed, address=address,
+                name=f'{SHOP_WORDS[0][i % 10]} {SHOP_WORDS[1][i // 10 % 8]} {i}'),
+            shops, batch_size, rng, progress, 'shops')
+        customer_id = _accounts(
+            Customer, lambda pk, i, name, address: Customer(
+                pk=pk, email=email('customer', i, tag), password=hashed, name=name, phone=f'9{i:09d}'),
+            customers, batch_size, rng, progress, 'customers')
+        partner_id = _accounts(
+            DeliveryPartner, lambda pk, i, name, address: DeliveryPartner(
+                pk=pk, email=email('partner', i, tag), password=hashed, name=name,
+                vehicle=VEHICLES[i % len(VEHICLES)]),
+            partners, batch_size, rng, progress, 'partners')
+
+        # Products: shop s owns ids product_id + starts[s] .. + starts[s] + sizes[s] - 1
+        sizes = _skewed_sizes(rng, products, shops)
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+        owner = np.repeat(np.arange(shops), sizes)
+        item = rng.integers(0, len(ITEMS), products)
+        brand = rng.integers(0, len(BRANDS), products)
+        base = np.array([price for _, _, price in ITEMS], dtype=np.float64)
+        cents = np.maximum(np.round(base[item] * rng.lognormal(0, 0.2, products) * 100), 100).astype(np.int64)
+        product_id = _next_id(Product)
+        for start, end in _batches(products, batch_size):
+            with transaction.atomic():
+                Product.objects.bulk_create([
+                    Product(pk=product_id + j, shopkeeper_id=shop_id + int(owner[j]),
+                            name=f'{BRANDS[brand[j]]} {ITEMS[item[j]][0]}', quantity=ITEMS[item[j]][1],
+                            price=Decimal(int(cents[j])).scaleb(-2), stock=stock,
+                            description=f'{ITEMS[item[j]][0]} by {BRANDS[brand[j]]}, {ITEMS[item[j]][1]} pack.')
+                    for j in range(start, end)
+                ], batch_size=batch_size)
+            if progress:
+                progress('products', end, products)
+        # bulk_create skips the post_save receivers that keep the bot's index current
+        get_index().invalidate()
+        bump_catalog_version()
+
+        if orders:
+            _orders(rng, orders, days, now, batch_size, progress, sizes, starts, item, brand, cents,
+                    shop_id, customer_id, partner_id, product_id, customers, partners)
+
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Shopkeeper, Customer, DeliveryPartner, Product,
+                                                                  Order, OrderItem]):
+            cursor.execute(sql)
+    return {'tag': tag, 'shop_id': shop_id, 'customer_id': customer_id, 'partner_id': partner_id,
+            'product_id': product_id}
+
+
+def _orders(rng, total, days, now, batch_size, progress, sizes, starts, item, brand, cents,
+            shop_id, customer_id, partner_id, product_id, customers, partners):
+    stocked = np.flatnonzero(sizes)
+    popularity = sizes[stocked] ** 0.8
+    popularity = popularity / popularity.sum()
+    span = days * 86400.0
+    first_order = _next_id(Order)
+    item_pk = _next_id(OrderItem)
+    for start, end in _batches(total, batch_size):
+        n = end - start
+        shops = stocked[rng.choice(len(stocked), n, p=popularity)]
+        buyers = rng.integers(0, customers, n)
+        n_lines = np.minimum(rng.geometric(0.45, n), MAX_LINES)
+        # Volume grows over the window: the i-th order sits at quantile (i/total)^(1/1.5)
+        position = (np.arange(start, end) + rng.random(n)) / total
+        ages = span * (1 - position ** (1 / 1.5))
+        recent = ages < 86400
+        statuses = np.where(rng.random(n) < CANCELLED_SHARE, 'cancelled', 'delivered').astype(object)
+        if recent.any():
+            statuses[recent] = rng.choice(IN_FLIGHT, recent.sum(), p=IN_FLIGHT_P)
+        couriers = rng.integers(0, max(partners, 1), n)
+        picks = rng.random((n, MAX_LINES))
+        quantities = np.minimum(rng.geometric(0.6, (n, MAX_LINES)), 10)
+        payments = rng.random(n) < 0.35
+        addresses = _addresses(rng, n)
+
+        order_rows, item_rows = [], []
+        for k in range(n):
+            shop = int(shops[k])
+            # Squaring a uniform pick makes a shop's first few products its best sellers
+            lines = dict.fromkeys(int(starts[shop] + sizes[shop] * p * p) for p in picks[k, :n_lines[k]])
+            oid = first_order + start + k
+            total_cents = 0
+            for line, j in enumerate(lines):
+                q = int(quantities[k, line])
+                total_cents += q * int(cents[j])
+                item_rows.append(OrderItem(pk=item_pk, order_id=oid, product_id=product_id + j, quantity=q,
+                                           product_name=f'{BRANDS[brand[j]]} {ITEMS[item[j]][0]}',
+                                           price=Decimal(int(cents[j])).scaleb(-2)))
+                item_pk += 1
+            status = statuses[k]
+            date = now - timedelta(seconds=float(ages[k]))
+            order_rows.append(Order(
+                pk=oid, customer_id=customer_id + int(buyers[k]), shopkeeper_id=shop_id + shop,
+                delivery_partner_id=partner_id + int(couriers[k]) if partners and status in WITH_PARTNER else None,
+                delivery_name='Customer', delivery_address=addresses[k], delivery_phone='9000000000',
+                payment_method='online_payment' if payments[k] else 'cash_on_delivery',
+                total_amount=Decimal(total_cents).scaleb(-2), status=status, date=date,
+                delivery_time=date + timedelta(minutes=45) if status == 'delivered' else None,
+            ))
+        with transaction.atomic():
+            Order.objects.bulk_create(order_rows, batch_size=batch_size)
+            OrderItem.objects.bulk_create(item_rows, batch_size=batch_size)
+        if progress:
+            progress('orders', end, total)
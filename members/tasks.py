@@ -0,0 +1,206 @@
+"""Database-backed background tasks.
+
+Views enqueue slow side effects as `Task` rows and return; `manage.py runworker`
+claims due rows and runs them on a thread pool. The table is the broker, so a
+task enqueued inside a transaction only becomes visible if that transaction
+commits, and nothing besides the database has to be running.
+
+    @task('thumbnails.refresh')
+    def refresh_thumbnails(product_id): ...
+
+    refresh_thumbnails.enqueue(product_id=product.pk)
+
+Failed tasks are retried with exponential backoff up to `max_attempts`. Claiming
+is a conditional UPDATE on (id, status), so several workers can share the table.
+With settings.TASKS_EAGER the task runs inline instead of being queued.
+
+Tasks registered with `every=<seconds>` are periodic. The worker calls
+`schedule_periodic` about once a minute. That queues the next run of each one
+`every` seconds after the previous run finished, unless a run is already waiting.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 10.0  # seconds; doubles per attempt
+# A running task whose worker died is handed out again after this long
+VISIBILITY_TIMEOUT = timedelta(minutes=10)
+
+_registry = {}
+_periodic = {}  # name -> seconds between runs
+
+
+class TaskDefinition:
+    def __init__(self, name, func, max_attempts):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def enqueue(self, delay=0, **kwargs):
+        return enqueue(self.name, delay=delay, **kwargs)
+
+    def enqueue_once(self, delay=0, **kwargs):
+        """Like enqueue, unless the same call is already waiting in the queue."""
+        return enqueue_once(self.name, delay=delay, **kwargs)
+
+
+def task(name, max_attempts=DEFAULT_MAX_ATTEMPTS, every=None):
+    """Register `func` under `name`. Task arguments must be JSON-serialisable keywords.
+
+    With `every` (seconds) the worker also runs it periodically, without arguments.
+    """
+    def decorator(func):
+        definition = TaskDefinition(name, func, max_attempts)
+        _registry[name] = definition
+        if every is not None:
+            _periodic[name] = every
+        return definition
+    return decorator
+
+
+def get_task(name):
+    return _registry[name]
+
+
+def enqueue(name, delay=0, **kwargs):
+    """Queue task `name` to run in `delay` seconds. Returns the Task row (None when eager)."""
+    definition = _registry[name]
+    if getattr(settings, 'TASKS_EAGER', False):
+        definition(**kwargs)
+        return None
+    return Task.objects.create(
+        name=name,
+        payload=kwargs,
+        max_attempts=definition.max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_once(name, delay=0, **kwargs):
+    """Queue task `name` unless an identical queued task exists (returns that one instead).
+
+    For idempotent catch-up jobs that many requests ask for, like folding new
+    orders into recommendations: one queued run covers them all.
+    """
+    if not getattr(settings, 'TASKS_EAGER', False):
+        pending = Task.objects.filter(name=name, status=Task.QUEUED, payload=kwargs).first()
+        if pending is not None:
+            return pending
+    return enqueue(name, delay=delay, **kwargs)
+
+
+def schedule_periodic(now=None):
+    """Queue the next run of every periodic task that has none queued or running.
+
+    The run is due `every` seconds after the last one finished, or now if it never
+    ran. Returns the Task rows created. Workers racing here can queue a run twice;
+    periodic tasks are cleanups that don't mind running back to back.
+    """
+    now = now or timezone.now()
+    created = []
+    for name, every in _periodic.items():
+        runs = Task.objects.filter(name=name)
+        if runs.filter(status__in=(Task.QUEUED, Task.RUNNING)).exists():
+            continue
+        last = runs.filter(status__in=(Task.DONE, Task.FAILED)).aggregate(m=Max('finished_at'))['m']
+        run_at = max(now, last + timedelta(seconds=every)) if last else now
+        created.append(Task.objects.create(name=name, payload={}, max_attempts=_registry[name].max_attempts,
+                                           run_at=run_at))
+    return created
+
+
+def claim(worker_id, limit, now=None):
+    """Atomically take up to `limit` due tasks for `worker_id`."""
+    now = now or timezone.now()
+    # Hand back tasks whose worker died mid-run
+    Task.objects.filter(status=Task.RUNNING, started_at__lt=now - VISIBILITY_TIMEOUT).update(
+        status=Task.QUEUED, locked_by='',
+    )
+    candidates = list(
+        Task.objects.filter(status=Task.QUEUED, run_at__lte=now)
+        .order_by('run_at', 'id').values_list('id', flat=True)[:limit]
+    )
+    claimed = []
+    for task_id in candidates:
+        # Conditional UPDATE: only one worker can move a row out of 'queued'
+        if Task.objects.filter(id=task_id, status=Task.QUEUED).update(
+            status=Task.RUNNING, locked_by=worker_id, started_at=now, attempts=F('attempts') + 1,
+        ):
+            claimed.append(task_id)
+    return list(Task.objects.filter(id__in=claimed).order_by('run_at', 'id'))
+
+
+def execute(task_row):
+    """Run a claimed task and record the outcome. Returns True on success."""
+    try:
+        get_task(task_row.name)(**task_row.payload)
+    except Exception as e:
+        now = timezone.now()
+        error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+        if task_row.name in _registry and task_row.attempts < task_row.max_attempts:
+            retry_at = now + timedelta(seconds=RETRY_BACKOFF * 2 ** (task_row.attempts - 1))
+            Task.objects.filter(id=task_row.id).update(
+                status=Task.QUEUED, run_at=retry_at, locked_by='', last_error=error,
+            )
+        else:
+            Task.objects.filter(id=task_row.id).update(
+                status=Task.FAILED, finished_at=now, locked_by='', last_error=error,
+            )
+        logger.warning('Task %s #%s failed (attempt %s/%s): %s', task_row.name, task_row.id,
+                       task_row.attempts, task_row.max_attempts, error)
+        return False
+    Task.objects.filter(id=task_row.id).update(status=Task.DONE, finished_at=timezone.now(), locked_by='')
+    return True
+
+
+def purge_finished(older_than=timedelta(days=7)):
+    """Delete done tasks older than `older_than`; failed ones are kept for inspection."""
+    cutoff = timezone.now() - older_than
+    deleted, _ = Task.objects.filter(status=Task.DONE, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+# --- registered tasks ------------------------------------------------------
+
+@task('thumbnails.refresh')
+def refresh_thumbnails(product_id):
+    from .models import Product
+    from .thumbnails import refresh_variants
+    product = Product.objects.filter(pk=product_id).first()
+    if product is not None:
+        refresh_variants(product)
+
+
+@task('orders.archive', max_attempts=1, every=24 * 60 * 60)
+def archive_old_orders(older_than_days=None):
+    from .archive import archive_orders
+    archive_orders(older_than_days)
+
+
+@task('tasks.purge_finished', max_attempts=1, every=24 * 60 * 60)
+def purge_finished_tasks(days=7):
+    purge_finished(timedelta(days=days))
+
+
+@task('checkout_keys.purge', max_attempts=1, every=60 * 60)
+def purge_checkout_keys():
+    from .idempotency import purge_expired
+    purge_expired()
+
+
+@task('recommendations.update', max_attempts=1)
+def update_recommendations():
+    from .recommendations import update
+    update()
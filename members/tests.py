@@ -1,3 +1,1081 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import F
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from . import ai_bot, idempotency
+from .catalog_index import get_index, search_products
+from .catalog_io import import_products
+from .conversations import ConversationStore, get_store
+from .hf_stub import HFStubServer
+from .metrics import REGISTRY
+from .archive import archive_orders
+from .models import ArchivedOrder, CheckoutKey, Customer, DeliveryPartner, MediaBlob, Order, OrderItem, Product, Shopkeeper, Task
+from .order_status import MAX_BULK_ORDERS
+from .purge import purge
+from . import ratelimit
+from . import tasks
+from .signals import order_status_changed
+from .storage import collect_garbage
+from .synthetic import email, generate
+from .staticfiles import compress_file
+from .views import serve_media, serve_static
+from .worker import LatencyHistogram, Worker
+
+
+def make_shop(email='shop@example.com', name='Shop'):
+    return Shopkeeper.objects.create_user(email, name, 'Main Road', 'pw')
+
+
+def make_customer(name='C', email='c@example.com'):
+    return Customer.objects.create(name=name, email=email, phone='1', password='x')
+
+
+def log_in(client, user_type, account):
+    """Log `client` in as a 'customer', 'shopkeeper' or 'delivery' account through its session."""
+    session = client.session
+    session[f'{user_type}_id'] = account.id
+    session['user_type'] = user_type
+    session.save()
+
+
+def checkout(client, *lines, **fields):
+    """POST a cart of (product, quantity) lines to the checkout view."""
+    cart = [{'id': p.id, 'price': str(p.price), 'quantity': q} for p, q in lines]
+    data = {'full_name': 'C', 'phone': '1', 'address': 'a', 'payment_method': 'cod', 'cart_data': json.dumps(cart)}
+    data.update(fields)
+    return client.post('/customer/checkout/', data)
+
+
+class HFFallbackTests(SimpleTestCase):
+    """HF inference fallback against the local stub server."""
+
+    def setUp(self):
+        self.stub = HFStubServer().start()
+        self.addCleanup(self.stub.stop)
+        env = mock.patch.dict(os.environ, {
+            'HF_API_TOKEN': 'test-token',
+            'HF_API_BASE': self.stub.base_url,
+            'HF_READ_TIMEOUT': '0.3',
+        })
+        env.start()
+        self.addCleanup(env.stop)
+        ai_bot.reset_hf_state()
+        self.addCleanup(ai_bot.reset_hf_state)
+
+    def test_reuses_pooled_connection(self):
+        for _ in range(3):
+            self.assertEqual(ai_bot._hf_generate('hello'), 'Stub reply from the inference API.')
+        self.assertEqual(self.stub.requests, 3)
+        self.assertEqual(len(self.stub.client_ports), 1)
+        metrics = ai_bot.get_hf_metrics()
+        self.assertEqual(metrics['successes'], 3)
+        self.assertEqual(metrics['breaker_state'], 'closed')
+
+    def test_breaker_opens_after_repeated_failures(self):
+        self.stub.mode = 'error'
+        for _ in range(ai_bot._hf_breaker.threshold + 2):
+            self.assertIsNone(ai_bot._hf_generate('hello'))
+        self.assertEqual(self.stub.requests, ai_bot._hf_breaker.threshold)
+        metrics = ai_bot.get_hf_metrics()
+        self.assertEqual(metrics['short_circuited'], 2)
+        self.assertEqual(metrics['breaker_state'], 'open')
+
+    def test_slow_endpoint_hits_read_timeout(self):
+        self.stub.mode = 'slow'
+        self.stub.delay = 1.0
+        self.assertIsNone(ai_bot._hf_generate('hello'))
+        metrics = ai_bot.get_hf_metrics()
+        self.assertEqual(metrics['timeouts'], 1)
+        self.assertLess(metrics['latency_ms_max'], 1000)
+
+    def test_refused_connection_is_a_failure_not_a_timeout(self):
+        self.stub.stop()
+        self.assertIsNone(ai_bot._hf_generate('hello'))
+        metrics = ai_bot.get_hf_metrics()
+        self.assertEqual((metrics['failures'], metrics['timeouts']), (1, 0))
+
+
+class TextGenBackendTests(SimpleTestCase):
+    """Choosing and caching the local text-generation backend."""
+
+    def setUp(self):
+        models = mock.patch.dict(ai_bot._models, clear=True)
+        models.start()
+        self.addCleanup(models.stop)
+        ai_bot.reset_reply_stats()
+        self.addCleanup(ai_bot.reset_reply_stats)
+
+    def test_selects_the_requested_backend(self):
+        with mock.patch.object(ai_bot, '_build_pipeline', side_effect=lambda backend: f'{backend} pipe'), \
+                mock.patch.object(ai_bot, '_default_backend', 'torch_int8'):
+            self.assertEqual(ai_bot._load_pipeline_optional('onnx'), 'onnx pipe')
+            self.assertEqual(ai_bot._load_pipeline_optional('ONNX'), 'onnx pipe')
+            self.assertEqual(ai_bot._load_pipeline_optional('gguf'), 'pipeline pipe')
+            self.assertEqual(ai_bot._load_pipeline_optional(), 'torch_int8 pipe')
+        stats = ai_bot.get_reply_stats()
+        self.assertEqual((stats['model_cache_hits'], stats['model_cache_misses']), (1, 3))
+
+    def test_failed_load_is_not_retried(self):
+        with mock.patch.object(ai_bot, '_build_pipeline', side_effect=ImportError('no optimum')) as build:
+            self.assertIsNone(ai_bot._load_pipeline_optional('onnx'))
+            self.assertIsNone(ai_bot._load_pipeline_optional('onnx'))
+        build.assert_called_once_with('onnx')
+        stats = ai_bot.get_reply_stats()
+        self.assertEqual((stats['model_cache_hits'], stats['model_cache_misses']), (1, 1))
+
+    def test_onnx_model_dir_is_under_base_dir(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('AI_ONNX_MODEL_DIR', None)
+            self.assertEqual(ai_bot.default_onnx_model_dir('org/model'),
+                             os.path.join(settings.BASE_DIR, 'models', 'org--model-onnx-int8'))
+            os.environ['AI_ONNX_MODEL_DIR'] = 'exports/onnx'
+            self.assertEqual(ai_bot.default_onnx_model_dir(), os.path.join(settings.BASE_DIR, 'exports', 'onnx'))
+            os.environ['AI_ONNX_MODEL_DIR'] = '/srv/onnx'
+            self.assertEqual(ai_bot.default_onnx_model_dir(), '/srv/onnx')
+
+
+class CatalogIndexTests(TestCase):
+    """Bot product lookups answered from the in-memory index."""
+
+    def setUp(self):
+        get_index().invalidate()
+        self.addCleanup(get_index().invalidate)
+        self.shop = make_shop(name='Sharma Kirana')
+        Product.objects.create(shopkeeper=self.shop, name='Basmati Rice', price=120, quantity='5 kg', description='Long grain rice')
+        Product.objects.create(shopkeeper=self.shop, name='Mustard Oil', price=180, quantity='1 L', description='Cold pressed')
+        Product.objects.create(shopkeeper=self.shop, name='Toor Dal', price=140, quantity='1 kg', description='Split pigeon peas')
+
+    def test_search_ranks_matching_products(self):
+        results = get_index().search('rice')
+        self.assertEqual(results[0]['name'], 'Basmati Rice')
+        self.assertEqual(results[0]['shop'], 'Sharma Kirana')
+        self.assertNotIn('Toor Dal', [r['name'] for r in results])
+
+    def test_index_follows_product_changes(self):
+        get_index().search('rice')  # load
+        oil = Product.objects.get(name='Mustard Oil')
+        oil.name = 'Groundnut Oil'
+        oil.save()
+        Product.objects.get(name='Basmati Rice').delete()
+        self.assertEqual(get_index().search('groundnut')[0]['id'], oil.id)
+        self.assertEqual(get_index().search('basmati'), [])
+
+    def test_bot_answers_search_from_catalog(self):
+        reply = ai_bot.generate_ai_reply([{'role': 'user', 'content': 'search rice'}])
+        self.assertIn('Basmati Rice', reply)
+        self.assertIn('₹120.00', reply)
+
+    def test_lookup_without_matches_falls_through_to_intents(self):
+        reply = ai_bot.generate_ai_reply([{'role': 'user', 'content': 'show me customer login'}])
+        self.assertNotIn("couldn't find", reply)
+        self.assertEqual(reply, ai_bot._intent_reply('show me customer login'))
+
+
+class ConversationStoreTests(SimpleTestCase):
+    def test_trims_to_token_budget_keeping_latest_turns(self):
+        store = ConversationStore(token_budget=10, count_tokens=lambda text: len(text.split()))
+        store.append('s1', 'user', 'one two three four')
+        store.append('s1', 'assistant', 'five six seven eight')
+        store.append('s1', 'user', 'nine ten eleven')
+        ctx = store.context('s1')
+        self.assertEqual([m['content'] for m in ctx.messages], ['five six seven eight', 'nine ten eleven'])
+        self.assertEqual(ctx.n_tokens, 7)
+        self.assertTrue(ctx.prompt.endswith('User: nine ten eleven\nAssistant:'))
+
+    def test_evicts_least_recently_used_sessions(self):
+        store = ConversationStore(max_sessions=2)
+        for key in ('a', 'b', 'c'):
+            store.append(key, 'user', 'hi')
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.context('a').messages, [])
+
+
+class AIChatViewTests(TestCase):
+    def test_history_is_kept_per_session(self):
+        self.client.post('/api/ai/chat/', '{"message": "hello there"}', content_type='application/json')
+        resp = self.client.post('/api/ai/chat/', '{"message": "what about payment?"}', content_type='application/json')
+        self.assertTrue(resp.json()['success'])
+        # Anonymous clients are tracked by a cookie, without writing a session row
+        self.assertFalse(Session.objects.exists())
+        ctx = get_store().context('anon:' + self.client.cookies['ai_chat'].value)
+        self.assertEqual([m['role'] for m in ctx.messages], ['user', 'assistant', 'user', 'assistant'])
+        self.assertEqual(ctx.messages[2]['content'], 'what about payment?')
+
+
+class PurgeTests(TestCase):
+    def setUp(self):
+        self.shop = make_shop()
+        self.other = make_shop('other@example.com', 'Other')
+        customer = make_customer()
+        self.rider = DeliveryPartner.objects.create(name='D', email='d@example.com', vehicle='bike', password='x')
+        for shop in (self.shop, self.other):
+            product = Product.objects.create(shopkeeper=shop, name='Rice', price=10, quantity='1', description='')
+            for _ in range(3):
+                order = Order.objects.create(customer=customer, shopkeeper=shop, delivery_address='a',
+                                             delivery_phone='1', delivery_partner=self.rider)
+                OrderItem.objects.create(order=order, product=product, product_name='Rice', quantity=1, price=10)
+
+    def test_dry_run_counts_without_writing(self):
+        result = purge(Shopkeeper, [self.shop.pk], dry_run=True)
+        self.assertEqual(result.counts, {'OrderItem': 3, 'Order': 3, 'ArchivedOrder': 0, 'SalesDaily': 0,
+                                         'ShopOrderCounts': 0, 'OrderItem (product set to null)': 0,
+                                         'Product': 1, 'Shopkeeper': 1})
+        self.assertEqual(Order.objects.count(), 6)
+
+    def test_shopkeeper_purge_in_chunks(self):
+        result = purge(Shopkeeper, Shopkeeper.objects.filter(pk=self.shop.pk), chunk_size=2)
+        self.assertEqual(result.target_count, 1)
+        self.assertEqual(result.counts['Order'], 3)
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertEqual(OrderItem.objects.count(), 3)
+        self.assertFalse(Product.objects.filter(shopkeeper_id=self.shop.pk).exists())
+
+    def test_product_and_partner_purges_keep_history(self):
+        purge(Product, Product.objects.filter(shopkeeper=self.other))
+        self.assertEqual(OrderItem.objects.filter(product__isnull=True).count(), 3)
+        purge(DeliveryPartner, [self.rider.pk], chunk_size=4)
+        self.assertEqual(Order.objects.filter(delivery_partner__isnull=True).count(), 6)
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Changelist pages cost a fixed number of queries, whatever the number of rows."""
+
+    def setUp(self):
+        admin_user = Shopkeeper.objects.create_superuser('admin@example.com', 'Admin', 'HQ', 'pw')
+        self.client.force_login(admin_user)
+        self.customer = make_customer()
+
+    def add_rows(self, n):
+        for i in range(n):
+            shop = Shopkeeper.objects.create(email=f'shop{Shopkeeper.objects.count()}@example.com', name='S', address='a')
+            product = Product.objects.create(shopkeeper=shop, name=f'P{i}', price=10, quantity='1', description='')
+            order = Order.objects.create(customer=self.customer, shopkeeper=shop, delivery_address='a', delivery_phone='1')
+            OrderItem.objects.create(order=order, product=product, product_name=product.name, quantity=1, price=10)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        urls = ['/admin/members/product/', '/admin/members/order/', '/admin/members/orderitem/']
+        self.add_rows(2)
+        small = [self.count_queries(url) for url in urls]
+        self.add_rows(8)
+        large = [self.count_queries(url) for url in urls]
+        self.assertEqual(small, large)
+
+    def test_paginator_caps_count(self):
+        from .admin import LargeTablePaginator
+        self.add_rows(5)
+        paginator = LargeTablePaginator(Order.objects.order_by('pk'), 2)
+        paginator.count_limit = 3
+        self.assertEqual(paginator.count, 3)
+        self.assertEqual(paginator.num_pages, 2)
+
+
+class OrderArchiveTests(TestCase):
+    def setUp(self):
+        shop = make_shop()
+        self.customer = make_customer()
+        product = Product.objects.create(shopkeeper=shop, name='Rice', price=10, quantity='1', description='')
+        old = timezone.now() - timedelta(days=400)
+        for status in ('delivered', 'cancelled', 'pending', 'delivered'):
+            order = Order.objects.create(customer=self.customer, shopkeeper=shop, delivery_address='a',
+                                         delivery_phone='1', status=status, total_amount=20)
+            OrderItem.objects.create(order=order, product=product, product_name='Rice', quantity=2, price=10)
+            Order.objects.filter(pk=order.pk).update(date=old)
+        # A recent delivered order stays hot
+        Order.objects.filter(pk=order.pk).update(date=timezone.now())
+
+    def test_moves_old_completed_orders_out_of_hot_tables(self):
+        self.assertEqual(archive_orders(180, dry_run=True), {'orders': 2, 'items': 2})
+        self.assertEqual(archive_orders(180, batch_size=1), {'orders': 2, 'items': 2})
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(OrderItem.objects.count(), 2)
+        archived = ArchivedOrder.objects.order_by('id').first()
+        self.assertEqual(archived.shop_name, 'Shop')
+        item = archived.items.all()[0]
+        self.assertEqual((item.product_name, item.quantity, item.subtotal), ('Rice', 2, 20))
+
+    def test_customer_orders_shows_history_on_demand(self):
+        archive_orders(180)
+        log_in(self.client, 'customer', self.customer)
+        resp = self.client.get('/customer/orders/')
+        self.assertEqual(len(resp.context['orders']), 2)
+        self.assertEqual(resp.context['archived_orders'], [])
+        resp = self.client.get('/customer/orders/?history=1')
+        self.assertEqual(len(resp.context['archived_orders']), 2)
+        self.assertContains(resp, 'Order History')
+
+
+class CatalogImportExportTests(TestCase):
+    def setUp(self):
+        self.shop = make_shop()
+        Product.objects.create(shopkeeper=self.shop, name='Rice', price=50, quantity='1 kg', description='old')
+        log_in(self.client, 'shopkeeper', self.shop)
+
+    def test_csv_upsert_in_batches(self):
+        data = 'name,price,quantity,description\nRice,55,1 kg,new\nDal,abc,1 kg,\nOil,120.5,1 L,\nSugar,40,1 kg,\n'
+        result = import_products(self.shop, io.StringIO(data), 'csv', batch_size=2)
+        self.assertEqual((result.created, result.updated, result.error_count), (2, 1, 1))
+        self.assertEqual(result.errors, [(3, 'price must be a number')])
+        rice = Product.objects.get(shopkeeper=self.shop, name='Rice')
+        self.assertEqual((str(rice.price), rice.description), ('55.00', 'new'))
+        self.assertEqual(Product.objects.filter(shopkeeper=self.shop).count(), 3)
+
+    def test_non_finite_prices_are_row_errors(self):
+        data = 'name,price,quantity,description\nGood,10,1 kg,\nBad,nan,1 kg,\nWorse,inf,1 kg,\nGood2,12,1 kg,\n'
+        result = import_products(self.shop, io.StringIO(data), 'csv')
+        self.assertEqual(result.created, 2)
+        self.assertEqual(result.errors, [(3, 'price must be a number'), (4, 'price must be a number')])
+
+    def test_endpoints_round_trip_jsonl(self):
+        lines = [json.dumps({'name': 'Oil', 'price': '120', 'quantity': '1 L'}), 'not json']
+        upload = SimpleUploadedFile('catalog.jsonl', '\n'.join(lines).encode('utf-8'))
+        self.client.post('/shopkeeper/products/import/', {'file': upload})
+        resp = self.client.get('/shopkeeper/products/export/?format=jsonl')
+        rows = [json.loads(line) for line in b''.join(resp.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual(sorted(r['name'] for r in rows), ['Oil', 'Rice'])
+        resp = self.client.get('/shopkeeper/products/export/')
+        self.assertEqual(b''.join(resp.streaming_content).decode('utf-8').splitlines()[0], 'name,price,quantity,description')
+
+
+class BulkOrderStatusTests(TestCase):
+    def setUp(self):
+        self.shop = make_shop()
+        other = make_shop('other@example.com', 'Other')
+        customer = make_customer()
+        self.orders = [
+            Order.objects.create(customer=customer, shopkeeper=shop, delivery_address='a',
+                                 delivery_phone='1', status=status)
+            for shop, status in ((self.shop, 'pending'), (self.shop, 'confirmed'),
+                                 (self.shop, 'delivered'), (other, 'pending'))
+        ]
+        log_in(self.client, 'shopkeeper', self.shop)
+
+    def test_one_update_with_per_order_results(self):
+        events = []
+
+        def receiver(sender, **kwargs):
+            events.append(kwargs)
+
+        order_status_changed.connect(receiver)
+        self.addCleanup(order_status_changed.disconnect, receiver)
+        ids = [o.id for o in self.orders]
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post('/shopkeeper/orders/bulk-status/',
+                                    json.dumps({'order_ids': ids, 'status': 'ready'}),
+                                    content_type='application/json')
+        data = resp.json()
+        self.assertEqual(data['updated'], 2)
+        self.assertEqual([r['ok'] for r in data['results']], [True, True, False, False])
+        self.assertEqual(data['results'][3]['error'], 'Order not found')
+        self.assertEqual(Order.objects.get(pk=ids[3]).status, 'pending')
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['changes'], {ids[0]: 'pending', ids[1]: 'confirmed'})
+
+    def test_rejects_statuses_outside_the_shopkeeper_flow(self):
+        resp = self.client.post('/shopkeeper/orders/bulk-status/',
+                                json.dumps({'order_ids': [self.orders[0].id], 'status': 'delivered'}),
+                                content_type='application/json')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_rejects_more_orders_than_the_limit(self):
+        ids = [self.orders[0].id] + list(range(10**6, 10**6 + MAX_BULK_ORDERS))
+        resp = self.client.post('/shopkeeper/orders/bulk-status/', json.dumps({'order_ids': ids, 'status': 'ready'}),
+                                content_type='application/json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn(f'At most {MAX_BULK_ORDERS}', resp.json()['error'])
+        self.assertEqual(Order.objects.get(pk=ids[0]).status, 'pending')
+
+    def test_rejects_order_ids_that_are_not_a_list_of_ints(self):
+        for order_ids in (str(self.orders[0].id), [str(self.orders[0].id)], [True], {'a': 1}):
+            resp = self.client.post('/shopkeeper/orders/bulk-status/',
+                                    json.dumps({'order_ids': order_ids, 'status': 'ready'}),
+                                    content_type='application/json')
+            self.assertEqual(resp.status_code, 400, order_ids)
+            self.assertEqual(resp.json()['error'], 'order_ids must be a list of order ids.')
+        self.assertEqual(Order.objects.get(pk=self.orders[0].id).status, 'pending')
+
+
+class MediaTestCase(TestCase):
+    """Runs against a throwaway MEDIA_ROOT, with tasks run inline."""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media, TASKS_EAGER=True)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.shop = make_shop()
+
+    def _upload(self, name, size=(1000, 500)):
+        buf = io.BytesIO()
+        Image.new('RGBA', size, (200, 30, 30, 128)).save(buf, 'PNG')
+        return SimpleUploadedFile(name, buf.getvalue(), content_type='image/png')
+
+
+class ProductThumbnailTests(MediaTestCase):
+    def test_variants_follow_the_uploaded_image(self):
+        product = Product.objects.create(shopkeeper=self.shop, name='Rice', price=10, quantity='1',
+                                         description='', image=self._upload('rice.png'))
+        product.refresh_from_db()
+        self.assertEqual([w for w, _ in product.image_variant_urls('jpeg')], [200, 400, 800])
+        self.assertIn(' 800w', product.webp_srcset)
+        self.assertTrue(product.card_image_url.endswith('_400w.jpg'))
+        old_files = list(product.image_variants['jpeg'].values())
+        product.image = self._upload('rice2.png', size=(300, 150))
+        product.save()
+        product.refresh_from_db()
+        self.assertEqual([w for w, _ in product.image_variant_urls('jpeg')], [200])
+        self.assertFalse(any(os.path.exists(os.path.join(self.media, f)) for f in old_files))
+
+    def test_backfill_command(self):
+        product = Product.objects.create(shopkeeper=self.shop, name='Rice', price=10, quantity='1',
+                                         description='', image=self._upload('rice.png'))
+        Product.objects.filter(pk=product.pk).update(image_variants={})
+        product.refresh_from_db()
+        self.assertEqual(product.card_image_url, product.image.url)
+        call_command('generate_thumbnails', stdout=io.StringIO())
+        product.refresh_from_db()
+        self.assertTrue(product.card_image_url.endswith('_400w.jpg'))
+
+
+class ContentAddressedMediaTests(MediaTestCase):
+    def _product(self, name, upload):
+        return Product.objects.create(shopkeeper=self.shop, name=name, price=10, quantity='1',
+                                      description='', image=upload)
+
+    def test_identical_uploads_are_stored_once_and_collected(self):
+        rice = self._product('Rice', self._upload('rice.png'))
+        dal = self._product('Dal', self._upload('copy.png'))
+        self.assertEqual(rice.image.name, dal.image.name)
+        self.assertRegex(rice.image.name, r'^product_images/../../[0-9a-f]{64}\.png$')
+        self.assertEqual(MediaBlob.objects.get().refcount, 2)
+        rice.refresh_from_db()
+        self.assertEqual(rice.image_variants, Product.objects.get(pk=dal.pk).image_variants)
+
+        dal.image = self._upload('new.png', size=(300, 150))
+        dal.save()
+        rice.delete()
+        self.assertEqual(MediaBlob.objects.get(name=rice.image.name).refcount, 0)
+        self.assertEqual(collect_garbage(grace=timedelta(0))['deleted'], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.media, rice.image.name)))
+        self.assertTrue(os.path.exists(os.path.join(self.media, dal.image.name)))
+
+    def test_hashed_urls_are_served_immutable(self):
+        rice = self._product('Rice', self._upload('rice.png'))
+        # The media route is only mounted when DEBUG is on at startup, so call the view directly
+        resp = serve_media(RequestFactory().get(rice.image.url), rice.image.name)
+        self.assertEqual(resp['Cache-Control'], 'public, max-age=31536000, immutable')
+
+
+class TaskQueueTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        override = override_settings(TASKS_EAGER=False)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_thumbnails_are_deferred_to_the_worker(self):
+        product = Product.objects.create(shopkeeper=self.shop, name='Rice', price=10, quantity='1',
+                                         description='', image=self._upload('rice.png'))
+        self.assertEqual(product.card_image_url, product.image.url)
+        queued = Task.objects.get()
+        self.assertEqual((queued.name, queued.payload), ('thumbnails.refresh', {'product_id': product.pk}))
+        worker = Worker(concurrency=2, periodic=False)
+        self.assertEqual(worker.run_once(), 1)
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+        product.refresh_from_db()
+        self.assertTrue(product.card_image_url.endswith('_400w.jpg'))
+        self.assertEqual(worker.run.count, 1)
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        calls = []
+
+        @tasks.task('tests.flaky', max_attempts=2)
+        def flaky():
+            calls.append(1)
+            raise RuntimeError('boom')
+
+        self.addCleanup(tasks._registry.pop, 'tests.flaky')
+        row = flaky.enqueue()
+        worker = Worker(periodic=False)
+        with self.assertLogs('members.tasks', 'WARNING'):
+            worker.run_once()
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (Task.QUEUED, 1))
+        self.assertGreater(row.run_at, timezone.now())
+        self.assertEqual(worker.run_once(), 0)  # not due yet
+        Task.objects.filter(pk=row.pk).update(run_at=timezone.now())
+        with self.assertLogs('members.tasks', 'WARNING'):
+            worker.run_once()
+        row.refresh_from_db()
+        self.assertEqual((row.status, len(calls), worker.stats['failed']), (Task.FAILED, 2, 2))
+        self.assertIn('RuntimeError: boom', row.last_error)
+
+    def test_burst_worker_exits_when_recording_an_outcome_fails(self):
+        tasks.enqueue('tasks.purge_finished')
+        worker = Worker(periodic=False)
+        with mock.patch('members.worker.execute', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('members.worker', 'ERROR'):
+            worker.run_forever(burst=True)
+        self.assertEqual((worker._busy, worker.stats['failed']), (0, 1))
+
+    def test_periodic_tasks_are_requeued_after_each_run(self):
+        with mock.patch.dict(tasks._periodic, {'checkout_keys.purge': 3600}, clear=True):
+            self.assertEqual(Worker().run_once(), 1)
+            done = Task.objects.get(name='checkout_keys.purge')
+            self.assertEqual(done.status, Task.DONE)
+            nxt, = tasks.schedule_periodic()
+            self.assertEqual(nxt.run_at, done.finished_at + timedelta(hours=1))
+            # One waiting run is enough
+            self.assertEqual(tasks.schedule_periodic(), [])
+
+    def test_latency_histogram(self):
+        histogram = LatencyHistogram(buckets=(0.1, 1))
+        for seconds in (0.05, 0.05, 0.5, 3):
+            histogram.observe(seconds)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual((histogram.quantile(0.5), histogram.quantile(0.75)), (0.1, 1))
+
+
+class StaticPipelineTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        override = override_settings(STATIC_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.name = 'ai_bot.0123456789ab.js'
+        with open(os.path.join(self.root, self.name), 'w') as fh:
+            fh.write('console.log("bot");\n' * 200)
+        compress_file(os.path.join(self.root, self.name))
+
+    def test_serves_best_accepted_encoding(self):
+        factory = RequestFactory()
+        resp = serve_static(factory.get('/static/x', HTTP_ACCEPT_ENCODING='gzip, deflate'), self.name)
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        self.assertEqual(resp['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(resp['Content-Type'], 'text/javascript')
+        self.assertLess(int(resp['Content-Length']), 4200 // 10)
+        resp = serve_static(factory.get('/static/x', HTTP_ACCEPT_ENCODING='gzip;q=0'), self.name)
+        self.assertFalse(resp.has_header('Content-Encoding'))
+        self.assertEqual(resp['Vary'], 'Accept-Encoding')
+
+    def test_bot_script_is_no_longer_inline(self):
+        resp = self.client.get('/')
+        self.assertContains(resp, 'ai_bot.js')
+        self.assertNotContains(resp, 'ai-bot-bubble')
+
+
+class CustomerDashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        shop = make_shop()
+        for i in range(5):
+            Product.objects.create(shopkeeper=shop, name=f'Item {i}', price=10, quantity='1', description='')
+        self.shop = shop
+        log_in(self.client, 'customer', make_customer(name='Asha'))
+
+    def _product_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get('/customer/dashboard/')
+        self.assertContains(resp, 'Welcome')
+        return resp, [q for q in ctx.captured_queries if 'members_product' in q['sql']]
+
+    def test_grid_is_cached_until_the_catalog_changes(self):
+        resp, queries = self._product_queries()
+        self.assertTrue(queries)
+        self.assertContains(resp, 'Item 4')
+        resp, queries = self._product_queries()
+        self.assertEqual(queries, [])
+        self.assertContains(resp, 'Item 4')
+        Product.objects.filter(name='Item 4').first().delete()
+        Product.objects.create(shopkeeper=self.shop, name='Fresh Item', price=5, quantity='1', description='')
+        resp, queries = self._product_queries()
+        self.assertContains(resp, 'Fresh Item')
+        self.assertNotContains(resp, 'Item 4')
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.shop = make_shop()
+        self.rice = Product.objects.create(shopkeeper=self.shop, name='Rice', price=50, quantity='1 kg', description='')
+        self.dal = Product.objects.create(shopkeeper=self.shop, name='Dal', price=120, quantity='1 kg', description='')
+        self.customer = make_customer()
+
+    def _checkout(self, *lines):
+        log_in(self.client, 'customer', self.customer)
+        checkout(self.client, *lines)
+        return Order.objects.latest('id')
+
+    def _rollup(self):
+        from .models import SalesDaily
+        return {r.product_id: (r.orders, r.units, r.revenue)
+                for r in SalesDaily.objects.filter(shopkeeper_id=self.shop.id)}
+
+    def test_checkout_and_cancel_update_the_rollup(self):
+        self._checkout((self.rice, 2), (self.dal, 1))
+        order = self._checkout((self.rice, 3))
+        self.assertEqual(self._rollup()[self.rice.id], (2, 5, 250))
+        self.assertEqual(self._rollup()[self.dal.id], (1, 1, 120))
+
+        log_in(self.client, 'shopkeeper', self.shop)
+        self.client.post(f'/shopkeeper/update-order/{order.id}/', {'status': 'cancelled'})
+        self.assertEqual(self._rollup()[self.rice.id], (1, 2, 100))
+        incremental = self._rollup()
+
+        from .sales import rebuild
+        rebuild()
+        self.assertEqual(self._rollup(), incremental)
+
+    def test_cancelling_after_the_product_was_deleted_reverses_its_row(self):
+        self._checkout((self.rice, 1))
+        order = self._checkout((self.rice, 2), (self.dal, 1))
+        rice_id = self.rice.id
+        self.rice.delete()
+        log_in(self.client, 'shopkeeper', self.shop)
+        self.client.post(f'/shopkeeper/update-order/{order.id}/', {'status': 'cancelled'})
+        rollup = self._rollup()
+        self.assertEqual(rollup[rice_id], (1, 1, 50))
+        self.assertNotIn(0, rollup)
+
+        from .sales import rebuild
+        rebuild()
+        self.assertEqual(self._rollup()[rice_id], (1, 1, 50))
+
+    def test_report_endpoint(self):
+        self._checkout((self.rice, 2), (self.dal, 1))
+        log_in(self.client, 'shopkeeper', self.shop)
+        today = timezone.localdate()
+        resp = self.client.get('/shopkeeper/sales/report/', {
+            'start': (today - timedelta(days=9)).isoformat(), 'end': today.isoformat(),
+        })
+        report = resp.json()['report']
+        self.assertEqual(len(report['days']), 10)
+        self.assertEqual(report['revenue'][-1], 220.0)
+        self.assertEqual(report['totals']['units'], 3)
+        self.assertEqual([p['name'] for p in report['top_products']], ['Dal', 'Rice'])
+        self.assertGreater(report['trend_per_day'], 0)
+        bad = self.client.get('/shopkeeper/sales/report/', {'start': 'yesterday'})
+        self.assertEqual(bad.status_code, 400)
+
+
+class OrderCounterTests(TestCase):
+    def setUp(self):
+        self.shop = make_shop()
+        self.product = Product.objects.create(shopkeeper=self.shop, name='Rice', price=50, quantity='1 kg',
+                                              description='')
+        self.customer = make_customer()
+        self.rider = DeliveryPartner.objects.create(name='R', email='r@example.com', vehicle='bike', password='x')
+
+    def _counts(self):
+        from .order_counts import order_counts
+        row = order_counts(self.shop.id)
+        return {s: getattr(row, s) for s in ('pending', 'ready', 'assigned', 'out_for_delivery', 'cancelled')
+                if getattr(row, s)}
+
+    def test_counters_follow_every_status_change(self):
+        log_in(self.client, 'customer', self.customer)
+        for _ in range(3):
+            checkout(self.client, (self.product, 1))
+        first, second, third = Order.objects.order_by('id')
+        self.assertEqual(self._counts(), {'pending': 3})
+
+        log_in(self.client, 'shopkeeper', self.shop)
+        self.client.post(f'/shopkeeper/update-order/{first.id}/', {'status': 'ready'})
+        self.client.post('/shopkeeper/orders/bulk-status/',
+                         json.dumps({'order_ids': [second.id], 'status': 'cancelled'}),
+                         content_type='application/json')
+        log_in(self.client, 'delivery', self.rider)
+        self.client.post(f'/delivery/accept-order/{first.id}/')
+        self.client.post(f'/delivery/update-status/{first.id}/', {'status': 'out_for_delivery'})
+        self.assertEqual(self._counts(), {'pending': 1, 'out_for_delivery': 1, 'cancelled': 1})
+
+        with CaptureQueriesContext(connection) as ctx:
+            self._counts()
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_reconcile_fixes_drift(self):
+        from .models import ShopOrderCounts
+        from .order_counts import reconcile
+        Order.objects.create(customer=self.customer, shopkeeper=self.shop, delivery_address='a',
+                             delivery_phone='1', status='pending')
+        ShopOrderCounts.objects.create(shopkeeper_id=self.shop.id, pending=5)
+        self.assertEqual(reconcile(dry_run=True), {self.shop.id: {'pending': (5, 1)}})
+        self.assertEqual(self._counts(), {'pending': 5})
+        reconcile()
+        self.assertEqual(self._counts(), {'pending': 1})
+        purge(Customer, [self.customer.id])
+        self.assertEqual(self._counts(), {})
+
+
+class InventoryTests(TestCase):
+    def setUp(self):
+        self.shop = make_shop()
+        self.rice = Product.objects.create(shopkeeper=self.shop, name='Rice', price=50, quantity='1 kg',
+                                           description='', stock=5)
+        self.salt = Product.objects.create(shopkeeper=self.shop, name='Salt', price=20, quantity='1 kg',
+                                           description='')
+        self.customer = make_customer()
+
+    def _checkout(self, *lines):
+        log_in(self.client, 'customer', self.customer)
+        return checkout(self.client, *lines)
+
+    def _stock(self):
+        self.rice.refresh_from_db()
+        return self.rice.stock
+
+    def test_checkout_takes_stock_all_or_nothing(self):
+        self._checkout((self.rice, 3), (self.salt, 10))
+        self.assertEqual(self._stock(), 2)
+        resp = self._checkout((self.rice, 3), (self.salt, 1))
+        self.assertEqual(self._stock(), 2)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertIn('not enough stock', str(list(resp.wsgi_request._messages)[-1]))
+
+        order = Order.objects.get()
+        log_in(self.client, 'shopkeeper', self.shop)
+        self.client.post(f'/shopkeeper/update-order/{order.id}/', {'status': 'cancelled'})
+        self.assertEqual(self._stock(), 5)
+        # The stock is back on sale, so the order can't come back to life
+        resp = self.client.post(f'/shopkeeper/update-order/{order.id}/', {'status': 'delivered'})
+        self.assertIn('cannot be reopened', str(list(resp.wsgi_request._messages)[-1]))
+        order.refresh_from_db()
+        self.assertEqual((order.status, self._stock()), ('cancelled', 5))
+
+    def test_unconfirmed_reservations_expire(self):
+        from .inventory import ReservationExpired, confirm, release_expired, reserve
+        token = reserve({self.rice.id: 4}, ttl=60)
+        self.assertEqual(self._stock(), 1)
+        self.assertEqual(release_expired(), 0)
+        self.assertEqual(release_expired(now=timezone.now() + timedelta(seconds=61)), 4)
+        self.assertEqual(self._stock(), 5)
+        order = Order.objects.create(customer=self.customer, shopkeeper=self.shop, delivery_address='a',
+                                     delivery_phone='1')
+        with self.assertRaises(ReservationExpired):
+            confirm(token, order, [self.rice.id])
+
+    def test_concurrent_checkouts_never_oversell(self):
+        proc = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.checkout_stress', '--threads', '8', '--checkouts', '10',
+             '--products', '4', '--stock', '15'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=300,
+        )
+        self.assertEqual(proc.returncode, 0, proc.stdout + proc.stderr)
+
+
+class CheckoutKeyTests(TestCase):
+    def setUp(self):
+        self.rice = Product.objects.create(shopkeeper=make_shop(), name='Rice', price=50, quantity='1 kg',
+                                           description='', stock=5)
+        self.customer = make_customer()
+        log_in(self.client, 'customer', self.customer)
+
+    def _checkout(self, key, quantity=1):
+        resp = checkout(self.client, (self.rice, quantity), idempotency_key=key)
+        return str(list(resp.wsgi_request._messages)[-1])
+
+    def test_resubmitted_form_replays_the_first_result(self):
+        key = self.client.get('/customer/cart/').context['checkout_key']
+        first = self._checkout(key)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._checkout(key), first)
+        self.assertFalse([q for q in queries if 'INSERT INTO "members_order"' in q['sql']])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(CheckoutKey.objects.get().order_ids, [Order.objects.get().id])
+        self.assertIn('different cart', self._checkout(key, quantity=2))
+        self.assertIn('placed successfully', self._checkout('another-key'))
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_failed_checkout_frees_its_key_and_old_keys_are_purged(self):
+        self.assertIn('not enough stock', self._checkout('k1', quantity=9))
+        self.assertFalse(CheckoutKey.objects.exists())
+        self.assertIn('placed successfully', self._checkout('k1'))
+        CheckoutKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = io.StringIO()
+        call_command('purge_checkout_keys', stdout=out)
+        self.assertIn('Deleted 1 expired', out.getvalue())
+
+    def test_abandoned_claim_is_taken_over_after_its_lease(self):
+        cart = json.dumps([{'id': self.rice.id, 'price': str(self.rice.price), 'quantity': 1}])
+        digest = idempotency.fingerprint(['C', '1', 'a', 'cod', '', cart])
+        # The first request claimed the key and then died before placing the orders
+        self.assertIsNone(idempotency.claim(self.customer.id, 'k1', digest))
+        self.assertIn('still being placed', self._checkout('k1'))
+        CheckoutKey.objects.update(created_at=timezone.now() - timedelta(minutes=10))
+        self.assertIn('placed successfully', self._checkout('k1'))
+        self.assertEqual(self._checkout('k1'), self._checkout('k1'))
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        shop = make_shop()
+        self.customer = make_customer()
+        self.shop = shop
+        self.p = {name: Product.objects.create(shopkeeper=shop, name=name, price=10, quantity='1', description='')
+                  for name in ('Rice', 'Dal', 'Salt', 'Tea', 'Sugar')}
+
+    def _order(self, *names, status='pending', customer=None, pk=None):
+        order = Order.objects.create(pk=pk, customer=customer or self.customer, shopkeeper=self.shop,
+                                     delivery_address='a', delivery_phone='1', status=status)
+        OrderItem.objects.bulk_create([OrderItem(order=order, product=self.p[n], product_name=n, quantity=1, price=10)
+                                       for n in names])
+        return order
+
+    def _lists(self):
+        from .models import ProductRecommendations
+        return {r.product_id: r.neighbours for r in ProductRecommendations.objects.all()}
+
+    def test_incremental_update_matches_rebuild(self):
+        from .recommendations import neighbours, rebuild, update
+        self._order('Rice', 'Dal')
+        self._order('Rice', 'Dal', 'Salt')
+        self._order('Tea', 'Sugar', status='cancelled')
+        rebuild()
+        rice, dal, salt = self.p['Rice'].id, self.p['Dal'].id, self.p['Salt'].id
+        self.assertEqual(neighbours([rice]), [dal, salt])
+        self.assertNotIn(self.p['Tea'].id, self._lists())
+
+        self._order('Tea', 'Sugar')
+        self._order('Salt', 'Rice', 'Tea')
+        self.assertEqual(update(), 2)
+        self.assertEqual(update(), 0)
+        incremental = self._lists()
+        rebuild()
+        self.assertEqual(incremental, self._lists())
+
+        with CaptureQueriesContext(connection) as ctx:
+            neighbours([rice])
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_order_committed_behind_the_watermark_is_folded_in_later(self):
+        from .models import RecommendationState
+        from .recommendations import GAP_TTL, neighbours, rebuild, update
+        rebuild()
+        late = self._order('Tea', 'Sugar')
+        self._order('Rice', 'Dal')
+        # As if `late` were still uncommitted when the update ran
+        late_id = late.id
+        late.delete()
+        self.assertEqual(update(), 1)
+        self.assertEqual([g[0] for g in RecommendationState.objects.get().gaps], [late_id])
+
+        self._order('Tea', 'Sugar', pk=late_id)
+        self.assertEqual(update(), 1)
+        self.assertEqual(neighbours([self.p['Tea'].id]), [self.p['Sugar'].id])
+        self.assertEqual(RecommendationState.objects.get().gaps, [])
+
+        # Ids that never show up (rolled-back checkouts) are forgotten after GAP_TTL
+        seen = timezone.now().timestamp()
+        RecommendationState.objects.update(gaps=[[10**6, seen]], last_order_id=10**6)
+        update()
+        self.assertEqual(len(RecommendationState.objects.get().gaps), 1)
+        update(now=timezone.now() + timedelta(seconds=GAP_TTL))
+        self.assertEqual(RecommendationState.objects.get().gaps, [])
+
+    def test_gap_scan_is_bounded_and_watermarks_agree(self):
+        from .models import RecommendationState
+        from .recommendations import GAP_SCAN, rebuild, update
+        self._order('Rice', 'Dal', pk=10**6)
+        # First update without a rebuild: the ids below 10**6 are not all gaps
+        self.assertEqual(update(), 1)
+        state = RecommendationState.objects.get()
+        self.assertEqual((state.last_order_id, len(state.gaps)), (10**6, GAP_SCAN - 1))
+
+        # An order without lines still moves both watermarks the same way
+        empty = Order.objects.create(customer=self.customer, shopkeeper=self.shop, delivery_address='a',
+                                     delivery_phone='1')
+        rebuild()
+        self.assertEqual(RecommendationState.objects.get().last_order_id, empty.id)
+        self.assertEqual(update(), 0)
+        self.assertEqual(RecommendationState.objects.get().last_order_id, empty.id)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_dashboard_shows_customers_also_bought(self):
+        self._order('Rice', 'Dal', customer=make_customer(name='D', email='d@example.com'))
+        log_in(self.client, 'customer', self.customer)
+        checkout(self.client, (self.p['Rice'], 1))
+        resp = self.client.get('/customer/dashboard/')
+        self.assertContains(resp, 'Customers also bought')
+        self.assertEqual([p.name for p in resp.context['also_bought']], ['Dal'])
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        REGISTRY.reset()
+        self.addCleanup(REGISTRY.reset)
+
+    def test_records_route_latency_queries_and_size(self):
+        Product.objects.create(shopkeeper=Shopkeeper.objects.create(email='s@example.com', name='S', address='a'),
+                               name='Rice', price=10, quantity='1 kg', description='')
+        resp = self.client.get('/api/products/')
+        self.client.get('/no-such-page/')
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('http_requests_total{route="api_products",method="GET",status="200"} 1', body)
+        self.assertIn('http_requests_total{route="unmatched",method="GET",status="404"} 1', body)
+        self.assertIn('http_request_duration_seconds_count{route="api_products"} 1', body)
+        self.assertIn(f'http_response_size_bytes_sum{{route="api_products"}} {len(resp.content)}', body)
+        self.assertRegex(body, r'db_queries_per_request_sum\{route="api_products"\} [1-9]')
+        self.assertIn('ai_replies_total{path="rule"}', body)
+        self.assertIn('ai_hf_breaker_state{state="closed"} 1', body)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_needs_allowed_address_or_token(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 403)
+        resp = self.client.get('/metrics', REMOTE_ADDR='10.0.0.5', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    @override_settings(SLOW_QUERY_MS=0.000001)
+    def test_slow_query_log_names_the_route(self):
+        with self.assertLogs('members.metrics', 'WARNING') as logs:
+            self.client.get('/api/products/')
+        self.assertIn('GET api_products: SELECT', logs.output[0])
+        self.assertIn('db_slow_queries_total{route="api_products"}', REGISTRY.render())
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    @override_settings(RATE_LIMITS={'api_customer_login': '2/m'}, RATE_LIMIT_IP_FACTOR=1)
+    def test_throttled_request_never_reaches_the_view(self):
+        make_customer()
+        body = json.dumps({'email': 'c@example.com', 'password': 'wrong'})
+        with mock.patch('members.views.check_password', return_value=False) as hasher:
+            codes = [self.client.post('/api/customer/login/', body, content_type='application/json').status_code
+                     for _ in range(3)]
+            # Safe methods don't spend tokens
+            self.assertEqual(self.client.get('/api/customer/login/').status_code, 405)
+        self.assertEqual(codes, [401, 401, 429])
+        self.assertEqual(hasher.call_count, 2)
+        resp = self.client.post('/api/customer/login/', body, content_type='application/json')
+        self.assertEqual(int(resp['Retry-After']), 30)
+        self.assertFalse(resp.json()['success'])
+        # Another client IP has its own bucket
+        resp = self.client.post('/api/customer/login/', body, content_type='application/json', REMOTE_ADDR='10.0.0.9')
+        self.assertEqual(resp.status_code, 401)
+
+    def test_buckets_refill_and_spend_all_or_nothing(self):
+        session, ip = ('s', 1, 0.5), ('ip', 3, 1.5)
+        self.assertEqual(ratelimit.take([session, ip], now=100), 0)
+        self.assertEqual(ratelimit.take([session, ip], now=100), 2.0)
+        # The session bucket refused, so the IP bucket kept its tokens
+        self.assertEqual(cache.get('ip'), (2, 100))
+        self.assertEqual(ratelimit.take([session, ip], now=102), 0)
+        self.assertEqual(ratelimit.parse_rate('30/h'), (30, 30 / 3600))
+
+
+class SyntheticDataTests(TestCase):
+    def test_generated_products_are_searchable(self):
+        get_index().invalidate()
+        self.addCleanup(get_index().invalidate)
+        self.assertEqual(search_products('rice'), [])  # loads the (empty) index
+        result = generate(shops=1, customers=1, partners=1, products=5, orders=0, seed=1, tag='s')
+        product = Product.objects.get(pk=result['product_id'])
+        self.assertIn(product.id, [m['id'] for m in search_products(product.name)])
+
+    def test_generates_consistent_orders(self):
+        Customer.objects.create(name='Existing', email='e@example.com', phone='1', password='x')
+        now = timezone.now()
+        result = generate(shops=3, customers=5, partners=2, products=30, orders=200, days=30, seed=1,
+                          tag='t', batch_size=64, now=now)
+        self.assertEqual(Order.objects.count(), 200)
+        self.assertEqual(Product.objects.filter(shopkeeper__email__endswith='.t@example.com').count(), 30)
+        customer = Customer.objects.get(email=email('customer', 0, 't'))
+        self.assertEqual(customer.pk, result['customer_id'])
+        self.assertTrue(check_password('password123', customer.password))
+
+        mismatched = OrderItem.objects.exclude(product__shopkeeper_id=F('order__shopkeeper_id')).count()
+        self.assertEqual(mismatched, 0)
+        for order in Order.objects.prefetch_related('items')[:20]:
+            self.assertTrue(order.items.all())
+            self.assertEqual(order.total_amount, sum(item.subtotal for item in order.items.all()))
+            self.assertEqual(order.delivery_partner_id is not None,
+                             order.status in ('assigned', 'out_for_delivery', 'delivered'))
+        dates = list(Order.objects.order_by('pk').values_list('date', flat=True))
+        self.assertEqual(dates, sorted(dates))
+        self.assertGreaterEqual(dates[0], now - timedelta(days=30))
+
+        # Ids carry on after existing rows and the same seed gives the same shape
+        again = generate(shops=3, customers=5, partners=2, products=30, orders=200, days=30, seed=1,
+                         tag='u', batch_size=64, now=now)
+        self.assertEqual(again['product_id'], result['product_id'] + 30)
+        totals = list(Order.objects.order_by('pk').values_list('total_amount', flat=True))
+        self.assertEqual(totals[:200], totals[200:])
+
+
+class HTTPRouteBenchmarkTests(SimpleTestCase):
+    def test_noise_floor_applies_per_metric(self):
+        from benchmarks._common import compare_to_baseline
+        baseline = {'rule': {'p95_ms': 0.2, 'quality': 1.0}}
+        current = {'rule': {'p95_ms': 0.6, 'quality': 0.6}}
+        regressions = compare_to_baseline(current, baseline, ('p95_ms', 'quality'), higher_is_better=('quality',),
+                                          min_delta={'p95_ms': 0.5})
+        self.assertEqual([r['metric'] for r in regressions], ['quality'])
+
+    def test_every_route_has_a_scenario(self):
+        from benchmarks.http_routes import uncovered_routes
+        self.assertEqual(uncovered_routes(), [])
+
+    def test_runs_and_reports_queries(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'routes.json')
+            proc = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.http_routes', '--routes', 'api_products,checkout',
+                 '--workers', '2', '--requests', '3', '--shops', '3', '--products', '60', '--orders', '50',
+                 '--output', output],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=300,
+            )
+            self.assertEqual(proc.returncode, 0, proc.stdout + proc.stderr)
+            with open(output) as f:
+                routes = json.load(f)['routes']
+        self.assertEqual(routes['checkout']['count'], 6)
+        self.assertEqual(routes['checkout']['failures'], 0)
+        self.assertGreater(routes['checkout']['queries_mean'], 0)
+        self.assertEqual(routes['api_products']['queries_max'], 1)
+
+
+class CheckoutThroughputBenchmarkTests(SimpleTestCase):
+    def test_reports_throughput_and_phases(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'checkout.json')
+            proc = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.checkout_throughput', '--profiles', 'sqlite-wal-immediate',
+                 '--threads', '3', '--checkouts', '4', '--shops', '4', '--products', '40', '--output', output],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=300,
+            )
+            self.assertEqual(proc.returncode, 0, proc.stdout + proc.stderr)
+            with open(output) as f:
+                result = json.load(f)['profiles']['sqlite-wal-immediate']['3']
+        self.assertEqual(result['outcomes'], {'placed': 12})
+        self.assertGreaterEqual(result['orders_per_s'], result['checkouts_per_s'])
+        self.assertGreater(result['phases_ms']['insert'], 0)
+        self.assertTrue(result['shapes'])
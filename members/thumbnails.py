@@ -0,0 +1,123 @@
+"""Resized WebP/JPEG variants of product images.
+
+Uploads are kept as-is (often full-size PNG screenshots); cards and the product
+API are served from fixed-width variants instead. Variants are written next to
+the media root under `product_thumbs/` and recorded on `Product.image_variants`
+together with the source file name, so a replaced image is detected and its old
+variants removed. Generation runs from the Product post_save signal and from
+`manage.py generate_thumbnails` for images uploaded before this existed.
+"""
+import io
+import os
+import zlib
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from .catalog_cache import bump_catalog_version
+
+WIDTHS = (200, 400, 800)
+FORMATS = (
+    # (key, Pillow format, extension, save options)
+    ('webp', 'WEBP', 'webp', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+VARIANT_DIR = 'product_thumbs'
+
+
+def _formats():
+    return [f for f in FORMATS if f[0] != 'webp' or features.check('webp')]
+
+
+def _flatten(img):
+    """RGB copy of `img`, with any transparency composited on white."""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB')
+
+
+def variants_current(product):
+    variants = product.image_variants or {}
+    if not product.image:
+        return not variants
+    return variants.get('source') == product.image.name
+
+
+def delete_variants(variants, storage=default_storage):
+    for key, _, _, _ in FORMATS:
+        for name in (variants or {}).get(key, {}).values():
+            storage.delete(name)
+
+
+def build_variants(image_name, storage=default_storage, source_storage=None):
+    """Write every width/format variant of a stored image and return the variants dict."""
+    with (source_storage or storage).open(image_name, 'rb') as fh:
+        img = Image.open(fh)
+        img = _flatten(ImageOps.exif_transpose(img))
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    # The hash keeps same-named uploads (Django appends a suffix) apart
+    prefix = f"{VARIANT_DIR}/{stem}_{zlib.crc32(image_name.encode('utf-8')):08x}"
+    # Never upscale; a small source just gets one variant at its own width
+    widths = [w for w in WIDTHS if w < img.width] or [img.width]
+    variants = {'source': image_name}
+    for key, _, _, _ in _formats():
+        variants[key] = {}
+    for width in widths:
+        height = max(1, round(img.height * width / img.width))
+        resized = img.resize((width, height), Image.LANCZOS)
+        for key, fmt, ext, options in _formats():
+            buf = io.BytesIO()
+            resized.save(buf, fmt, **options)
+            name = f"{prefix}_{width}w.{ext}"
+            storage.delete(name)
+            variants[key][str(width)] = storage.save(name, ContentFile(buf.getvalue()))
+    return variants
+
+
+def _shared(source, exclude_pk):
+    """True if another product still points at the image `source`."""
+    from .models import Product
+    return bool(source) and Product.objects.filter(image=source).exclude(pk=exclude_pk).exists()
+
+
+def refresh_variants(product, force=False):
+    """Bring `product.image_variants` in line with `product.image`. Returns True if it changed.
+
+    Products sharing one stored image (see members.storage) share its variants.
+    Saves with a queryset update so Product signals (and this function) aren't re-entered.
+    """
+    from .models import Product
+    if not force and variants_current(product):
+        return False
+    old = product.image_variants or {}
+    new = {}
+    if product.image:
+        name = product.image.name
+        sibling = None
+        if not force:
+            sibling = (Product.objects.filter(image=name, image_variants__source=name)
+                       .exclude(pk=product.pk).values_list('image_variants', flat=True).first())
+        try:
+            new = sibling or build_variants(name, source_storage=product.image.storage)
+        except (OSError, UnidentifiedImageError):
+            # Missing or unreadable upload: remember it so we don't retry on every save;
+            # templates fall back to the original URL
+            new = {'source': name}
+    if not _shared(old.get('source'), product.pk):
+        delete_variants({k: {w: n for w, n in v.items() if n not in new.get(k, {}).values()}
+                         for k, v in old.items() if k != 'source'})
+    product.image_variants = new
+    Product.objects.filter(pk=product.pk).update(image_variants=new)
+    bump_catalog_version()  # cached product cards embed the variant URLs
+    return True
+
+
+def discard_variants(product):
+    """Delete a removed product's variants unless another product shares them."""
+    variants = product.image_variants or {}
+    if not _shared(variants.get('source'), product.pk):
+        delete_variants(variants)
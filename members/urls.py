@@ -10,9 +10,13 @@ urlpatterns = [
     path('shopkeeper/edit-product/<int:product_id>/', views.edit_product, name='edit_product'),
     path('shopkeeper/delete-product/<int:product_id>/', views.delete_product, name='delete_product'),
     path('shopkeeper/update-order/<int:order_id>/', views.update_order_status, name='update_order_status'),
+    path('shopkeeper/orders/bulk-status/', views.bulk_update_order_status, name='bulk_update_order_status'),
+    path('shopkeeper/sales/report/', views.sales_report, name='sales_report'),
     path('shopkeeper/product/add/', views.add_product, name='add_product'),
     path('shopkeeper/product/edit/<int:product_id>/', views.edit_product, name='edit_product'),
     path('shopkeeper/product/delete/<int:product_id>/', views.delete_product, name='delete_product'),
+    path('shopkeeper/products/export/', views.export_products_view, name='export_products'),
+    path('shopkeeper/products/import/', views.import_products_view, name='import_products'),
 
     # Customer URLs
     path('customer/login/', views.customer_login, name='customer_login'),
@@ -51,4 +55,7 @@ urlpatterns = [
     path('api/customer/login/', views.api_customer_login, name='api_customer_login'),
     path('api/customer/register/', views.api_customer_register, name='api_customer_register'),
     path('api/products/', views.api_products, name='api_products'),
+
+    # Prometheus metrics (members.metrics)
+    path('metrics', views.metrics, name='metrics'),
 ]
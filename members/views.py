@@ -3,13 +3,35 @@ from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.hashers import make_password, check_password
-from django.http import JsonResponse
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotModified, JsonResponse,
+    StreamingHttpResponse,
+)
+from django.db import transaction
 from django.db.models import Q
 from django.views.decorators.csrf import csrf_exempt
+from django.views.static import serve, was_modified_since
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
+from django.conf import settings
 from .models import Shopkeeper, Customer, DeliveryPartner, Product, Order, OrderItem
+import io
 import json
-from datetime import datetime
+import os
+from datetime import date, datetime, timedelta
+from . import catalog_io, idempotency, inventory, recommendations, sales, staticfiles
 from .ai_bot import generate_ai_reply
+from .archive import customer_order_history
+from .catalog_cache import catalog_product_count, catalog_version
+from .conversations import CHAT_COOKIE, conversation_key as get_conversation_key, get_store as get_conversation_store
+from .metrics import REGISTRY as METRICS
+from .order_counts import order_counts
+from .order_status import (
+    SHOPKEEPER_TRANSITIONS, InvalidOrderIds, InvalidTransition, TooManyOrders, bulk_transition, change_status,
+    notify_created,
+)
+from .storage import IMMUTABLE_CACHE_CONTROL, is_content_addressed
 
 # --- Shopkeeper Views ---
 
@@ -75,14 +97,21 @@ def shopkeeper_dashboard(request):
         products = Product.objects.filter(shopkeeper=shopkeeper)
         orders = Order.objects.filter(shopkeeper=shopkeeper).order_by('-date')
         
-        # Count pending orders specifically
-        pending_orders_count = orders.filter(status='pending').count()
+        # Status badges come from the per-shop counter row (a primary-key read)
+        status_counts = order_counts(shopkeeper.id)
+        pending_orders_count = status_counts.pending
+        
+        # Last 30 days from the daily rollup (one row per product per day, not per order)
+        today = timezone.localdate()
+        sales_summary = sales.report(shopkeeper.id, today - timedelta(days=29), today, top=3)
         
         context = {
             'shopkeeper': shopkeeper,
             'products': products,
             'orders': orders,
             'pending_orders_count': pending_orders_count,
+            'status_counts': status_counts,
+            'sales_summary': sales_summary,
         }
         
         return render(request, 'shopkeeper/dashboard.html', context)
@@ -91,6 +120,16 @@ def shopkeeper_dashboard(request):
         messages.error(request, f'Dashboard error: {str(e)}')
         return redirect('shopkeeper_login')
 
+def _parse_stock(value):
+    """Stock form field: blank means not tracked, otherwise a whole number >= 0."""
+    value = (value or '').strip()
+    if not value:
+        return None
+    stock = int(value)
+    if stock < 0:
+        raise ValueError('Stock cannot be negative')
+    return stock
+
 def add_product(request):
     """Handle product creation for shopkeepers"""
     
@@ -110,6 +149,7 @@ def add_product(request):
             quantity = request.POST.get('quantity')
             image = request.FILES.get('image')
             description = request.POST.get('description', '')
+            stock = _parse_stock(request.POST.get('stock'))
             
             # Validate required fields
             if not name or not price or not quantity:
@@ -122,6 +162,7 @@ def add_product(request):
                 name=name,
                 price=float(price),
                 quantity=quantity,
+                stock=stock,
                 image=image,
                 description=description
             )
@@ -129,7 +170,7 @@ def add_product(request):
             messages.success(request, f'Product "{name}" added successfully!')
             
         except ValueError as e:
-            messages.error(request, 'Please enter a valid price.')
+            messages.error(request, 'Please enter a valid price and stock.')
         except Exception as e:
             messages.error(request, f'Error adding product: {str(e)}')
     
@@ -155,26 +196,31 @@ def edit_product(request, product_id):
             quantity = request.POST.get('quantity')
             description = request.POST.get('description', '')
             image = request.FILES.get('image')
+            stock = _parse_stock(request.POST.get('stock'))
             
             # Validate required fields
             if not name or not price or not quantity:
                 messages.error(request, 'Please fill in all required fields.')
                 return redirect('edit_product', product_id=product_id)
             
-            # Update product
+            # Update product; stock is left out of the save so checkouts running
+            # meanwhile don't have their decrements overwritten
             product.name = name
             product.price = float(price)
             product.quantity = quantity
             product.description = description
             if image:  # Only update image if a new one was provided
                 product.image = image
-            product.save()
+            product.save(update_fields=['name', 'price', 'quantity', 'description', 'image'])
+            # Only write stock when the shopkeeper changed the number shown on the form
+            if request.POST.get('stock_shown', '') != request.POST.get('stock', '').strip():
+                inventory.set_stock(product.id, stock)
             
             messages.success(request, f'Product "{name}" updated successfully!')
             return redirect('shopkeeper_dashboard')
             
         except ValueError:
-            messages.error(request, 'Please enter a valid price.')
+            messages.error(request, 'Please enter a valid price and stock.')
             return redirect('edit_product', product_id=product_id)
     
     # For GET request, show the edit form
@@ -230,9 +276,10 @@ def update_order_status(request, order_id):
                 messages.error(request, 'Invalid order status.')
                 return redirect('shopkeeper_dashboard')
             
-            # Update the order status
-            order.status = new_status
-            order.save()
+            # Update the order status (sales rollups follow via order_status_changed)
+            if not change_status(order, new_status, 'shopkeeper'):
+                messages.error(request, f'Order #{order_id} was changed by someone else. Please try again.')
+                return redirect('shopkeeper_dashboard')
             
             # Provide appropriate success message
             if new_status == 'confirmed':
@@ -244,11 +291,182 @@ def update_order_status(request, order_id):
             else:
                 messages.success(request, f'Order #{order_id} status updated to {new_status.title()}.')
             
+        except InvalidTransition as e:
+            messages.error(request, str(e))
         except Exception as e:
             messages.error(request, f'Error updating order status: {str(e)}')
     
     return redirect('shopkeeper_dashboard')
 
+def bulk_update_order_status(request):
+    """Apply one status transition to many of the shopkeeper's orders at once.
+    Accepts JSON {"order_ids": [...], "status": "..."} or form fields order_ids (repeated) and status."""
+    
+    # Check if logged in as shopkeeper
+    if 'shopkeeper_id' not in request.session or request.session.get('user_type') != 'shopkeeper':
+        if request.content_type == 'application/json':
+            return JsonResponse({'success': False, 'error': 'Not logged in as shopkeeper'}, status=401)
+        messages.error(request, 'Please login as shopkeeper to update orders.')
+        return redirect('shopkeeper_login')
+    
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
+    
+    wants_json = request.content_type == 'application/json'
+    try:
+        if wants_json:
+            data = json.loads(request.body.decode('utf-8'))
+            order_ids = data.get('order_ids') or []
+            new_status = data.get('status')
+        else:
+            order_ids = [int(i) for i in request.POST.getlist('order_ids')]
+            new_status = request.POST.get('status')
+        
+        if new_status not in SHOPKEEPER_TRANSITIONS:
+            error = 'Invalid order status.'
+            if wants_json:
+                return JsonResponse({'success': False, 'error': error}, status=400)
+            messages.error(request, error)
+            return redirect('shopkeeper_dashboard')
+        if not order_ids:
+            error = 'Please select at least one order.'
+            if wants_json:
+                return JsonResponse({'success': False, 'error': error}, status=400)
+            messages.error(request, error)
+            return redirect('shopkeeper_dashboard')
+        
+        results, updated = bulk_transition(request.session['shopkeeper_id'], order_ids, new_status)
+        
+        if wants_json:
+            return JsonResponse({'success': True, 'status': new_status, 'updated': updated, 'results': results})
+        if updated:
+            messages.success(request, f'{updated} order(s) updated to {new_status.title()}.')
+        failed = [r for r in results if not r['ok']]
+        if failed:
+            messages.error(request, f'{len(failed)} order(s) could not be updated.')
+        
+    except (InvalidOrderIds, TooManyOrders) as e:
+        if wants_json:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        messages.error(request, str(e))
+    except (ValueError, TypeError):
+        if wants_json:
+            return JsonResponse({'success': False, 'error': 'Invalid request data'}, status=400)
+        messages.error(request, 'Invalid request data.')
+    except Exception as e:
+        if wants_json:
+            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+        messages.error(request, f'Error updating order status: {str(e)}')
+    
+    return redirect('shopkeeper_dashboard')
+
+
+def sales_report(request):
+    """Daily revenue/units, trend and top products for the logged-in shopkeeper.
+    Query params: start, end (YYYY-MM-DD, default the last 30 days), top (default 5)."""
+    
+    if 'shopkeeper_id' not in request.session or request.session.get('user_type') != 'shopkeeper':
+        return JsonResponse({'success': False, 'error': 'Not logged in as shopkeeper'}, status=401)
+    
+    try:
+        today = timezone.localdate()
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else today
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else end - timedelta(days=29)
+        top = min(max(int(request.GET.get('top', 5)), 1), 50)
+        report = sales.report(request.session['shopkeeper_id'], start, end, top=top)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({'success': True, 'report': report})
+
+
+def metrics(request):
+    """Prometheus scrape endpoint; open to METRICS_ALLOWED_IPS or a `Bearer METRICS_TOKEN` header."""
+    token = settings.METRICS_TOKEN
+    authorized = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden('Forbidden')
+    return HttpResponse(METRICS.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def serve_media(request, path):
+    """Development media server; content-addressed files never change, so let clients keep them."""
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_content_addressed(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def serve_static(request, path):
+    """Serve collected static files, preferring the pre-compressed .br/.gz sibling the client accepts."""
+    full_path, encoding = staticfiles.best_encoding(path, request.META.get('HTTP_ACCEPT_ENCODING'))
+    if full_path is None:
+        raise Http404('Static file not found')
+    stat = os.stat(full_path)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(full_path, 'rb'), content_type=staticfiles.content_type(path))
+        response['Content-Length'] = stat.st_size
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Vary'] = 'Accept-Encoding'
+    if staticfiles.is_hashed(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def export_products_view(request):
+    """Stream the shopkeeper's catalog as CSV or JSONL"""
+    
+    # Check if logged in as shopkeeper
+    if 'shopkeeper_id' not in request.session or request.session.get('user_type') != 'shopkeeper':
+        messages.error(request, 'Please login as shopkeeper to export products.')
+        return redirect('shopkeeper_login')
+    
+    fmt = (request.GET.get('format') or 'csv').lower()
+    if fmt not in catalog_io.FORMATS:
+        fmt = 'csv'
+    shopkeeper = get_object_or_404(Shopkeeper, id=request.session['shopkeeper_id'])
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(catalog_io.export_products(shopkeeper, fmt), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="products.{fmt}"'
+    return response
+
+def import_products_view(request):
+    """Bulk create/update products from an uploaded CSV or JSONL file"""
+    
+    # Check if logged in as shopkeeper
+    if 'shopkeeper_id' not in request.session or request.session.get('user_type') != 'shopkeeper':
+        messages.error(request, 'Please login as shopkeeper to import products.')
+        return redirect('shopkeeper_login')
+    
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, 'Please choose a CSV or JSONL file to import.')
+            return redirect('shopkeeper_dashboard')
+        try:
+            shopkeeper = Shopkeeper.objects.get(id=request.session['shopkeeper_id'])
+            fmt = catalog_io.detect_format(upload.name, default=request.POST.get('format') or 'csv')
+            # Decode on the fly; large uploads are spooled to disk by Django, not held in memory
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            result = catalog_io.import_products(shopkeeper, stream, fmt)
+            
+            if result.created or result.updated:
+                messages.success(request, f'Import finished: {result.summary()}.')
+            else:
+                messages.error(request, f'No products imported: {result.summary()}.')
+            for line, error in result.errors[:5]:
+                messages.error(request, f'Line {line}: {error}')
+            
+        except UnicodeDecodeError:
+            messages.error(request, 'The file must be UTF-8 encoded.')
+        except Exception as e:
+            messages.error(request, f'Error importing products: {str(e)}')
+    
+    return redirect('shopkeeper_dashboard')
+
 # --- Customer Views ---
 
 def customer_login(request):
@@ -306,16 +524,30 @@ def customer_dashboard(request):
         customer_id = request.session['customer_id']
         customer = Customer.objects.get(id=customer_id)
         
-        # Fetch all products from all shopkeepers
-        products = Product.objects.all().order_by('-id')
+        # The product grid is the same for every customer and is cached per catalog
+        # version in the template; these querysets only run when it has to be re-rendered
+        products = Product.objects.select_related('shopkeeper')
+        version = catalog_version()
         
         # Fetch orders for this customer
-        orders = Order.objects.filter(customer=customer).order_by('-date')
+        orders = list(Order.objects.filter(customer=customer).select_related('shopkeeper')
+                      .prefetch_related('items__product').order_by('-date'))
+        
+        # "Customers also bought": precomputed neighbours of what's in the recent orders
+        recent_products = {item.product_id for order in orders[:3] for item in order.items.all() if item.product_id}
+        also_bought = recommendations.also_bought(recent_products) if recent_products else []
         
         context = {
             'customer': customer,
-            'products': products,
+            'products_by_name': products.order_by('name', 'id'),
+            'products_by_shop': products.order_by('shopkeeper__name', 'shopkeeper_id', 'name', 'id'),
+            'product_count': catalog_product_count(version),
+            'catalog_version': version,
+            'catalog_cache_timeout': settings.CATALOG_CACHE_TIMEOUT,
+            'card_cache_timeout': settings.CATALOG_CARD_CACHE_TIMEOUT,
             'orders': orders,
+            'also_bought': also_bought,
+            'checkout_key': idempotency.new_key(),
         }
         
         return render(request, 'customer/dashboard.html', context)
@@ -339,6 +571,7 @@ def customer_cart(request):
     context = {
         'cart_items': [],  # kept for compatibility, items are client-side
         'customer': customer,
+        'checkout_key': idempotency.new_key(),
     }
     return render(request, 'customer/cart.html', context)
 
@@ -349,10 +582,16 @@ def customer_orders(request):
         return redirect('customer_login')
     
     customer_id = request.session['customer_id']
-    orders = Order.objects.filter(customer_id=customer_id).order_by('-date')
+    orders = Order.objects.filter(customer_id=customer_id).prefetch_related('items__product').order_by('-date')
+    
+    # Older delivered/cancelled orders live in the archive and are only read on request
+    show_history = request.GET.get('history') == '1'
+    archived_orders = customer_order_history(customer_id) if show_history else []
     
     context = {
         'orders': orders,
+        'archived_orders': archived_orders,
+        'show_history': show_history,
     }
     return render(request, 'customer/orders.html', context)
 
@@ -365,6 +604,8 @@ def checkout(request):
         return redirect('customer_login')
     
     if request.method == 'POST':
+        key = idempotency.clean_key(request.POST.get(idempotency.FORM_FIELD))
+        claimed = False
         try:
             customer_id = request.session['customer_id']
             customer = Customer.objects.get(id=customer_id)
@@ -392,6 +633,21 @@ def checkout(request):
                 messages.error(request, 'Invalid cart data.')
                 return redirect('customer_dashboard')
             
+            # A resubmitted form (e.g. a retry after a timeout) gets the first submission's result
+            if key:
+                digest = idempotency.fingerprint([full_name, phone, address, payment_method, instructions, cart_data])
+                previous = idempotency.claim(customer.id, key, digest)
+                if previous is not None:
+                    if previous.fingerprint != digest:
+                        messages.error(request, 'This checkout form was already used for a different cart. '
+                                                'Please reload the page and try again.')
+                    elif previous.completed_at is None:
+                        messages.info(request, 'Your order is still being placed. Check your orders in a moment.')
+                    else:
+                        messages.success(request, previous.message)
+                    return redirect('customer_dashboard')
+                claimed = True
+            
             # Group items by shopkeeper to create separate orders
             orders_by_shop = {}
             for item in cart_items:
@@ -418,44 +674,69 @@ def checkout(request):
                 except Product.DoesNotExist:
                     continue
             
-            # Create orders for each shopkeeper
-            created_orders = []
+            # Take stock for every line up front; nothing is taken if any line is short
+            stock_lines = {}
             for shop_data in orders_by_shop.values():
-                # Create the order
-                order = Order.objects.create(
-                    customer=customer,
-                    shopkeeper=shop_data['shopkeeper'],
-                    delivery_name=full_name,
-                    delivery_phone=phone,
-                    delivery_address=address,
-                    payment_method=payment_method,
-                    special_instructions=instructions,
-                    total_amount=shop_data['total'],
-                    status='pending',
-                    date=datetime.now()
-                )
-                
-                # Create order items
                 for item_data in shop_data['items']:
-                    OrderItem.objects.create(
-                        order=order,
-                        product=item_data['product'],  # can be null later if deleted
-                        product_name=item_data['product'].name,  # store name permanently
-                        quantity=item_data['quantity'],
-                        price=item_data['product'].price  # store price at time of order
-                    )
-
+                    product_id = item_data['product'].id
+                    stock_lines[product_id] = stock_lines.get(product_id, 0) + item_data['quantity']
+            try:
+                reservation = inventory.reserve(stock_lines)
+            except inventory.OutOfStock as e:
+                if claimed:
+                    idempotency.release(customer.id, key)
+                messages.error(request, f'Sorry, not enough stock: {e}.')
+                return redirect('customer_dashboard')
+            
+            # Create orders for each shopkeeper
+            created_orders = []
+            try:
+                with transaction.atomic():
+                    for shop_data in orders_by_shop.values():
+                        # Create the order
+                        order = Order.objects.create(
+                            customer=customer,
+                            shopkeeper=shop_data['shopkeeper'],
+                            delivery_name=full_name,
+                            delivery_phone=phone,
+                            delivery_address=address,
+                            payment_method=payment_method,
+                            special_instructions=instructions,
+                            total_amount=shop_data['total'],
+                            status='pending',
+                            date=datetime.now()
+                        )
                 
-                created_orders.append(order)
+                        # Create order items
+                        for item_data in shop_data['items']:
+                            OrderItem.objects.create(
+                                order=order,
+                                product=item_data['product'],  # can be null later if deleted
+                                product_name=item_data['product'].name,  # store name permanently
+                                quantity=item_data['quantity'],
+                                price=item_data['product'].price  # store price at time of order
+                            )
+                        inventory.confirm(reservation, order, [i['product'].id for i in shop_data['items']])
+                    
+                        created_orders.append(order)
+                    # One event for the whole checkout; sales rollups and counters follow it
+                    notify_created(created_orders)
+                    
+                    order_count = len(created_orders)
+                    total_amount = sum(order.total_amount for order in created_orders)
+                    if order_count == 1:
+                        result = f'Order placed successfully! Order total: ₹{total_amount:.2f}'
+                    else:
+                        result = f'{order_count} orders placed successfully! Total: ₹{total_amount:.2f}'
+                    if claimed:
+                        idempotency.complete(customer.id, key, result, [order.id for order in created_orders])
+            except Exception:
+                # Give the held stock back now rather than when the reservation expires
+                inventory.release(reservation)
+                raise
             
             # Clear the cart (this will be done via JavaScript)
-            order_count = len(created_orders)
-            total_amount = sum(order.total_amount for order in created_orders)
-            
-            if order_count == 1:
-                messages.success(request, f'Order placed successfully! Order total: ₹{total_amount:.2f}')
-            else:
-                messages.success(request, f'{order_count} orders placed successfully! Total: ₹{total_amount:.2f}')
+            messages.success(request, result)
             
             # Redirect back to dashboard
             return redirect('customer_dashboard')
@@ -464,6 +745,8 @@ def checkout(request):
             messages.error(request, 'Customer account not found.')
             return redirect('customer_login')
         except Exception as e:
+            if claimed:
+                idempotency.release(customer.id, key)
             messages.error(request, f'Error processing checkout: {str(e)}')
             return redirect('customer_dashboard')
     
@@ -575,10 +858,10 @@ def accept_delivery_order(request, order_id):
                 messages.error(request, 'This order is already assigned to another delivery partner.')
                 return redirect('delivery_dashboard')
             
-            # Assign the order to this delivery partner
-            order.delivery_partner = delivery_partner
-            order.status = 'assigned'
-            order.save()
+            # Assign the order to this delivery partner, unless its status changed meanwhile
+            if not change_status(order, 'assigned', 'delivery', delivery_partner=delivery_partner):
+                messages.error(request, 'This order is no longer available for delivery.')
+                return redirect('delivery_dashboard')
             
             messages.success(request, f'Order #{order_id} accepted successfully! You can now start the delivery.')
             
@@ -615,10 +898,10 @@ def update_delivery_status(request, order_id):
                 return redirect('delivery_dashboard')
 
             
-            # Update the order status
-            old_status = order.status
-            order.status = new_status
-            order.save()
+            # Update the order status (counters and rollups follow via order_status_changed)
+            if not change_status(order, new_status, 'delivery'):
+                messages.error(request, f'Order #{order_id} was changed by someone else. Please try again.')
+                return redirect('delivery_dashboard')
             
             # Provide appropriate success message
             if new_status == 'out_for_delivery':
@@ -630,6 +913,8 @@ def update_delivery_status(request, order_id):
             
         except Order.DoesNotExist:
             messages.error(request, 'Order not found or not assigned to you.')
+        except InvalidTransition as e:
+            messages.error(request, str(e))
         except Exception as e:
             messages.error(request, f'Error updating delivery status: {str(e)}')
     
@@ -730,6 +1015,8 @@ def api_products(request):
                             'quantity': sp.quantity,
                             'description': sp.description,
                             'image_url': (sp.image.url if sp.image else ''),
+                            'thumbnail_url': sp.card_image_url,
+                            'srcset': {'webp': sp.webp_srcset, 'jpeg': sp.jpeg_srcset},
                         }
                         for sp in shop_products_sorted
                     ]
@@ -750,6 +1037,8 @@ def api_products(request):
                     'description': p.description,
                     'shop': (p.shopkeeper.name if p.shopkeeper else 'Unknown Shop'),
                     'image_url': (p.image.url if p.image else ''),
+                    'thumbnail_url': p.card_image_url,
+                    'srcset': {'webp': p.webp_srcset, 'jpeg': p.jpeg_srcset},
                 })
             return JsonResponse({'success': True, 'mode': 'alphabetical', 'products': items})
     except Exception as e:
@@ -764,31 +1053,33 @@ def ai_chat(request):
     
     try:
         data = json.loads(request.body.decode('utf-8'))
-        user_message = data.get('message', '').strip()
-        history = data.get('history') or []  # optional chat history array of {role, content}
+        user_message = (data.get('message') or '').strip()
         
         if not user_message:
             return JsonResponse({'success': False, 'error': 'Message is required'}, status=400)
         
-        # Build minimal messages for the generator
-        messages = []
-        for item in history[-5:]:  # keep it short
-            role = item.get('role')
-            content = (item.get('content') or '').strip()
-            if role in ('user','assistant') and content:
-                messages.append({'role': role, 'content': content})
-        messages.append({'role': 'user', 'content': user_message})
+        # History lives server-side, keyed by session (or a cookie for anonymous
+        # clients, so no session row is written) and trimmed to a token budget
+        conversation_key, new_cookie = get_conversation_key(request)
+        store = get_conversation_store()
+        store.append(conversation_key, 'user', user_message)
+        context = store.context(conversation_key)
         
         # Try model-based generation first
-        bot_reply = generate_ai_reply(messages)
+        bot_reply = generate_ai_reply(context.messages, context=context)
         if not bot_reply:
             bot_reply = generate_ai_response(user_message)
+        store.append(conversation_key, 'assistant', bot_reply)
         
-        return JsonResponse({
+        response = JsonResponse({
             'success': True,
             'response': bot_reply,
             'timestamp': datetime.now().isoformat()
         })
+        if new_cookie:
+            response.set_cookie(CHAT_COOKIE, new_cookie, max_age=int(store.idle_ttl), httponly=True,
+                                samesite='Lax')
+        return response
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
@@ -971,3 +1262,4 @@ def api_delivery_register(request):
 		return JsonResponse({'success': True, 'delivery': {'id': dp.id, 'name': dp.name, 'email': dp.email}})
 	except Exception as e:
 		return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
@@ -0,0 +1,88 @@
+"""Polling worker for members.tasks, run by `manage.py runworker`."""
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .metrics import LatencyHistogram
+from .tasks import claim, execute, schedule_periodic
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks that every periodic task has its next run queued
+SCHEDULE_INTERVAL = 60
+
+
+class Worker:
+    def __init__(self, concurrency=4, poll_interval=1.0, worker_id=None, periodic=True):
+        self.concurrency = concurrency
+        self.periodic = periodic
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.wait = LatencyHistogram()  # run_at -> started
+        self.run = LatencyHistogram()   # started -> finished
+        self.stats = {'done': 0, 'failed': 0}
+        self._stop = threading.Event()
+        self._busy = 0
+        self._lock = threading.Lock()
+        self._next_schedule = 0.0
+
+    def stop(self):
+        self._stop.set()
+
+    def _run_one(self, task_row):
+        started = time.monotonic()
+        ok = False
+        try:
+            ok = execute(task_row)
+        except Exception:
+            # Recording the outcome failed (e.g. a locked database); the row stays
+            # 'running' until VISIBILITY_TIMEOUT hands it out again
+            logger.exception('Task %s #%s: could not record the outcome', task_row.name, task_row.id)
+        finally:
+            # Each pool thread keeps its own connection; don't let it go stale
+            close_old_connections()
+            self.run.observe(time.monotonic() - started)
+            with self._lock:
+                self.stats['done' if ok else 'failed'] += 1
+                self._busy -= 1
+
+    def run_once(self, pool=None):
+        """Claim what fits in the free slots and run it. Returns the number of tasks claimed."""
+        if self.periodic and time.monotonic() >= self._next_schedule:
+            schedule_periodic()
+            self._next_schedule = time.monotonic() + SCHEDULE_INTERVAL
+        with self._lock:
+            free = self.concurrency - self._busy
+        if free <= 0:
+            return 0
+        tasks = claim(self.worker_id, free)
+        now = timezone.now()
+        for task_row in tasks:
+            self.wait.observe(max(0.0, (now - task_row.run_at).total_seconds()))
+            with self._lock:
+                self._busy += 1
+            if pool is None:
+                self._run_one(task_row)
+            else:
+                pool.submit(self._run_one, task_row)
+        return len(tasks)
+
+    def run_forever(self, burst=False):
+        """Poll until stop() (or, with burst=True, until the queue is drained)."""
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='task') as pool:
+            while not self._stop.is_set():
+                claimed = self.run_once(pool)
+                if burst and not claimed:
+                    with self._lock:
+                        idle = self._busy == 0
+                    if idle:
+                        break
+                if not claimed:
+                    self._stop.wait(self.poll_interval)
+        connection.close()
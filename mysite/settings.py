@@ -42,8 +42,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'members.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'members.ratelimit.RateLimitMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -134,3 +136,67 @@ AUTH_USER_MODEL = 'members.Shopkeeper'
 import os
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+
+# collectstatic writes content-hashed names plus .gz/.br siblings (members.staticfiles)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'members.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+
+# Delivered/cancelled orders older than this move to ArchivedOrder (manage.py archive_orders)
+ORDER_ARCHIVE_AFTER_DAYS = 180
+
+# Stock held by a checkout is returned if its order isn't created within this many
+# seconds (members.inventory; swept by manage.py release_reservations)
+STOCK_RESERVATION_TTL = 15 * 60
+
+# A resubmitted checkout form replays the original result for this many seconds
+# (members.idempotency; expired keys are deleted by manage.py purge_checkout_keys)
+CHECKOUT_KEY_TTL = 24 * 60 * 60
+# An unfinished checkout (worker killed mid-request) frees its key after this long;
+# keep it above the web server's request timeout
+CHECKOUT_KEY_LEASE = 2 * 60
+
+# Background tasks (members.tasks). Queued tasks, such as the thumbnails for an
+# uploaded product image, only run while `manage.py runworker` is running. With
+# TASKS_EAGER the work runs inline when it is enqueued instead, e.g. in development.
+TASKS_EAGER = os.environ.get('TASKS_EAGER', '') == '1'
+TASKS_WORKER_CONCURRENCY = 4
+
+# Rendered product grids are cached per catalog version (members.catalog_cache).
+# LocMemCache is per process; point CACHES at a shared backend when running
+# several web workers so a catalog change is seen by all of them at once.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+CATALOG_CACHE_TIMEOUT = 300
+CATALOG_CARD_CACHE_TIMEOUT = 3600
+
+# Request, SQL and AI backend metrics (members.metrics), scraped from /metrics by
+# the addresses below or with `Authorization: Bearer $METRICS_TOKEN`. Queries
+# slower than SLOW_QUERY_MS are logged with their route; 0 turns the log off.
+METRICS_ENABLED = True
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '0'))
+
+# Token buckets per URL name (members.ratelimit): 'N/s', 'N/m' or 'N/h', bursting
+# up to N. Each session gets the rate, each client IP RATE_LIMIT_IP_FACTOR times
+# it. Buckets live in RATE_LIMIT_CACHE; use a shared backend with several workers.
+# Set RATE_LIMIT_IP_HEADER (e.g. 'HTTP_X_FORWARDED_FOR') only behind a proxy that sets it.
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMITS = {
+    'ai_chat': '20/m',
+    'api_customer_login': '10/m',
+    'api_shopkeeper_login': '10/m',
+    'api_delivery_login': '10/m',
+    'api_customer_register': '5/m',
+    'api_shopkeeper_register': '5/m',
+    'api_delivery_register': '5/m',
+}
+RATE_LIMIT_IP_FACTOR = 5
+RATE_LIMIT_CACHE = 'default'
+RATE_LIMIT_IP_HEADER = None